@@ -337,6 +337,7 @@ from livekit.agents import (
     AgentSession,
     Agent,
     JobContext,
+    JobProcess,
     function_tool,
     RunContext,
     get_job_context,
@@ -822,7 +823,7 @@ class OutboundCaller(Agent):
                 
                 # Look for greeting in current node or find greeting/conversation node
                 if current_node_id and pathway_config:
-                    current_node = next((node for node in pathway_config.get('nodes', []) if node.get('id') == current_node_id), None)
+                    current_node = session_data.get_node_by_id(current_node_id)
                     if current_node:
                         # Try to get greeting from node's agent instructions or specific greeting field
                         node_data = current_node.get('data', {})
@@ -1060,11 +1061,74 @@ async def update_call_status_in_backend(room_name: str, new_status: str, supabas
     except Exception as e:
         logger.error(f"Erreur lors de la mise à jour des infos pour {room_name} (Supabase ID: {supabase_call_id}): {e}")
 
+def build_stt():
+    """
+    Build the STT client for the configured mode (Baseten, LiveKit Inference or Deepgram plugin).
+    The STT settings do not depend on job metadata, so the instance can be built during prewarm.
+    """
+    if USE_BASETEN_STT:
+        # BASETEN: Whisper Large v3 Turbo with faster-whisper (OPTIMIZED FOR REAL-TIME)
+        print(f"🚀 [BASETEN] Using Whisper Turbo v3 for STT (faster-whisper + Silero VAD)", flush=True)
+        
+        stt = baseten.STT(
+            model_endpoint="wss://model-yqvo70rw.api.baseten.co/v1/websocket",  # Whisper Turbo v3 with faster-whisper
+            language="fr",  # French language support
+            buffer_size_seconds=0.5,  # Match Whisper's chunk size (0.5s)
+            vad_threshold=0.5,  # Voice activity detection threshold
+            vad_min_silence_duration_ms=100,  # MUCH shorter silence for faster EOU detection
+            vad_speech_pad_ms=30  # Speech padding in milliseconds
+        )
+        print(f"   ✅ Baseten STT configured: whisper-turbo-v3-french-streaming (yqvo70rw)", flush=True)
+        
+    elif USE_LIVEKIT_INFERENCE:
+        # NEW: LiveKit Inference mode - Deepgram via Inference API
+        print(f"🚀 [INFERENCE] Using LiveKit Inference for STT: Deepgram Nova-3 (French)", flush=True)
+        stt = inference.STT(
+            model="deepgram/nova-3",  # Nova-3 with improved French support
+            language="fr",             # French language
+            extra_kwargs={
+                "endpointing": 25,     # ULTRA-AGGRESSIVE endpointing for maximum speed (25ms)
+                                       # ⚠️ WARNING: May cut off natural speech pauses
+                                       # Testing for minimum possible response time
+            }
+        )
+        print(f"   ✅ Inference STT configured: Deepgram Nova-3 (fr)", flush=True)
+    else:
+        # PLUGIN MODE: Deepgram Nova-3 with French language support
+        # Nova-3 offers 14.26% better WER for French vs Nova-2
+        # Reference: https://deepgram.com/learn/deepgram-expands-nova-3-with-spanish-french-and-portuguese-support
+        print(f"🚀 [DEEPGRAM NOVA-3] Using Nova-3 with French language support", flush=True)
+        stt = deepgram.STT(
+            model="nova-3",              # Deepgram's latest multilingual model
+            language="fr",               # French language
+            sample_rate=16000,           # Standard sample rate
+        )
+        print(f"   ✅ Nova-3 configured: model=nova-3, language=fr (French)", flush=True)
+    
+    return stt
+
+
+def prewarm(proc: JobProcess):
+    """
+    Load per-process resources once, before a job is assigned to this worker process,
+    so the call does not pay the VAD model load and STT client construction.
+    """
+    prewarm_started_at = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+    try:
+        proc.userdata["stt"] = build_stt()
+    except Exception as e:
+        # The job rebuilds the STT itself
+        logger.warning(f"⚠️ Failed to prewarm STT, it will be built per job: {e}")
+    logger.info(f"🔥 Worker process prewarmed in {(time.perf_counter() - prewarm_started_at) * 1000:.0f}ms")
+
+
 async def entrypoint(ctx: JobContext):
     """
     Entry point for the outbound calling agent
     """
     print("🚀 ENTRYPOINT CALLED - OUTBOUND AGENT STARTING", flush=True)
+    entrypoint_started_at = time.perf_counter()
     
     # ✅ INITIALIZE session_start_agent early to avoid UnboundLocalError
     session_start_agent = None
@@ -1227,8 +1291,10 @@ async def entrypoint(ctx: JobContext):
     
     ai_models = metadata.get("ai_models", {})
     
-    # Configure VAD (Voice Activity Detection)
-    vad = silero.VAD.load()
+    # Configure VAD (Voice Activity Detection) - loaded once per process in prewarm
+    vad = ctx.proc.userdata.get("vad")
+    if vad is None:
+        vad = silero.VAD.load()
     
     # Configure STT (Speech-to-Text) - will be updated after voice config
     stt_config = ai_models.get("stt", {})
@@ -1321,44 +1387,8 @@ async def entrypoint(ctx: JobContext):
     # ========================================
     # STT CONFIGURATION - BASETEN + DUAL MODE SUPPORT
     # ========================================
-    if USE_BASETEN_STT:
-        # BASETEN: Whisper Large v3 Turbo with faster-whisper (OPTIMIZED FOR REAL-TIME)
-        print(f"🚀 [BASETEN] Using Whisper Turbo v3 for STT (faster-whisper + Silero VAD)", flush=True)
-        
-        stt = baseten.STT(
-            model_endpoint="wss://model-yqvo70rw.api.baseten.co/v1/websocket",  # Whisper Turbo v3 with faster-whisper
-            language="fr",  # French language support
-            buffer_size_seconds=0.5,  # Match Whisper's chunk size (0.5s)
-            vad_threshold=0.5,  # Voice activity detection threshold
-            vad_min_silence_duration_ms=100,  # MUCH shorter silence for faster EOU detection
-            vad_speech_pad_ms=30  # Speech padding in milliseconds
-        )
-        print(f"   ✅ Baseten STT configured: whisper-turbo-v3-french-streaming (yqvo70rw)", flush=True)
-        
-    elif USE_LIVEKIT_INFERENCE:
-        # NEW: LiveKit Inference mode - Deepgram via Inference API
-        print(f"🚀 [INFERENCE] Using LiveKit Inference for STT: Deepgram Nova-3 (French)", flush=True)
-        stt = inference.STT(
-            model="deepgram/nova-3",  # Nova-3 with improved French support
-            language="fr",             # French language
-            extra_kwargs={
-                "endpointing": 25,     # ULTRA-AGGRESSIVE endpointing for maximum speed (25ms)
-                                       # ⚠️ WARNING: May cut off natural speech pauses
-                                       # Testing for minimum possible response time
-            }
-        )
-        print(f"   ✅ Inference STT configured: Deepgram Nova-3 (fr)", flush=True)
-    else:
-        # PLUGIN MODE: Deepgram Nova-3 with French language support
-        # Nova-3 offers 14.26% better WER for French vs Nova-2
-        # Reference: https://deepgram.com/learn/deepgram-expands-nova-3-with-spanish-french-and-portuguese-support
-        print(f"🚀 [DEEPGRAM NOVA-3] Using Nova-3 with French language support", flush=True)
-        stt = deepgram.STT(
-            model="nova-3",              # Deepgram's latest multilingual model
-            language="fr",               # French language
-            sample_rate=16000,           # Standard sample rate
-        )
-        print(f"   ✅ Nova-3 configured: model=nova-3, language=fr (French)", flush=True)
+    # Prebuilt during prewarm when available
+    stt = ctx.proc.userdata.get("stt") or build_stt()
     
     # ========================================
     # LLM CONFIGURATION - BASETEN + DUAL MODE SUPPORT
@@ -1513,7 +1543,10 @@ async def entrypoint(ctx: JobContext):
     # Use pathway_llm as default for backwards compatibility
     llm = pathway_llm
     
-    logger.info("✅ AI Models configured successfully")
+    logger.info(
+        f"✅ AI Models configured successfully in {(time.perf_counter() - entrypoint_started_at) * 1000:.0f}ms "
+        f"since job start (prewarmed: {'vad' in ctx.proc.userdata})"
+    )
     # Initialize voice adaptation manager (feature-flaggable + per-agent overrides)
     voice_adapt_enabled = os.getenv('VOICE_ADAPTATION_ENABLED', 'true').lower() in ('1','true','yes','on')
     try:
@@ -1924,6 +1957,10 @@ async def entrypoint(ctx: JobContext):
             logger.debug(f"Failed to log usage summary: {e}")
     
     ctx.add_shutdown_callback(log_usage_summary)
+    
+    # Write any pathway events still buffered when the job ends
+    if PATHWAY_INTEGRATION_AVAILABLE:
+        ctx.add_shutdown_callback(agent_pathway_integration.pathway_event_buffer.flush)
 
     # ✅ SAFETY CHECK: Ensure both session and session_start_agent are defined
     if session is None:
@@ -2513,6 +2550,7 @@ if __name__ == "__main__":
     # Define the worker options
     opts = WorkerOptions(
         entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,  # Load VAD/STT once per worker process instead of per call
         agent_name=worker_name,
         port=http_port,  # Pass the dynamically assigned port here
     )
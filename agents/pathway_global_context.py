@@ -37,6 +37,48 @@ except ImportError:
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from api.db_client import supabase_service_client
 
+try:
+    from agent_pathway_integration import pathway_event_buffer
+except ImportError as e:
+    pathway_event_buffer = None
+    logger.warning(f"⚠️ Could not import pathway event buffer - node metrics will only be logged: {e}")
+
+
+class PathwayGraph:
+    """
+    Compiled view of a pathway configuration, built once per session.
+    Indexes nodes by id and name and edges by source so transitions don't rescan the config.
+    """
+
+    def __init__(self, pathway_config: Dict[str, Any]):
+        self.nodes: List[Dict[str, Any]] = pathway_config.get('nodes', []) or []
+        self.nodes_by_id: Dict[str, Dict[str, Any]] = {}
+        self.nodes_by_name: Dict[str, Dict[str, Any]] = {}
+        self.outgoing_edges: Dict[str, List[Dict[str, Any]]] = {}
+        # Instructions are a pure function of the node and the pathway: build once per node
+        self.instructions_by_node_id: Dict[str, str] = {}
+
+        for node in self.nodes:
+            node_id = node.get('id')
+            if node_id is not None:
+                # First occurrence wins, like the previous linear scans
+                self.nodes_by_id.setdefault(node_id, node)
+            node_name = (node.get('name') or '').lower().strip()
+            if node_name:
+                self.nodes_by_name.setdefault(node_name, node)
+
+        for edge in pathway_config.get('edges', []) or []:
+            self.outgoing_edges.setdefault(edge.get('source'), []).append(edge)
+
+    def get_node(self, node_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.nodes_by_id.get(node_id)
+
+    def get_node_by_name(self, node_name: str) -> Optional[Dict[str, Any]]:
+        return self.nodes_by_name.get((node_name or '').lower().strip())
+
+    def get_outgoing_edges(self, node_id: Optional[str]) -> List[Dict[str, Any]]:
+        return self.outgoing_edges.get(node_id, [])
+
 
 @dataclass
 class PathwaySessionData:
@@ -54,34 +96,35 @@ class PathwaySessionData:
     # To store business-logic data collected during the call
     collected_data: Dict[str, Any] = field(default_factory=dict)
     
+    # Call identifiers for emitted events, parsed from the job metadata once per session
+    call_event_context: Optional[Dict[str, Any]] = field(default=None, repr=False)
+    
+    # Compiled lookups over pathway_config
+    graph: PathwayGraph = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        self.graph = PathwayGraph(self.pathway_config or {})
+    
     def get_node_by_id(self, node_id: str) -> Optional[Dict[str, Any]]:
         """Get a node's configuration from the pathway."""
-        for node in self.pathway_config.get('nodes', []):
-            if node.get('id') == node_id:
-                return node
-        return None
+        return self.graph.get_node(node_id)
 
     def get_next_conversation_node(self, current_node_id: str) -> Optional[str]:
         """Find the next conversation node following the pathway edges."""
-        edges = self.pathway_config.get('edges', [])
-        nodes = self.pathway_config.get('nodes', [])
+        graph = self.graph
         
-        # Find all outgoing edges from current node
-        outgoing_edges = [edge for edge in edges if edge.get('source') == current_node_id]
-        
-        for edge in outgoing_edges:
+        for edge in graph.get_outgoing_edges(current_node_id):
             target_node_id = edge.get('target')
-            target_node = next((n for n in nodes if n.get('id') == target_node_id), None)
+            target_node = graph.get_node(target_node_id)
             
             if target_node and target_node.get('type') == 'conversation':
                 return target_node_id
                 
             # If target is a condition, follow its edges to find next conversation node
             elif target_node and target_node.get('type') == 'condition':
-                condition_edges = [e for e in edges if e.get('source') == target_node_id]
-                for condition_edge in condition_edges:
+                for condition_edge in graph.get_outgoing_edges(target_node_id):
                     next_target_id = condition_edge.get('target')
-                    next_target = next((n for n in nodes if n.get('id') == next_target_id), None)
+                    next_target = graph.get_node(next_target_id)
                     if next_target and next_target.get('type') == 'conversation':
                         return next_target_id
         
@@ -139,20 +182,18 @@ class PathwayNodeAgent(Agent):
         logger.info(f"🎯 Transition requested to: {target_node_name}")
         
         # Find the target node by name with flexible matching
-        all_nodes = self.pathway_config.get('nodes', [])
-        target_node = None
+        graph = self.session_data.graph
+        all_nodes = graph.nodes
         target_node_lower = target_node_name.lower().strip()
         
         logger.info(f"🔍 Looking for node matching: '{target_node_name}'")
-        logger.info(f"🔍 Available nodes: {[n.get('name', 'No name') for n in all_nodes]}")
         
         # Try exact name match first
-        for node in all_nodes:
-            node_name = node.get('name', '').lower().strip()
-            if node_name == target_node_lower:
-                target_node = node
-                logger.info(f"✅ Exact match found: {node.get('name')}")
-                break
+        target_node = graph.get_node_by_name(target_node_lower)
+        if target_node:
+            logger.info(f"✅ Exact match found: {target_node.get('name')}")
+        else:
+            logger.info(f"🔍 Available nodes: {[n.get('name', 'No name') for n in all_nodes]}")
         
         # If no exact match, try fuzzy matching (remove common words and check similarity)
         if not target_node:
@@ -205,8 +246,7 @@ class PathwayNodeAgent(Agent):
         This follows the LiveKit pattern where function tools return Agent instances.
         """
         # Find target node configuration
-        all_nodes = self.pathway_config.get('nodes', [])
-        target_node = next((n for n in all_nodes if n.get('id') == target_node_id), None)
+        target_node = self.session_data.get_node_by_id(target_node_id)
         
         if not target_node:
             logger.error(f"❌ Target node {target_node_id} not found in pathway")
@@ -277,25 +317,13 @@ class PathwayNodeAgent(Agent):
 
             # Emit structured metrics event
             try:
-                job_ctx = get_job_context()
-                room_name = getattr(job_ctx.room, 'name', None)
-                metadata = {}
-                if job_ctx and job_ctx.job and job_ctx.job.metadata:
-                    try:
-                        metadata = json.loads(job_ctx.job.metadata)
-                    except Exception:
-                        metadata = {}
-                call_id = metadata.get('supabase_call_id') or metadata.get('call_id')
-                agent_id = metadata.get('agent_id')
-                pathway_execution_id = metadata.get('pathway_execution_id')
+                call_context = self._get_call_event_context()
+                call_id = call_context["call_id"]
                 node_id = self.session_data.current_node_id
 
                 metrics = {
                     "type": "utterance_metrics",
-                    "call_id": call_id,
-                    "room_name": room_name,
-                    "agent_id": agent_id,
-                    "pathway_execution_id": pathway_execution_id,
+                    **call_context,
                     "stage": stage,
                     "node_id": node_id,
                     "pre_speech_delay_ms": int((decision.timing.pre_speech_delay_sec if 'decision' in locals() else 0.0) * 1000),
@@ -308,13 +336,8 @@ class PathwayNodeAgent(Agent):
                     },
                 }
 
-                # Try to emit via pathway integration helper if available
-                try:
-                    from agent_pathway_integration import handle_call_event
-                    if call_id:
-                        await handle_call_event("utterance_metrics", str(call_id), metrics)
-                except Exception as e:
-                    logger.debug(f"Metrics emit fallback (no handle_call_event): {e}; metrics={metrics}")
+                # Buffered: never waits on the database while audio is streaming
+                self._emit_call_event("utterance_metrics", call_id, metrics)
             except Exception as e:
                 logger.debug(f"Failed to build/emit metrics: {e}")
             
@@ -342,39 +365,50 @@ class PathwayNodeAgent(Agent):
             logger.info(f"📈 LLM total latency: {total:.3f}s (stage={stage})")
             # Emit metrics
             try:
-                job_ctx = get_job_context()
-                room_name = getattr(job_ctx.room, 'name', None)
-                metadata = {}
-                if job_ctx and job_ctx.job and job_ctx.job.metadata:
-                    try:
-                        metadata = json.loads(job_ctx.job.metadata)
-                    except Exception:
-                        metadata = {}
-                call_id = metadata.get('supabase_call_id') or metadata.get('call_id')
-                agent_id = metadata.get('agent_id')
-                pathway_execution_id = metadata.get('pathway_execution_id')
+                call_context = self._get_call_event_context()
+                call_id = call_context["call_id"]
                 node_id = self.session_data.current_node_id
 
                 metrics = {
                     "type": "llm_metrics",
-                    "call_id": call_id,
-                    "room_name": room_name,
-                    "agent_id": agent_id,
-                    "pathway_execution_id": pathway_execution_id,
+                    **call_context,
                     "stage": stage,
                     "node_id": node_id,
                     "llm_ttfb_ms": int(((first_ts or end_ts) - start_ts) * 1000),
                     "llm_total_ms": int(total * 1000),
                 }
-                try:
-                    from agent_pathway_integration import handle_call_event
-                    if call_id:
-                        await handle_call_event("llm_metrics", str(call_id), metrics)
-                except Exception as e:
-                    logger.debug(f"Metrics emit fallback (no handle_call_event): {e}; metrics={metrics}")
+                self._emit_call_event("llm_metrics", call_id, metrics)
             except Exception as e:
                 logger.debug(f"Failed to build/emit LLM metrics: {e}")
 
+    def _get_call_event_context(self) -> Dict[str, Any]:
+        """Call identifiers attached to metrics events, resolved once per session."""
+        context = self.session_data.call_event_context
+        if context is None:
+            room_name = None
+            metadata = {}
+            try:
+                job_ctx = get_job_context()
+                room_name = getattr(job_ctx.room, 'name', None)
+                if job_ctx.job and job_ctx.job.metadata:
+                    metadata = json.loads(job_ctx.job.metadata)
+            except Exception as e:
+                logger.debug(f"Could not read job metadata for call events: {e}")
+            context = {
+                "call_id": metadata.get('supabase_call_id') or metadata.get('call_id'),
+                "room_name": room_name,
+                "agent_id": metadata.get('agent_id'),
+                "pathway_execution_id": metadata.get('pathway_execution_id'),
+            }
+            self.session_data.call_event_context = context
+        return context
+
+    def _emit_call_event(self, event_type: str, call_id: Any, event_data: Dict[str, Any]):
+        if pathway_event_buffer is None or not call_id:
+            logger.debug(f"Metrics not emitted (no pathway event buffer or call_id): {event_data}")
+            return
+        pathway_event_buffer.emit(event_type, str(call_id), event_data)
+
     # Override STT node - simplified, metrics now handled via official LiveKit metrics_collected event
     async def stt_node(self, audio: Any, model_settings):
         # STT metrics are now collected via the official LiveKit metrics system
@@ -386,7 +420,20 @@ class PathwayNodeAgent(Agent):
         """
         Build comprehensive instructions for this pathway node that guide the LLM
         on both the conversation content and when to transition to other nodes.
+        Cached per node on the session graph, since agents are recreated on every transition.
         """
+        graph = self.session_data.graph
+        node_id = self.node_config.get('id')
+        cacheable = node_id is not None and graph.get_node(node_id) is self.node_config
+        if cacheable and node_id in graph.instructions_by_node_id:
+            return graph.instructions_by_node_id[node_id]
+        
+        instructions = self._compose_instructions(graph)
+        if cacheable:
+            graph.instructions_by_node_id[node_id] = instructions
+        return instructions
+
+    def _compose_instructions(self, graph: PathwayGraph) -> str:
         base_instructions = []
         
         # 1. Add node-specific prompt/instructions
@@ -413,15 +460,14 @@ class PathwayNodeAgent(Agent):
         
         # 4. Add available transition targets based on pathway edges
         current_node_id = self.node_config.get('id')
-        all_edges = self.pathway_config.get('edges', [])
-        outgoing_edges = [edge for edge in all_edges if edge.get('source') == current_node_id]
+        outgoing_edges = graph.get_outgoing_edges(current_node_id)
         
         if outgoing_edges:
             base_instructions.append("🎯 AVAILABLE DESTINATIONS:")
             for edge in outgoing_edges:
                 condition = edge.get('condition', 'default')
                 target_id = edge.get('target')
-                target_node = next((n for n in self.pathway_config.get('nodes', []) if n.get('id') == target_id), None)
+                target_node = graph.get_node(target_id)
                 if target_node:
                     target_name = target_node.get('name', target_id)
                     target_type = target_node.get('type', 'conversation')
@@ -982,10 +1028,9 @@ class PathwayNodeAgent(Agent):
         
         try:
             current_node_id = self.node_config.get('id')
-            all_edges = self.pathway_config.get('edges', [])
             
             # Find outgoing edges from current app_action node
-            outgoing_edges = [edge for edge in all_edges if edge.get('source') == current_node_id]
+            outgoing_edges = self.session_data.graph.get_outgoing_edges(current_node_id)
             
             if outgoing_edges:
                 # Take the first available edge (app_action nodes typically have one exit)
@@ -1000,8 +1045,7 @@ class PathwayNodeAgent(Agent):
                 logger.info(f"🎯 Auto-transitioning to: {target_node_id}")
                 
                 # Find target node
-                all_nodes = self.pathway_config.get('nodes', [])
-                target_node = next((node for node in all_nodes if node.get('id') == target_node_id), None)
+                target_node = self.session_data.get_node_by_id(target_node_id)
                 
                 if target_node:
                     # Update current node tracking
@@ -102,13 +102,19 @@ class AgentLauncher:
         working_dir = self.agents_dir
         return agent_script_path, env_file_path, working_dir
 
-    async def launch_outbound_agent(self, call_record: Dict[str, Any], agent_id: int) -> bool:
+    async def launch_outbound_agent(
+        self,
+        call_record: Dict[str, Any],
+        agent_id: int,
+        agent_config: Optional[Dict[str, Any]] = None,
+    ) -> bool:
         """
         Launch agent process for outbound call
         
         Args:
             call_record: Database call record
             agent_id: Agent to launch
+            agent_config: Agent row already fetched by the caller (fetched here if omitted)
             
         Returns:
             True if launched successfully
@@ -124,7 +130,8 @@ class AgentLauncher:
             logger.info(f"Launching agent for call {call_id}, agent {agent_id}")
             
             # Get agent configuration
-            agent_config = await self._get_agent_config(agent_id)
+            if agent_config is None:
+                agent_config = await self._get_agent_config(agent_id)
             if not agent_config:
                 logger.error(f"Failed to get agent config for agent {agent_id}")
                 return False
@@ -641,10 +648,14 @@ def get_agent_launcher() -> AgentLauncher:
 
 
 # Convenience functions for external use
-async def launch_outbound_agent(call_record: Dict[str, Any], agent_id: int) -> bool:
+async def launch_outbound_agent(
+    call_record: Dict[str, Any],
+    agent_id: int,
+    agent_config: Optional[Dict[str, Any]] = None,
+) -> bool:
     """Launch agent process for outbound call"""
     launcher = get_agent_launcher()
-    return await launcher.launch_outbound_agent(call_record, agent_id)
+    return await launcher.launch_outbound_agent(call_record, agent_id, agent_config)
 
 async def terminate_agent_for_call(call_id: str) -> bool:
     """Terminate agent process for a call"""
@@ -1,9 +1,13 @@
 # Agent Pathway Integration Module
 # Bridges WorkflowAgent with existing OutboundCaller system
 
+import asyncio
 import logging
 import json
-from typing import Dict, Any, Optional
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
 
 # Import database client
@@ -11,6 +15,18 @@ from db_client import supabase_service_client
 
 logger = logging.getLogger(__name__)
 
+# Call events are buffered in-process and written in batches off the agent's hot path
+PATHWAY_EVENT_FLUSH_INTERVAL_SECONDS = float(os.getenv("PATHWAY_EVENT_FLUSH_INTERVAL_SECONDS", "2.0"))
+PATHWAY_EVENT_BATCH_SIZE = int(os.getenv("PATHWAY_EVENT_BATCH_SIZE", "50"))
+PATHWAY_EVENT_BUFFER_MAX_SIZE = int(os.getenv("PATHWAY_EVENT_BUFFER_MAX_SIZE", "5000"))
+PATHWAY_EXECUTION_CACHE_MAX_SIZE = 1024
+
+# Event types that change the execution record; the rest (metrics, speech) are only logged
+PERSISTED_CALL_EVENT_TYPES = {"call_ended", "user_input", "node_transition"}
+
+# Append-only log of transitions and variable updates (see supabase/migrations)
+PATHWAY_EXECUTION_EVENTS_TABLE = "pathway_execution_events"
+
 async def auto_start_pathway_for_new_call(call_id: str, agent_id: int, session_metadata: Dict[str, Any] = None) -> Optional[str]:
     """
     Auto-start pathway execution for a new call if the agent has a default pathway assigned.
@@ -118,6 +134,7 @@ async def create_pathway_execution(
         
         if response.data:
             logger.info(f"Created pathway execution record: {execution_id}")
+            pathway_event_buffer.register_execution(call_id, execution_id)
             
             # Update call record with pathway execution info
             await link_call_to_pathway_execution(call_id, execution_id, entry_point)
@@ -149,43 +166,171 @@ async def link_call_to_pathway_execution(call_id: str, execution_id: str, curren
     except Exception as e:
         logger.error(f"Error linking call to pathway execution: {e}")
 
-async def handle_call_event(event_type: str, call_id: str, event_data: Dict[str, Any] = None):
+class PathwayEventBuffer:
     """
-    Handle call events that might affect pathway execution
-    
-    Args:
-        event_type: Type of event (started, ended, user_input, etc.)
-        call_id: The call ID
-        event_data: Additional event data
+    In-process buffer for call events.
+
+    emit() only appends to a deque, so it never blocks TTS/LLM streaming. A background
+    task flushes the buffer every PATHWAY_EVENT_FLUSH_INTERVAL_SECONDS or as soon as
+    PATHWAY_EVENT_BATCH_SIZE events are queued, resolving each call's running execution
+    once and applying the batch in a worker thread.
     """
-    try:
-        logger.debug(f"Handling call event: {event_type} for call {call_id}")
+
+    def __init__(
+        self,
+        flush_interval: float = PATHWAY_EVENT_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = PATHWAY_EVENT_BATCH_SIZE,
+        max_size: int = PATHWAY_EVENT_BUFFER_MAX_SIZE,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._events: deque = deque(maxlen=max_size)
+        # call_id -> running execution id. Misses are not cached: the execution may be
+        # created by another process at any time and its events must not be dropped.
+        self._execution_ids: "OrderedDict[str, str]" = OrderedDict()
+        self._execution_ids_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def register_execution(self, call_id: str, execution_id: Optional[str]):
+        """Remember the running execution of a call so events don't have to look it up"""
+        with self._execution_ids_lock:
+            if not execution_id:
+                self._execution_ids.pop(str(call_id), None)
+                return
+            self._execution_ids[str(call_id)] = execution_id
+            self._execution_ids.move_to_end(str(call_id))
+            while len(self._execution_ids) > PATHWAY_EXECUTION_CACHE_MAX_SIZE:
+                self._execution_ids.popitem(last=False)
+
+    def emit(self, event_type: str, call_id: str, event_data: Dict[str, Any] = None):
+        """Queue an event without waiting for the database"""
+        if not call_id:
+            return
+        if len(self._events) == self._events.maxlen:
+            logger.warning("Pathway event buffer full, dropping oldest event")
+        self._events.append((event_type, str(call_id), event_data or {}))
         
-        # Get pathway execution for this call
-        execution_response = supabase_service_client.table("pathway_executions").select("*").eq("call_id", call_id).eq("status", "running").execute()
+        try:
+            self._ensure_flusher()
+        except RuntimeError:
+            # No running loop: the events go out with the next flush()
+            return
+        if len(self._events) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._flush_task and not self._flush_task.done():
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every queued event; also called on job shutdown"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._events:
+                return
+            batch = []
+            while self._events:
+                batch.append(self._events.popleft())
+            try:
+                await asyncio.to_thread(self._apply_batch, batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} pathway events: {e}")
+
+    def _resolve_execution_id(self, call_id: str) -> Optional[str]:
+        with self._execution_ids_lock:
+            execution_id = self._execution_ids.get(call_id)
+        if execution_id:
+            return execution_id
         
-        if not execution_response.data:
-            logger.debug(f"No active pathway execution found for call {call_id}")
+        # Re-queried for every batch of persisted events until found (one query per call per flush)
+        execution_response = supabase_service_client.table("pathway_executions").select("id").eq(
+            "call_id", call_id
+        ).eq("status", "running").limit(1).execute()
+        execution_id = execution_response.data[0]["id"] if execution_response.data else None
+        self.register_execution(call_id, execution_id)
+        return execution_id
+
+    def _apply_batch(self, batch: List[Tuple[str, str, Dict[str, Any]]]):
+        """Apply a batch of events grouped by call (runs in a worker thread)"""
+        events_by_call: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for event_type, call_id, event_data in batch:
+            events_by_call.setdefault(call_id, []).append((event_type, event_data))
+        
+        for call_id, events in events_by_call.items():
+            try:
+                self._apply_call_events(call_id, events)
+            except Exception as e:
+                logger.error(f"Error handling call events for call {call_id}: {e}")
+
+    def _apply_call_events(self, call_id: str, events: List[Tuple[str, Dict[str, Any]]]):
+        persisted = [(t, d) for t, d in events if t in PERSISTED_CALL_EVENT_TYPES]
+        logger.debug(f"Handling {len(events)} call events for call {call_id} ({len(persisted)} persisted)")
+        if not persisted:
             return
         
-        execution_data = execution_response.data[0]
-        execution_id = execution_data["id"]
+        execution_id = self._resolve_execution_id(call_id)
+        if not execution_id:
+            logger.debug(f"No active pathway execution found for call {call_id}")
+            return
         
-        # Handle different event types
-        if event_type == "call_ended":
-            await complete_pathway_execution(execution_id, "call_ended")
-        elif event_type == "user_input":
-            await update_pathway_variables(execution_id, {"last_user_input": event_data.get("input", "")})
-        elif event_type == "node_transition":
-            await log_node_transition(execution_id, event_data)
+        # Transitions and variable updates of the whole batch are appended in a single insert
+        event_rows: List[Dict[str, Any]] = []
+        last_node_id = None
+        call_ended = False
+        for event_type, event_data in persisted:
+            if event_type == "user_input":
+                event_rows.append(_variables_event_row(execution_id, {"last_user_input": event_data.get("input", "")}))
+            elif event_type == "node_transition":
+                event_rows.append(_transition_event_row(execution_id, event_data))
+                last_node_id = event_data.get("to_node")
+            elif event_type == "call_ended":
+                call_ended = True
         
-        logger.debug(f"Processed call event: {event_type} for execution {execution_id}")
+        if event_rows:
+            _append_execution_events_sync(execution_id, event_rows, current_node_id=last_node_id)
+        if call_ended:
+            _complete_pathway_execution_sync(execution_id, "call_ended")
+            with self._execution_ids_lock:
+                self._execution_ids.pop(call_id, None)
         
+        logger.debug(f"Processed {len(persisted)} call events for execution {execution_id}")
+
+
+pathway_event_buffer = PathwayEventBuffer()
+
+
+async def handle_call_event(event_type: str, call_id: str, event_data: Dict[str, Any] = None):
+    """
+    Handle call events that might affect pathway execution.
+    Events are buffered and applied in batches by pathway_event_buffer; this never waits on the database.
+    
+    Args:
+        event_type: Type of event (started, ended, user_input, etc.)
+        call_id: The call ID
+        event_data: Additional event data
+    """
+    try:
+        pathway_event_buffer.emit(event_type, call_id, event_data)
     except Exception as e:
         logger.error(f"Error handling call event {event_type} for call {call_id}: {e}")
 
-async def complete_pathway_execution(execution_id: str, completion_reason: str = "completed"):
-    """Mark a pathway execution as completed"""
+def _complete_pathway_execution_sync(execution_id: str, completion_reason: str = "completed"):
     try:
         update_data = {
             "status": "completed",
@@ -200,62 +345,82 @@ async def complete_pathway_execution(execution_id: str, completion_reason: str =
     except Exception as e:
         logger.error(f"Error completing pathway execution {execution_id}: {e}")
 
-async def update_pathway_variables(execution_id: str, new_variables: Dict[str, Any]):
-    """Update pathway variables for an execution"""
+async def complete_pathway_execution(execution_id: str, completion_reason: str = "completed"):
+    """Mark a pathway execution as completed"""
+    _complete_pathway_execution_sync(execution_id, completion_reason)
+
+def _variables_event_row(execution_id: str, new_variables: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "execution_id": execution_id,
+        "event_type": "variables_updated",
+        "payload": new_variables,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+def _transition_event_row(execution_id: str, transition_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "execution_id": execution_id,
+        "event_type": "node_transition",
+        "node_id": transition_data.get("to_node"),
+        "payload": {"result": transition_data.get("result", {})},
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+def _append_execution_events_sync(execution_id: str, event_rows: List[Dict[str, Any]], current_node_id: Optional[str] = None):
+    """Append events without reading the execution back; cost doesn't grow with the trace"""
     try:
-        # Get current variables
-        execution_response = supabase_service_client.table("pathway_executions").select("variables").eq("id", execution_id).single().execute()
+        supabase_service_client.table(PATHWAY_EXECUTION_EVENTS_TABLE).insert(event_rows).execute()
         
-        if execution_response.data:
-            current_variables = execution_response.data.get("variables", {})
-            current_variables.update(new_variables)
-            
-            # Update in database
-            response = supabase_service_client.table("pathway_executions").update({
-                "variables": current_variables,
+        if current_node_id is not None:
+            supabase_service_client.table("pathway_executions").update({
+                "current_node_id": current_node_id,
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }).eq("id", execution_id).execute()
-            
-            if response.data:
-                logger.debug(f"Updated pathway variables for execution {execution_id}")
+        
+        logger.debug(f"Appended {len(event_rows)} events for execution {execution_id}")
         
     except Exception as e:
-        logger.error(f"Error updating pathway variables for execution {execution_id}: {e}")
+        logger.error(f"Error appending events for execution {execution_id}: {e}")
+
+async def update_pathway_variables(execution_id: str, new_variables: Dict[str, Any]):
+    """Update pathway variables for an execution"""
+    _append_execution_events_sync(execution_id, [_variables_event_row(execution_id, new_variables)])
 
 async def log_node_transition(execution_id: str, transition_data: Dict[str, Any]):
     """Log a node transition in the pathway execution"""
-    try:
-        # Get current execution trace
-        execution_response = supabase_service_client.table("pathway_executions").select("execution_trace, current_node_id").eq("id", execution_id).single().execute()
-        
-        if execution_response.data:
-            current_trace = execution_response.data.get("execution_trace", [])
-            
-            # Add new transition to trace
-            transition_entry = {
-                "from_node": execution_response.data.get("current_node_id"),
-                "to_node": transition_data.get("to_node"),
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "result": transition_data.get("result", {}),
+    _append_execution_events_sync(
+        execution_id,
+        [_transition_event_row(execution_id, transition_data)],
+        current_node_id=transition_data.get("to_node"),
+    )
+
+def materialize_pathway_execution(execution: Dict[str, Any], events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fold the append-only events (ordered by id) into the execution's
+    execution_trace / variables / current_node_id, as previously stored on the row.
+    """
+    trace = list(execution.get("execution_trace") or [])
+    variables = dict(execution.get("variables") or {})
+    
+    current_node = None
+    if trace:
+        current_node = trace[-1].get("to_node") or trace[-1].get("node")
+    
+    for event in events:
+        payload = event.get("payload") or {}
+        if event.get("event_type") == "node_transition":
+            trace.append({
+                "from_node": current_node,
+                "to_node": event.get("node_id"),
+                "timestamp": event.get("created_at"),
+                "result": payload.get("result", {}),
                 "action": "node_transition"
-            }
-            
-            current_trace.append(transition_entry)
-            
-            # Update in database
-            update_data = {
-                "execution_trace": current_trace,
-                "current_node_id": transition_data.get("to_node"),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            response = supabase_service_client.table("pathway_executions").update(update_data).eq("id", execution_id).execute()
-            
-            if response.data:
-                logger.debug(f"Logged node transition for execution {execution_id}")
-        
-    except Exception as e:
-        logger.error(f"Error logging node transition for execution {execution_id}: {e}")
+            })
+            current_node = event.get("node_id")
+        elif event.get("event_type") == "variables_updated":
+            variables.update(payload)
+    
+    return {**execution, "execution_trace": trace, "variables": variables}
 
 def get_agent_pathway_manager():
     """
@@ -265,6 +430,7 @@ def get_agent_pathway_manager():
     return {
         "auto_start_pathway": auto_start_pathway_for_new_call,
         "handle_event": handle_call_event,
+        "flush_events": pathway_event_buffer.flush,
         "complete_execution": complete_pathway_execution
     }
 
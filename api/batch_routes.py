@@ -3,24 +3,48 @@ Batch Campaign Routes for handling bulk calling operations.
 """
 
 import asyncio
+import codecs
 import csv
+import heapq
 import io
 import json
 import logging
+import os
+import threading
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from fastapi import APIRouter, HTTPException, status, Header, UploadFile, File, BackgroundTasks
 from pydantic import BaseModel, Field, validator
+from postgrest.types import ReturnMethod
 from supabase import create_client
 from gotrue.errors import AuthApiError
 
-from api.config import BaseModel as ConfigBaseModel
-from api.db_client import supabase_service_client
+from api.config import BaseModel as ConfigBaseModel, get_user_id_from_token
+from api.db_client import supabase_async_client
+from api.live_call_registry import live_call_registry
+from api.call_initiation import AgentCallContext, CallInitiationError, initiate_agent_call, resolve_agent_call_context
+from api.scheduler_lease import (
+    SCHEDULER_LEASE_RENEW_SECONDS,
+    SCHEDULER_LEASE_TTL_SECONDS,
+    release_lease,
+    try_acquire_lease,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/batch-campaigns", tags=["batch_campaigns"])
 
+# Longest the campaign scheduler sleeps before resyncing from the database
+CAMPAIGN_SCHEDULER_RESYNC_SECONDS = int(os.getenv("CAMPAIGN_SCHEDULER_RESYNC_SECONDS", "300"))
+# Rows per bulk insert when adding call items to a campaign
+BATCH_ITEM_INSERT_CHUNK_SIZE = int(os.getenv("BATCH_ITEM_INSERT_CHUNK_SIZE", "1000"))
+# Bytes read from an uploaded CSV per iteration
+CSV_UPLOAD_READ_SIZE = 64 * 1024
+# Per-row errors returned for an upload; further invalid rows are only counted
+CSV_UPLOAD_MAX_REPORTED_ERRORS = int(os.getenv("CSV_UPLOAD_MAX_REPORTED_ERRORS", "1000"))
+CSV_PREVIEW_ROWS = 10
+
 # ===== Pydantic Models =====
 
 from typing import ClassVar
@@ -104,6 +128,11 @@ class BatchCampaignResponse(BaseModel):
     completed_at: Optional[datetime]
     created_at: datetime
     updated_at: datetime
+    # Progress of the last CSV import into the campaign
+    import_status: Optional[str] = None
+    import_processed_rows: int = 0
+    import_inserted_rows: int = 0
+    import_invalid_rows: int = 0
 
 class BatchCallItemResponse(BaseModel):
     id: str
@@ -153,7 +182,7 @@ class CampaignProgressResponse(BaseModel):
 async def verify_user_access_to_campaign(campaign_id: str, user_id: str) -> Dict[str, Any]:
     """Verify user has access to campaign and return campaign data"""
     try:
-        campaign_response = supabase_service_client.table("batch_campaigns").select("*").eq("id", campaign_id).eq("user_id", user_id).single().execute()
+        campaign_response = await supabase_async_client.table("batch_campaigns").select("*").eq("id", campaign_id).eq("user_id", user_id).single().execute()
         
         if not campaign_response.data:
             raise HTTPException(status_code=404, detail="Campaign not found or access denied")
@@ -166,7 +195,7 @@ async def verify_user_access_to_campaign(campaign_id: str, user_id: str) -> Dict
 async def verify_agent_belongs_to_user(agent_id: int, user_id: str) -> Dict[str, Any]:
     """Verify agent belongs to user and return agent data"""
     try:
-        agent_response = supabase_service_client.table("agents").select("*").eq("id", agent_id).eq("user_id", user_id).single().execute()
+        agent_response = await supabase_async_client.table("agents").select("*").eq("id", agent_id).eq("user_id", user_id).single().execute()
         
         if not agent_response.data:
             raise HTTPException(status_code=404, detail="Agent not found or access denied")
@@ -176,134 +205,121 @@ async def verify_agent_belongs_to_user(agent_id: int, user_id: str) -> Dict[str,
         logger.error(f"Error verifying agent access: {e}")
         raise HTTPException(status_code=500, detail="Failed to verify agent access")
 
-async def check_and_start_scheduled_campaigns():
-    """Background task to check for scheduled campaigns and start them"""
+async def start_scheduled_campaign(campaign_id: str):
+    """Start a campaign whose scheduled time has come, unless it left the scheduled state meanwhile"""
     try:
-        logger.info("Checking for scheduled campaigns to start...")
-        
-        # Get campaigns that are scheduled to start
         current_time = datetime.now(timezone.utc)
         
-        scheduled_campaigns_response = supabase_service_client.table("batch_campaigns").select("*").eq("status", "scheduled").lte("scheduled_at", current_time.isoformat()).execute()
+        # Claim the campaign: only a campaign still scheduled and due moves to running
+        claim_response = await supabase_async_client.table("batch_campaigns").update({
+            "status": "running",
+            "started_at": current_time.isoformat()
+        }).eq("id", campaign_id).eq("status", "scheduled").lte("scheduled_at", current_time.isoformat()).execute()
+        
+        if not claim_response.data:
+            logger.info(f"Campaign {campaign_id} is no longer scheduled or not due yet, not starting it")
+            return
         
-        scheduled_campaigns = scheduled_campaigns_response.data or []
+        logger.info(f"Starting scheduled campaign: {campaign_id}")
         
-        if not scheduled_campaigns:
-            logger.debug("No scheduled campaigns ready to start")
+        # Execute the campaign
+        success = await execute_batch_campaign(campaign_id)
+        
+        if success:
+            logger.info(f"Successfully started scheduled campaign: {campaign_id}")
         else:
-            logger.info(f"Found {len(scheduled_campaigns)} scheduled campaigns ready to start")
+            logger.error(f"Failed to start scheduled campaign: {campaign_id}")
+            # Update status to failed
+            await supabase_async_client.table("batch_campaigns").update({
+                "status": "failed"
+            }).eq("id", campaign_id).execute()
             
-            for campaign in scheduled_campaigns:
-                campaign_id = campaign["id"]
-                try:
-                    logger.info(f"Starting scheduled campaign: {campaign_id}")
-                    
-                    # Update status to running and set started_at
-                    supabase_service_client.table("batch_campaigns").update({
-                        "status": "running",
-                        "started_at": current_time.isoformat()
-                    }).eq("id", campaign_id).execute()
-                    
-                    # Execute the campaign
-                    success = await execute_batch_campaign(campaign_id)
-                    
-                    if success:
-                        logger.info(f"Successfully started scheduled campaign: {campaign_id}")
-                    else:
-                        logger.error(f"Failed to start scheduled campaign: {campaign_id}")
-                        # Update status to failed
-                        supabase_service_client.table("batch_campaigns").update({
-                            "status": "failed"
-                        }).eq("id", campaign_id).execute()
-                        
-                except Exception as e:
-                    logger.error(f"Error starting scheduled campaign {campaign_id}: {e}")
-                    # Update status to failed
-                    try:
-                        supabase_service_client.table("batch_campaigns").update({
-                            "status": "failed"
-                        }).eq("id", campaign_id).execute()
-                    except Exception as update_e:
-                        logger.error(f"Failed to update campaign status to failed: {update_e}")
-        
-        # ===== NEW: Check for campaigns to mark as completed =====
-        await check_and_complete_finished_campaigns()
-                    
     except Exception as e:
-        logger.error(f"Error in scheduled campaigns checker: {e}")
+        logger.error(f"Error starting scheduled campaign {campaign_id}: {e}")
+        # Update status to failed
+        try:
+            await supabase_async_client.table("batch_campaigns").update({
+                "status": "failed"
+            }).eq("id", campaign_id).execute()
+        except Exception as update_e:
+            logger.error(f"Failed to update campaign status to failed: {update_e}")
+
+def campaign_items_finished(campaign: Dict[str, Any]) -> bool:
+    """True once no call item of the campaign is pending or in progress.
+
+    Reads the item counters kept on batch_campaigns by the batch_call_items triggers.
+    """
+    return (campaign.get("items_pending") or 0) == 0 and (campaign.get("items_in_progress") or 0) == 0
 
 async def check_and_complete_finished_campaigns():
     """Check for running campaigns that should be marked as completed"""
     try:
         logger.debug("Checking for campaigns to mark as completed...")
         
-        # Get all running campaigns
-        running_campaigns_response = supabase_service_client.table("batch_campaigns").select("*").eq("status", "running").execute()
-        running_campaigns = running_campaigns_response.data or []
-        
-        if not running_campaigns:
-            return
-        
-        logger.debug(f"Found {len(running_campaigns)} running campaigns to check")
+        # Running campaigns without pending or in-progress items, from the item counters
+        finished_campaigns_response = await supabase_async_client.table("batch_campaigns").select(
+            "id, items_completed, items_failed, items_cancelled"
+        ).eq("status", "running").eq("items_pending", 0).eq("items_in_progress", 0).execute()
+        finished_campaigns = finished_campaigns_response.data or []
         
-        for campaign in running_campaigns:
+        for campaign in finished_campaigns:
             campaign_id = campaign["id"]
-            
-            try:
-                # Get call items for this campaign
-                items_response = supabase_service_client.table("batch_call_items").select("id, status").eq("batch_campaign_id", campaign_id).execute()
-                call_items = items_response.data or []
-                
-                if not call_items:
-                    logger.warning(f"Campaign {campaign_id} has no call items, marking as completed")
-                    # Mark as completed if no items
-                    await mark_campaign_completed(campaign_id)
-                    continue
-                
-                # Check if all items are in a final state
-                final_statuses = {"completed", "failed", "cancelled"}
-                pending_statuses = {"pending", "calling", "retrying"}
-                
-                total_items = len(call_items)
-                final_items = len([item for item in call_items if item.get("status") in final_statuses])
-                pending_items = len([item for item in call_items if item.get("status") in pending_statuses])
-                
-                logger.debug(f"Campaign {campaign_id}: {final_items}/{total_items} items finished, {pending_items} pending")
-                
-                # If all items are in final state, mark campaign as completed
-                if final_items == total_items and pending_items == 0:
-                    logger.info(f"All items finished for campaign {campaign_id}, marking as completed")
-                    await mark_campaign_completed(campaign_id)
-                
-            except Exception as e:
-                logger.error(f"Error checking completion status for campaign {campaign_id}: {e}")
+            final_items = (campaign.get("items_completed") or 0) + (campaign.get("items_failed") or 0) + (campaign.get("items_cancelled") or 0)
+            if final_items == 0:
+                logger.warning(f"Campaign {campaign_id} has no call items, marking as completed")
+            else:
+                logger.info(f"All {final_items} items finished for campaign {campaign_id}, marking as completed")
+            await mark_campaign_completed(campaign_id)
                 
     except Exception as e:
         logger.error(f"Error checking finished campaigns: {e}")
 
-async def mark_campaign_completed(campaign_id: str):
-    """Mark a campaign as completed and set completion timestamp"""
+async def mark_campaign_completed(campaign_id: str, from_statuses: tuple = ("running",)):
+    """Mark a campaign as completed and set completion timestamp, if its status is one of ``from_statuses``"""
     try:
         current_time = datetime.now(timezone.utc).isoformat()
         
-        update_response = supabase_service_client.table("batch_campaigns").update({
+        update_response = await supabase_async_client.table("batch_campaigns").update({
             "status": "completed",
             "completed_at": current_time
-        }).eq("id", campaign_id).execute()
+        }).eq("id", campaign_id).in_("status", list(from_statuses)).execute()
         
         if update_response.data:
             logger.info(f"✅ Marked campaign {campaign_id} as completed")
         else:
-            logger.error(f"Failed to mark campaign {campaign_id} as completed")
+            # Already completed by a concurrent check, or status changed meanwhile
+            logger.info(f"Campaign {campaign_id} was not in status {from_statuses} anymore, left as is")
             
     except Exception as e:
         logger.error(f"Error marking campaign {campaign_id} as completed: {e}")
 
-async def execute_batch_campaign(campaign_id: str) -> bool:
-    """Execute a batch campaign by creating individual LiveKit call jobs"""
+def dispatcher_lease_name(campaign_id: str) -> str:
+    return f"campaign_dispatcher:{campaign_id}"
+
+async def execute_batch_campaign(campaign_id: str, resume: bool = False) -> bool:
+    """Start a batch campaign and hand its call items to a CampaignDispatcher.
+
+    With resume, the campaign is already running (its dispatcher died with its worker)
+    and its status and started_at are left as they are.
+    """
+    if campaign_id in _campaign_dispatchers:
+        logger.warning(f"Campaign {campaign_id} is already being dispatched")
+        return True
+    
+    # One dispatcher per campaign across workers: the lease is held and renewed by the dispatcher
+    lease_name = dispatcher_lease_name(campaign_id)
+    try:
+        if not await try_acquire_lease(lease_name):
+            logger.info(f"Campaign {campaign_id} is being dispatched by another worker")
+            return True
+    except Exception as e:
+        logger.error(f"Error acquiring dispatcher lease of campaign {campaign_id}: {e}")
+        return False
+    
+    started = False
     try:
         # Get campaign details
-        campaign_response = supabase_service_client.table("batch_campaigns").select("*").eq("id", campaign_id).single().execute()
+        campaign_response = await supabase_async_client.table("batch_campaigns").select("*").eq("id", campaign_id).single().execute()
         
         if not campaign_response.data:
             logger.error(f"Campaign {campaign_id} not found")
@@ -312,150 +328,41 @@ async def execute_batch_campaign(campaign_id: str) -> bool:
         campaign = campaign_response.data
         
         # Get agent details
-        agent_response = supabase_service_client.table("agents").select("*").eq("id", campaign["agent_id"]).single().execute()
+        agent_response = await supabase_async_client.table("agents").select("*").eq("id", campaign["agent_id"]).single().execute()
         
         if not agent_response.data:
             logger.error(f"Agent {campaign['agent_id']} not found for campaign {campaign_id}")
             return False
         
-        agent = agent_response.data
+        # Agent, caller ID and trunk are shared by every call of the campaign
+        call_context = await resolve_agent_call_context(campaign["agent_id"], agent_response.data)
         
-        # Get pending call items for this campaign
-        items_response = supabase_service_client.table("batch_call_items").select("*").eq("batch_campaign_id", campaign_id).eq("status", "pending").execute()
+        # Count pending call items for this campaign (the dispatcher pages through them)
+        items_response = await supabase_async_client.table("batch_call_items").select("id", count="exact").eq("batch_campaign_id", campaign_id).eq("status", "pending").limit(1).execute()
         
-        call_items = items_response.data or []
+        pending_count = items_response.count or 0
         
-        if not call_items:
+        if not pending_count:
             logger.warning(f"No pending call items found for campaign {campaign_id}")
             return True
         
-        # Update campaign status to running
-        supabase_service_client.table("batch_campaigns").update({
-            "status": "running",
-            "started_at": datetime.now(timezone.utc).isoformat()
-        }).eq("id", campaign_id).execute()
-        
-        logger.info(f"Starting execution of campaign {campaign_id} with {len(call_items)} call items")
-        
-        # Create LiveKit call jobs for each call item (respecting concurrency limit)
-        from livekit.api import LiveKitAPI, CreateRoomRequest
-        import os
+        if not resume:
+            # Update campaign status to running
+            await supabase_async_client.table("batch_campaigns").update({
+                "status": "running",
+                "started_at": datetime.now(timezone.utc).isoformat()
+            }).eq("id", campaign_id).execute()
         
-        livekit_api = LiveKitAPI(
-            url=os.getenv("LIVEKIT_URL"),
-            api_key=os.getenv("LIVEKIT_API_KEY"),
-            api_secret=os.getenv("LIVEKIT_API_SECRET")
-        )
+        if campaign_id in _campaign_dispatchers:
+            # Started concurrently in this worker while we were reading the campaign
+            return True
         
-        # Process calls with concurrency limit
-        concurrency_limit = campaign.get("concurrency_limit", 3)
-        active_calls = 0
+        logger.info(f"{'Resuming' if resume else 'Starting'} execution of campaign {campaign_id} with {pending_count} pending call items")
         
-        for item in call_items[:concurrency_limit]:  # Start with first batch
-            try:
-                # Create room for this call
-                room_name = f"batch-call-{item['id']}"
-                
-                room_request = CreateRoomRequest(
-                    name=room_name,
-                    empty_timeout=300,  # 5 minutes
-                    departure_timeout=60  # 1 minute
-                )
-                
-                room = await livekit_api.room.create_room(room_request)
-                
-                # Create call record in database
-                call_data = {
-                    "user_id": campaign["user_id"],
-                    "agent_id": campaign["agent_id"],
-                    "phone_number_e164": item["phone_number_e164"],
-                    "contact_name": item.get("contact_name"),
-                    "status": "calling",
-                    "room_name": room_name,
-                    "call_type": "outbound_batch",
-                    "batch_campaign_id": campaign_id,
-                    "batch_call_item_id": item["id"]
-                }
-                
-                call_response = supabase_service_client.table("calls").insert(call_data).execute()
-                
-                if call_response.data:
-                    call_id = call_response.data[0]["id"]
-                    
-                    # Update call item status
-                    supabase_service_client.table("batch_call_items").update({
-                        "status": "calling",
-                        "call_id": str(call_id),
-                        "attempts": 1,
-                        "last_attempt_at": datetime.now(timezone.utc).isoformat()
-                    }).eq("id", item["id"]).execute()
-                    
-                    # Dispatch agent to the room with batch context
-                    job_metadata = {
-                        "agent_id": str(campaign["agent_id"]),
-                        "phone_number": item["phone_number_e164"],
-                        "contact_name": item.get("contact_name", ""),
-                        "custom_data": item.get("custom_data", {}),
-                        "batch_campaign_id": campaign_id,
-                        "batch_call_item_id": item["id"],
-                        "supabase_call_id": str(call_id)
-                    }
-                    
-                    # Create a dispatch call job for the LiveKit worker
-                    # This creates a SIP outbound call through the existing agent system
-                    import httpx
-                    try:
-                        backend_url = os.getenv("BACKEND_API_URL", "http://localhost:8000")
-                        agent_call_payload = {
-                            "agent_id": campaign["agent_id"],
-                            "phoneNumber": item["phone_number_e164"],
-                            "lastName": item.get("contact_name", ""),
-                            # Include batch context so the call gets linked properly
-                            "batch_campaign_id": campaign_id,
-                            "batch_call_item_id": item["id"]
-                        }
-                        
-                        async with httpx.AsyncClient() as client:
-                            call_response = await client.post(
-                                f"{backend_url}/agents/call",
-                                json=agent_call_payload,
-                                timeout=30.0
-                            )
-                            
-                        if call_response.status_code == 200:
-                            logger.info(f"Successfully dispatched agent call for {item['phone_number_e164']}")
-                        else:
-                            logger.error(f"Failed to dispatch agent call: {call_response.status_code} - {call_response.text}")
-                            
-                    except Exception as dispatch_error:
-                        logger.error(f"Error dispatching agent call: {dispatch_error}")
-                        # Continue with room metadata update as fallback
-                        try:
-                            await livekit_api.room.update_room_metadata(
-                                room=room_name,
-                                metadata=json.dumps(job_metadata)
-                            )
-                        except Exception as metadata_error:
-                            logger.error(f"Fallback room metadata update failed: {metadata_error}")
-                    
-                    logger.info(f"Created call job for {item['phone_number_e164']} in room {room_name}")
-                    active_calls += 1
-                    
-                else:
-                    logger.error(f"Failed to create call record for item {item['id']}")
-                    
-            except Exception as e:
-                logger.error(f"Error creating call job for item {item['id']}: {e}")
-                
-                # Mark call item as failed
-                supabase_service_client.table("batch_call_items").update({
-                    "status": "failed",
-                    "error_message": str(e),
-                    "attempts": 1,
-                    "last_attempt_at": datetime.now(timezone.utc).isoformat()
-                }).eq("id", item["id"]).execute()
-        
-        logger.info(f"Started {active_calls} calls for campaign {campaign_id}")
+        dispatcher = CampaignDispatcher(campaign, call_context)
+        _campaign_dispatchers[campaign_id] = dispatcher
+        dispatcher.task = asyncio.create_task(dispatcher.run())
+        started = True
         return True
         
     except Exception as e:
@@ -463,7 +370,7 @@ async def execute_batch_campaign(campaign_id: str) -> bool:
         
         # Update campaign status to failed
         try:
-            supabase_service_client.table("batch_campaigns").update({
+            await supabase_async_client.table("batch_campaigns").update({
                 "status": "failed",
                 "completed_at": datetime.now(timezone.utc).isoformat()
             }).eq("id", campaign_id).execute()
@@ -471,101 +378,484 @@ async def execute_batch_campaign(campaign_id: str) -> bool:
             pass
             
         return False
+    finally:
+        if not started and campaign_id not in _campaign_dispatchers:
+            await release_lease(lease_name)
 
-# Scheduled campaigns functionality removed for simplicity
+async def resume_running_campaigns():
+    """Restart a dispatcher for running campaigns that have none (their worker stopped or crashed)"""
+    response = await supabase_async_client.table("batch_campaigns").select("id").eq("status", "running").execute()
+    for campaign in response.data or []:
+        if campaign["id"] not in _campaign_dispatchers:
+            # Skipped while another worker's dispatcher still holds the campaign lease
+            await execute_batch_campaign(campaign["id"], resume=True)
 
-def parse_csv_content(csv_content: str) -> CSVUploadResponse:
-    """Parse CSV content and validate phone numbers"""
-    errors = []
-    valid_rows = []
-    invalid_rows = 0
-    
+async def dispatch_batch_call_item(campaign: Dict[str, Any], item: Dict[str, Any], call_context: AgentCallContext) -> bool:
+    """Initiate the agent call of one call item in-process. Returns True if the call is in flight."""
+    campaign_id = campaign["id"]
     try:
-        # Remove BOM if present
-        if csv_content.startswith('\ufeff'):
-            csv_content = csv_content[1:]
-        
-        # Clean up any carriage returns
-        csv_content = csv_content.replace('\r\n', '\n').replace('\r', '\n')
-        
-        # Parse CSV with different potential delimiters
-        # First try comma, then semicolon
-        csv_reader = None
-        detected_delimiter = ','
-        
-        # Detect delimiter by checking first line
-        first_line = csv_content.split('\n')[0] if csv_content else ""
-        if ';' in first_line and ',' not in first_line:
-            detected_delimiter = ';'
-            logger.info(f"Detected semicolon delimiter in CSV")
-        elif ',' in first_line:
-            detected_delimiter = ','
-            logger.info(f"Detected comma delimiter in CSV")
-        
-        csv_reader = csv.DictReader(io.StringIO(csv_content), delimiter=detected_delimiter)
-        
-        # Validate headers
-        expected_headers = {'phone_number', 'name'}  # Required headers
-        # Clean and normalize headers (remove whitespace, convert to lowercase for comparison)
-        raw_headers = csv_reader.fieldnames or []
-        cleaned_headers = [h.strip().lower() if h else "" for h in raw_headers]
-        actual_headers = set(cleaned_headers)
-        
-        logger.info(f"CSV headers detected (raw): {raw_headers}")
-        logger.info(f"CSV headers detected (cleaned): {list(actual_headers)}")
-        
-        if 'phone_number' not in actual_headers:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"CSV must contain 'phone_number' column. Found headers: {raw_headers}"
-            )
+        # Marked calling before the call exists: its first status updates may arrive before we return
+        # (retried items keep the attempt count set on retry)
+        await supabase_async_client.table("batch_call_items").update({
+            "status": "calling",
+            "attempts": max(item.get("attempts") or 0, 1),
+            "last_attempt_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", item["id"]).execute()
+        
+        call = await initiate_agent_call(
+            call_context,
+            item["phone_number_e164"],
+            batch_campaign_id=campaign_id,
+            batch_call_item_id=item["id"],
+        )
         
-        # Create a mapping from cleaned headers back to original headers
-        header_mapping = {}
-        for raw, cleaned in zip(raw_headers, cleaned_headers):
-            header_mapping[cleaned] = raw
+        await supabase_async_client.table("batch_call_items").update({
+            "call_id": str(call["call_id"])
+        }).eq("id", item["id"]).execute()
         
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 for header
-            # Get values using the header mapping to handle case/whitespace differences
-            phone_number_key = header_mapping.get('phone_number')
-            name_key = header_mapping.get('name')
-            
-            phone_number = row.get(phone_number_key, '').strip() if phone_number_key else ''
-            name = row.get(name_key, '').strip() if name_key else ''
-            
-            # Validate phone number
+        logger.info(f"Successfully dispatched agent call for {item['phone_number_e164']} in room {call['room_name']}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error creating call job for item {item['id']}: {e}")
+        
+        # Mark call item as failed
+        try:
+            failed_update = {
+                "status": "failed",
+                "error_message": str(e),
+                "attempts": max(item.get("attempts") or 0, 1),
+                "last_attempt_at": datetime.now(timezone.utc).isoformat()
+            }
+            if isinstance(e, CallInitiationError) and e.call_id:
+                failed_update["call_id"] = str(e.call_id)
+            await supabase_async_client.table("batch_call_items").update(failed_update).eq("id", item["id"]).execute()
+        except Exception as update_e:
+            logger.error(f"Failed to mark call item {item['id']} as failed: {update_e}")
+        return False
+
+# ===== Campaign Dispatcher =====
+
+# How often a waiting dispatcher reads the campaign's items_in_progress counter: status
+# updates handled by another worker only show up there
+DISPATCHER_POLL_INTERVAL_SECONDS = float(os.getenv("DISPATCHER_POLL_INTERVAL_SECONDS", "2"))
+# How often in-flight items are re-read even though the counter did not move
+DISPATCHER_RECONCILE_INTERVAL_SECONDS = 60
+
+class CampaignDispatcher:
+    """Keeps exactly `concurrency_limit` calls of a campaign in flight.
+
+    A slot is refilled as soon as one of the in-flight items leaves the 'calling'
+    state, until no pending item is left. Status updates handled by this worker
+    release the slot right away (update_batch_call_item_from_call_status); those
+    handled by other workers are seen within DISPATCHER_POLL_INTERVAL_SECONDS as a drop
+    of the campaign's items_in_progress counter, maintained by triggers on the items.
+    """
+    
+    def __init__(self, campaign: Dict[str, Any], call_context: AgentCallContext):
+        self.campaign = campaign
+        self.call_context = call_context
+        self.campaign_id = campaign["id"]
+        self.concurrency_limit = campaign.get("concurrency_limit") or 3
+        self.in_flight: set = set()  # call item ids currently holding a slot
+        self.task: Optional[asyncio.Task] = None
+        self._stopped = False
+        self._loop = asyncio.get_running_loop()
+        self._slot_released = asyncio.Event()
+        self._lease_name = dispatcher_lease_name(self.campaign_id)
+        self._reconciled_at = time.monotonic()
+    
+    def release(self, call_item_id: str):
+        """Free the slot held by a call item. Safe to call from any thread or event loop."""
+        self._loop.call_soon_threadsafe(self._release, call_item_id)
+    
+    def _release(self, call_item_id: str):
+        self.in_flight.discard(call_item_id)
+        self._slot_released.set()
+    
+    def _stop(self):
+        self._stopped = True
+        self._slot_released.set()
+    
+    async def _keep_lease(self):
+        """Renew the campaign lease taken by execute_batch_campaign; stop dispatching if it is lost"""
+        renewed_at = time.monotonic()
+        while not self._stopped:
+            await asyncio.sleep(SCHEDULER_LEASE_RENEW_SECONDS)
             try:
-                # Add + if missing
-                if phone_number and not phone_number.startswith('+'):
-                    phone_number = '+' + phone_number
+                if await try_acquire_lease(self._lease_name):
+                    renewed_at = time.monotonic()
+                    continue
+                logger.warning(f"Dispatcher lease of campaign {self.campaign_id} taken over, stopping dispatcher")
+                self._stop()
+            except Exception as e:
+                logger.error(f"Error renewing dispatcher lease of campaign {self.campaign_id}: {e}")
+                # Without renewal another worker may resume the campaign once the lease expires
+                if time.monotonic() - renewed_at > SCHEDULER_LEASE_TTL_SECONDS - SCHEDULER_LEASE_RENEW_SECONDS:
+                    self._stop()
+    
+    async def run(self):
+        dispatched = 0
+        
+        live_call_registry.campaign_started(self.campaign.get("user_id"), self.campaign_id, self.campaign.get("name"))
+        lease_task = asyncio.create_task(self._keep_lease())
+        try:
+            while not self._stopped:
+                # Cleared before reading in_flight so a release during the awaits below is not lost
+                self._slot_released.clear()
                 
-                # Validate using our model
-                item = BatchCallItemCreateRequest(
-                    phone_number_e164=phone_number,
-                    contact_name=name if name else None,
-                    custom_data={k: v for k, v in row.items() if k not in [phone_number_key, name_key] and v}
-                )
-                valid_rows.append(item.dict())
+                items = []
+                free_slots = self.concurrency_limit - len(self.in_flight)
+                if free_slots > 0:
+                    items_response = await supabase_async_client.table("batch_call_items").select("*").eq("batch_campaign_id", self.campaign_id).eq("status", "pending").order("created_at").limit(free_slots).execute()
+                    items = items_response.data or []
                 
-            except Exception as e:
-                invalid_rows += 1
-                errors.append({
+                # Items of a page are initiated together, the call pacer spaces out the dispatches.
+                # Their slots are taken first so a call that ends during the gather frees its slot.
+                self.in_flight.update(item["id"] for item in items)
+                results = await asyncio.gather(*(
+                    dispatch_batch_call_item(self.campaign, item, self.call_context) for item in items
+                ))
+                for item, in_flight in zip(items, results):
+                    if in_flight:
+                        dispatched += 1
+                    else:
+                        self.in_flight.discard(item["id"])
+                
+                if not self.in_flight:
+                    if not items:
+                        break  # Nothing pending and nothing in flight: campaign drained
+                    # Every item of this page failed to dispatch, fetch the next ones
+                    await asyncio.sleep(1)
+                    continue
+                
+                try:
+                    await asyncio.wait_for(self._slot_released.wait(), timeout=DISPATCHER_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    await self._poll_campaign()
+        except Exception as e:
+            logger.error(f"Dispatcher for campaign {self.campaign_id} stopped on error: {e}")
+        finally:
+            lease_task.cancel()
+            _campaign_dispatchers.pop(self.campaign_id, None)
+            live_call_registry.campaign_finished(self.campaign.get("user_id"), self.campaign_id)
+            await release_lease(self._lease_name)
+        
+        logger.info(f"Dispatcher for campaign {self.campaign_id} finished after dispatching {dispatched} calls")
+        await check_specific_campaign_completion(self.campaign_id)
+    
+    async def _poll_campaign(self):
+        """Stop if the campaign is no longer running, reconcile in-flight items when fewer are in progress"""
+        campaign_response = await supabase_async_client.table("batch_campaigns").select(
+            "status, items_in_progress"
+        ).eq("id", self.campaign_id).single().execute()
+        if not campaign_response.data or campaign_response.data.get("status") != "running":
+            logger.info(f"Campaign {self.campaign_id} is no longer running, stopping dispatcher")
+            self._stop()
+            return
+        
+        in_progress = campaign_response.data.get("items_in_progress") or 0
+        if in_progress < len(self.in_flight) or time.monotonic() - self._reconciled_at > DISPATCHER_RECONCILE_INTERVAL_SECONDS:
+            await self._reconcile_in_flight()
+    
+    async def _reconcile_in_flight(self):
+        """Drop in-flight items whose status changed without a release"""
+        self._reconciled_at = time.monotonic()
+        if not self.in_flight:
+            return
+        items_response = await supabase_async_client.table("batch_call_items").select("id, status").in_("id", list(self.in_flight)).execute()
+        statuses = {item["id"]: item.get("status") for item in items_response.data or []}
+        self.in_flight = {item_id for item_id in self.in_flight if statuses.get(item_id) == "calling"}
+
+# Active dispatchers by campaign id
+_campaign_dispatchers: Dict[str, CampaignDispatcher] = {}
+
+class CampaignScheduler:
+    """Starts scheduled campaigns at their scheduled_at from an in-process due-time heap.
+
+    The schedule and delete endpoints keep the heap of their worker in sync. The worker
+    holding the scheduler lease (set_leader) also rebuilds its heap from batch_campaigns
+    when it gets the lease, then every CAMPAIGN_SCHEDULER_RESYNC_SECONDS together with the
+    completion sweep, so it covers campaigns scheduled through any worker. A campaign due
+    in several workers is started once: start_scheduled_campaign claims it in the database.
+    """
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        # campaign_id -> due timestamp; heap entries that no longer match are stale
+        self._due: Dict[str, float] = {}
+        # Campaigns (un)scheduled while a resync query is in flight keep their local state
+        self._touched: set = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._is_leader = False
+        self._resync_requested = False
+
+    def set_leader(self, is_leader: bool):
+        self._is_leader = is_leader
+        if is_leader:
+            self._resync_requested = True
+            self._notify()
+
+    def schedule(self, campaign_id: str, scheduled_at: datetime):
+        due = scheduled_at.timestamp()
+        with self._lock:
+            self._due[campaign_id] = due
+            self._touched.add(campaign_id)
+            heapq.heappush(self._heap, (due, campaign_id))
+        self._notify()
+
+    def unschedule(self, campaign_id: str):
+        with self._lock:
+            self._due.pop(campaign_id, None)
+            self._touched.add(campaign_id)
+
+    def _notify(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # Scheduler loop already closed (shutting down)
+            pass
+
+    def _pop_due(self, now: float) -> List[str]:
+        due_ids = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, campaign_id = heapq.heappop(self._heap)
+                if self._due.get(campaign_id) == due:
+                    del self._due[campaign_id]
+                    due_ids.append(campaign_id)
+        return due_ids
+
+    def _seconds_until_next(self, now: float) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] - now if self._heap else None
+
+    async def resync(self):
+        """Rebuild the heap from the scheduled campaigns in the database"""
+        with self._lock:
+            self._touched = set()
+        
+        response = await supabase_async_client.table("batch_campaigns").select("id, scheduled_at").eq("status", "scheduled").execute()
+        due = {
+            campaign["id"]: datetime.fromisoformat(campaign["scheduled_at"].replace('Z', '+00:00')).timestamp()
+            for campaign in response.data or []
+            if campaign.get("scheduled_at")
+        }
+        
+        with self._lock:
+            for campaign_id in self._touched:
+                due.pop(campaign_id, None)
+                if campaign_id in self._due:
+                    due[campaign_id] = self._due[campaign_id]
+            self._due = due
+            self._heap = [(timestamp, campaign_id) for campaign_id, timestamp in due.items()]
+            heapq.heapify(self._heap)
+        
+        logger.info(f"Campaign scheduler resynced: {len(due)} scheduled campaigns")
+
+    async def run(self):
+        """Start campaigns as they become due; never returns"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        next_resync = 0.0
+        
+        while True:
+            if self._is_leader and (self._resync_requested or time.time() >= next_resync):
+                self._resync_requested = False
+                try:
+                    await self.resync()
+                    await check_and_complete_finished_campaigns()
+                    await resume_running_campaigns()
+                except Exception as e:
+                    logger.error(f"Error resyncing campaign scheduler: {e}")
+                next_resync = time.time() + CAMPAIGN_SCHEDULER_RESYNC_SECONDS
+            
+            due_ids = self._pop_due(time.time())
+            if due_ids:
+                await asyncio.gather(*(start_scheduled_campaign(campaign_id) for campaign_id in due_ids))
+            
+            # Cleared before computing the delay so a schedule() from now on wakes us up
+            self._wakeup.clear()
+            timeout = next_resync - time.time() if self._is_leader else None
+            until_next = self._seconds_until_next(time.time())
+            if until_next is not None:
+                timeout = until_next if timeout is None else min(timeout, until_next)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=None if timeout is None else max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+
+campaign_scheduler = CampaignScheduler()
+
+async def iter_csv_records(file: UploadFile) -> AsyncIterator[List[str]]:
+    """Yield the records of an uploaded CSV as lists of fields, reading it chunk by chunk.
+
+    The first record is the header row. Quoted fields may span several lines: lines
+    are buffered until the record holds an even number of quotes before being parsed.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    delimiter = None
+    pending = ""
+    record_lines: List[str] = []
+    record_quotes = 0
+
+    while True:
+        chunk = await file.read(CSV_UPLOAD_READ_SIZE)
+        try:
+            text = pending + decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+
+        # A '\r' at the end of a chunk may be followed by a '\n' in the next one
+        if chunk and text.endswith("\r"):
+            text, pending = text[:-1], "\r"
+        else:
+            pending = ""
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        if chunk:
+            pending = lines.pop() + pending
+
+        records = []
+        for line in lines:
+            record_lines.append(line)
+            record_quotes += line.count('"')
+            if record_quotes % 2 == 0:
+                records.append("\n".join(record_lines))
+                record_lines, record_quotes = [], 0
+        if not chunk and record_lines:
+            # Quote never closed: let the csv module interpret the end of the file
+            records.append("\n".join(record_lines))
+
+        if records and delimiter is None:
+            first_line = records[0].split("\n")[0]
+            delimiter = ';' if ';' in first_line and ',' not in first_line else ','
+            logger.info(f"Detected {'semicolon' if delimiter == ';' else 'comma'} delimiter in CSV")
+
+        try:
+            for fields in csv.reader(records, delimiter=delimiter or ','):
+                if fields:
+                    yield fields
+        except csv.Error as e:
+            raise HTTPException(status_code=400, detail=f"Failed to parse CSV: {str(e)}")
+
+        if not chunk:
+            return
+
+def _parse_csv_header(raw_headers: List[str]) -> Dict[str, Optional[int]]:
+    """Locate the phone_number and name columns, ignoring case and surrounding whitespace"""
+    cleaned_headers = [h.strip().lower() if h else "" for h in raw_headers]
+    logger.info(f"CSV headers detected (raw): {raw_headers}")
+
+    if 'phone_number' not in cleaned_headers:
+        raise HTTPException(
+            status_code=400,
+            detail=f"CSV must contain 'phone_number' column. Found headers: {raw_headers}"
+        )
+
+    return {
+        "phone_number": cleaned_headers.index('phone_number'),
+        "name": cleaned_headers.index('name') if 'name' in cleaned_headers else None,
+    }
+
+async def iter_csv_call_items(file: UploadFile, report: CSVUploadResponse) -> AsyncIterator[Dict[str, Any]]:
+    """Validate an uploaded CSV row by row and yield the valid call items.
+
+    Counts, the first CSV_UPLOAD_MAX_REPORTED_ERRORS errors and a preview of the
+    first valid rows are accumulated in ``report``, so memory does not grow with
+    the file size.
+    """
+    raw_headers = None
+    columns: Dict[str, Optional[int]] = {}
+    row_num = 1
+
+    async for fields in iter_csv_records(file):
+        if raw_headers is None:
+            raw_headers = fields
+            columns = _parse_csv_header(raw_headers)
+            continue
+
+        row_num += 1
+        report.total_rows += 1
+        phone_index, name_index = columns["phone_number"], columns["name"]
+
+        phone_number = fields[phone_index].strip() if phone_index < len(fields) else ''
+        name = fields[name_index].strip() if name_index is not None and name_index < len(fields) else ''
+
+        # Validate phone number
+        try:
+            # Add + if missing
+            if phone_number and not phone_number.startswith('+'):
+                phone_number = '+' + phone_number
+
+            # Validate using our model
+            item = BatchCallItemCreateRequest(
+                phone_number_e164=phone_number,
+                contact_name=name if name else None,
+                custom_data={
+                    header: value for index, (header, value) in enumerate(zip(raw_headers, fields))
+                    if index not in (phone_index, name_index) and value
+                }
+            ).dict()
+        except Exception as e:
+            report.invalid_rows += 1
+            if len(report.errors) < CSV_UPLOAD_MAX_REPORTED_ERRORS:
+                report.errors.append({
                     "row": row_num,
                     "phone_number": phone_number,
                     "error": str(e)
                 })
-        
-        return CSVUploadResponse(
-            total_rows=len(valid_rows) + invalid_rows,
-            valid_rows=len(valid_rows),
-            invalid_rows=invalid_rows,
-            errors=errors,
-            preview=valid_rows[:10]  # Show first 10 valid rows as preview
-        )
-        
+            continue
+
+        report.valid_rows += 1
+        if len(report.preview) < CSV_PREVIEW_ROWS:
+            report.preview.append(item)
+        yield item
+
+    if raw_headers is None:
+        raise HTTPException(status_code=400, detail="CSV must contain 'phone_number' column. Found headers: []")
+
+async def insert_call_items_in_chunks(campaign_id: str, items: List[Dict[str, Any]], return_rows: bool = False) -> List[Dict[str, Any]]:
+    """Insert call items with one bulk insert per BATCH_ITEM_INSERT_CHUNK_SIZE rows"""
+    inserted = []
+    for start in range(0, len(items), BATCH_ITEM_INSERT_CHUNK_SIZE):
+        chunk = [
+            {
+                "batch_campaign_id": campaign_id,
+                "phone_number_e164": item["phone_number_e164"],
+                "contact_name": item.get("contact_name"),
+                "custom_data": item.get("custom_data") or {}
+            }
+            for item in items[start:start + BATCH_ITEM_INSERT_CHUNK_SIZE]
+        ]
+        response = await supabase_async_client.table("batch_call_items").insert(
+            chunk, returning=ReturnMethod.representation if return_rows else ReturnMethod.minimal
+        ).execute()
+        if return_rows:
+            if not response.data:
+                raise HTTPException(status_code=500, detail="Failed to add call items")
+            inserted.extend(response.data)
+    return inserted
+
+async def update_campaign_import_progress(campaign_id: str, import_status: str, report: CSVUploadResponse, inserted_rows: int):
+    """Expose the progress of a CSV import on the campaign row"""
+    try:
+        await supabase_async_client.table("batch_campaigns").update({
+            "import_status": import_status,
+            "import_processed_rows": report.total_rows,
+            "import_inserted_rows": inserted_rows,
+            "import_invalid_rows": report.invalid_rows,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", campaign_id).execute()
     except Exception as e:
-        logger.error(f"CSV parsing error: {e}")
-        raise HTTPException(status_code=400, detail=f"Failed to parse CSV: {str(e)}")
+        # Progress is informative only: the import goes on
+        logger.warning(f"Failed to update import progress of campaign {campaign_id}: {e}")
 
 # ===== API Endpoints =====
 
@@ -578,15 +868,9 @@ async def create_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify agent belongs to user
         await verify_agent_belongs_to_user(request.agent_id, user_id)
@@ -605,7 +889,7 @@ async def create_batch_campaign(
             "status": status
         }
         
-        response = supabase_service_client.table("batch_campaigns").insert(campaign_data).execute()
+        response = await supabase_async_client.table("batch_campaigns").insert(campaign_data).execute()
         
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to create campaign")
@@ -632,25 +916,19 @@ async def list_batch_campaigns(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Build query
-        query = supabase_service_client.table("batch_campaigns").select("*").eq("user_id", user_id)
+        query = supabase_async_client.table("batch_campaigns").select("*").eq("user_id", user_id)
         
         if status_filter:
             query = query.eq("status", status_filter)
         
         query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
         
-        response = query.execute()
+        response = await query.execute()
         
         campaigns = [BatchCampaignResponse(**campaign) for campaign in response.data or []]
         
@@ -672,15 +950,9 @@ async def get_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Get campaign and verify access
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -703,15 +975,9 @@ async def update_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -730,7 +996,7 @@ async def update_batch_campaign(
             raise HTTPException(status_code=400, detail="No fields to update")
         
         # Update campaign
-        response = supabase_service_client.table("batch_campaigns").update(update_data).eq("id", campaign_id).execute()
+        response = await supabase_async_client.table("batch_campaigns").update(update_data).eq("id", campaign_id).execute()
         
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to update campaign")
@@ -755,15 +1021,9 @@ async def delete_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -773,11 +1033,12 @@ async def delete_batch_campaign(
             raise HTTPException(status_code=400, detail="Cannot delete running campaign.")
         
         # Delete campaign (cascade will delete call items)
-        response = supabase_service_client.table("batch_campaigns").delete().eq("id", campaign_id).execute()
+        response = await supabase_async_client.table("batch_campaigns").delete().eq("id", campaign_id).execute()
         
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to delete campaign")
         
+        campaign_scheduler.unschedule(campaign_id)
         logger.info(f"Deleted batch campaign {campaign_id}")
         
         return {"message": f"Campaign {campaign_data.get('name', campaign_id)} deleted successfully"}
@@ -797,15 +1058,9 @@ async def start_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -818,7 +1073,7 @@ async def start_batch_campaign(
             )
         
         # Check if campaign has call items
-        items_response = supabase_service_client.table("batch_call_items").select("id").eq("batch_campaign_id", campaign_id).limit(1).execute()
+        items_response = await supabase_async_client.table("batch_call_items").select("id").eq("batch_campaign_id", campaign_id).limit(1).execute()
         
         if not items_response.data:
             raise HTTPException(status_code=400, detail="Campaign has no phone numbers to call")
@@ -849,15 +1104,9 @@ async def schedule_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -870,13 +1119,13 @@ async def schedule_batch_campaign(
             )
         
         # Check if campaign has call items
-        items_response = supabase_service_client.table("batch_call_items").select("id").eq("batch_campaign_id", campaign_id).limit(1).execute()
+        items_response = await supabase_async_client.table("batch_call_items").select("id").eq("batch_campaign_id", campaign_id).limit(1).execute()
         
         if not items_response.data:
             raise HTTPException(status_code=400, detail="Campaign has no phone numbers to call")
         
         # Update campaign to scheduled status
-        update_response = supabase_service_client.table("batch_campaigns").update({
+        update_response = await supabase_async_client.table("batch_campaigns").update({
             "status": "scheduled",
             "scheduled_at": request.scheduled_at.isoformat()
         }).eq("id", campaign_id).execute()
@@ -884,6 +1133,7 @@ async def schedule_batch_campaign(
         if not update_response.data:
             raise HTTPException(status_code=500, detail="Failed to schedule campaign")
         
+        campaign_scheduler.schedule(campaign_id, request.scheduled_at)
         logger.info(f"Scheduled batch campaign {campaign_id} for {request.scheduled_at}")
         
         return {
@@ -906,15 +1156,9 @@ async def complete_batch_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -930,7 +1174,7 @@ async def complete_batch_campaign(
             )
         
         # Mark campaign as completed
-        await mark_campaign_completed(campaign_id)
+        await mark_campaign_completed(campaign_id, from_statuses=("running", "failed"))
         
         logger.info(f"Manually completed batch campaign {campaign_id}")
         
@@ -958,22 +1202,76 @@ async def upload_csv(
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
     try:
-        # Read file content
-        content = await file.read()
-        csv_content = content.decode('utf-8')
-        
-        # Parse and validate
-        result = parse_csv_content(csv_content)
+        # Parse and validate, streaming the upload instead of loading it in memory
+        result = CSVUploadResponse(total_rows=0, valid_rows=0, invalid_rows=0, errors=[], preview=[])
+        async for _ in iter_csv_call_items(file, result):
+            pass
         
         logger.info(f"CSV upload processed: {result.valid_rows} valid, {result.invalid_rows} invalid rows")
         return result
         
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"CSV upload error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process CSV file")
 
+@router.post("/{campaign_id}/items/upload-csv", response_model=CSVUploadResponse)
+async def import_csv_to_campaign(
+    campaign_id: str,
+    file: UploadFile = File(...),
+    authorization: str = Header(None, alias="Authorization")
+):
+    """Validate an uploaded CSV and add its valid rows to a campaign as call items.
+
+    Rows are inserted in chunks of BATCH_ITEM_INSERT_CHUNK_SIZE while the file is
+    read, and the import progress is kept up to date on the campaign.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    
+    # Validate file type
+    if not file.filename or not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV")
+    
+    user_id = await get_user_id_from_token(authorization)
+    campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
+    
+    # Check if campaign can be modified
+    if campaign_data.get("status") in ["running", "completed", "failed"]:
+        raise HTTPException(status_code=400, detail="Cannot add items to campaigns that are running, completed, or failed")
+    
+    report = CSVUploadResponse(total_rows=0, valid_rows=0, invalid_rows=0, errors=[], preview=[])
+    inserted_rows = 0
+    chunk: List[Dict[str, Any]] = []
+    
+    try:
+        await update_campaign_import_progress(campaign_id, "importing", report, inserted_rows)
+        
+        async for item in iter_csv_call_items(file, report):
+            chunk.append(item)
+            if len(chunk) >= BATCH_ITEM_INSERT_CHUNK_SIZE:
+                await insert_call_items_in_chunks(campaign_id, chunk)
+                inserted_rows += len(chunk)
+                chunk = []
+                await update_campaign_import_progress(campaign_id, "importing", report, inserted_rows)
+        
+        if chunk:
+            await insert_call_items_in_chunks(campaign_id, chunk)
+            inserted_rows += len(chunk)
+        
+        await update_campaign_import_progress(campaign_id, "completed", report, inserted_rows)
+        logger.info(f"Imported {inserted_rows} call items into campaign {campaign_id} ({report.invalid_rows} invalid rows)")
+        return report
+        
+    except HTTPException:
+        await update_campaign_import_progress(campaign_id, "failed", report, inserted_rows)
+        raise
+    except Exception as e:
+        logger.error(f"Error importing CSV into campaign {campaign_id} after {inserted_rows} rows: {e}")
+        await update_campaign_import_progress(campaign_id, "failed", report, inserted_rows)
+        raise HTTPException(status_code=500, detail=f"Failed to import CSV file after {inserted_rows} rows")
+
 @router.post("/{campaign_id}/items", response_model=List[BatchCallItemResponse])
 async def add_call_items_to_campaign(
     campaign_id: str,
@@ -984,15 +1282,9 @@ async def add_call_items_to_campaign(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
@@ -1001,23 +1293,13 @@ async def add_call_items_to_campaign(
         if campaign_data.get("status") in ["running", "completed", "failed"]:
             raise HTTPException(status_code=400, detail="Cannot add items to campaigns that are running, completed, or failed")
         
-        # Prepare call items for insertion
-        call_items_data = []
-        for item in items:
-            call_items_data.append({
-                "batch_campaign_id": campaign_id,
-                "phone_number_e164": item.phone_number_e164,
-                "contact_name": item.contact_name,
-                "custom_data": item.custom_data
-            })
+        # Insert call items in bounded chunks
+        inserted = await insert_call_items_in_chunks(campaign_id, [item.dict() for item in items], return_rows=True)
         
-        # Insert call items
-        response = supabase_service_client.table("batch_call_items").insert(call_items_data).execute()
-        
-        if not response.data:
+        if not inserted:
             raise HTTPException(status_code=500, detail="Failed to add call items")
         
-        created_items = [BatchCallItemResponse(**item) for item in response.data]
+        created_items = [BatchCallItemResponse(**item) for item in inserted]
         
         logger.info(f"Added {len(created_items)} call items to campaign {campaign_id}")
         return created_items
@@ -1028,6 +1310,9 @@ async def add_call_items_to_campaign(
         logger.error(f"Error adding call items to campaign {campaign_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to add call items")
 
+# Assumed time a call holds a dispatcher slot until the campaign has observed calls end
+CAMPAIGN_ETA_DEFAULT_CALL_SECONDS = 120
+
 @router.get("/{campaign_id}/progress", response_model=CampaignProgressResponse)
 async def get_campaign_progress(
     campaign_id: str,
@@ -1037,63 +1322,40 @@ async def get_campaign_progress(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        try:
-            user_response = supabase_service_client.auth.get_user(token)
-            if not user_response.user:
-                raise HTTPException(status_code=401, detail="Invalid token")
-        except Exception as auth_error:
-            logger.debug(f"Auth error for token: {auth_error}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
         
-        # Get call items status breakdown
-        items_response = supabase_service_client.table("batch_call_items").select("status").eq("batch_campaign_id", campaign_id).execute()
-        
-        # Count statuses
-        status_counts = {}
-        for item in items_response.data or []:
-            status = item.get("status", "pending")
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
+        # Item counters and call duration average are kept on the campaign row by triggers
         total_numbers = campaign_data.get("total_numbers", 0)
         completed_calls = campaign_data.get("completed_calls", 0)
         successful_calls = campaign_data.get("successful_calls", 0)
         failed_calls = campaign_data.get("failed_calls", 0)
         
-        pending_calls = status_counts.get("pending", 0) + status_counts.get("retrying", 0)
-        calling_now = status_counts.get("calling", 0)
+        pending_calls = campaign_data.get("items_pending") or 0
+        calling_now = campaign_data.get("items_in_progress") or 0
         
         # Calculate progress percentage
         progress_percentage = (completed_calls / total_numbers * 100) if total_numbers > 0 else 0
         
-        # Estimate completion time (rough calculation)
+        # Estimate completion time from the observed call durations and the calls actually in flight
         estimated_completion = None
         if campaign_data.get("status") == "running" and pending_calls > 0:
-            # Rough estimate based on current concurrency
-            concurrency = campaign_data.get("concurrency_limit", 3)
-            avg_call_duration = 120  # 2 minutes average
-            estimated_seconds = (pending_calls / concurrency) * avg_call_duration
+            concurrency = calling_now or campaign_data.get("concurrency_limit") or 3
+            avg_slot_seconds = campaign_data.get("call_duration_ewma_seconds") or CAMPAIGN_ETA_DEFAULT_CALL_SECONDS
+            estimated_seconds = (pending_calls / concurrency) * avg_slot_seconds
             estimated_completion = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(seconds=estimated_seconds)
         
         # ===== MVP ANALYTICS ENHANCEMENT =====
         
-        # Get detailed call analytics from the calls table
-        # Fix column names - use the correct ones from the database
-        calls_response = supabase_service_client.table("calls").select(
-            "id, status, call_duration, phone_number_e164, created_at, initiated_at, answered_at, ended_at"
+        # Call outcomes, hours and geography, maintained per campaign by a trigger on calls
+        stats_response = await supabase_async_client.table("batch_campaign_call_stats").select(
+            "dimension, bucket, calls, connected, timed_calls, total_duration"
         ).eq("batch_campaign_id", campaign_id).execute()
         
-        calls_data = calls_response.data or []
-        
-        # Calculate call outcomes
         call_outcomes = {
             "connected": 0,
             "voicemail": 0,
@@ -1101,50 +1363,29 @@ async def get_campaign_progress(
             "busy": 0,
             "failed": 0
         }
-        
         total_call_duration = 0
-        valid_durations = []
+        timed_calls = 0
         peak_hours = {}
+        geographic_performance = {}
         
-        for call in calls_data:
-            # Map call statuses to outcomes
-            status = (call.get("status") or "failed").lower()
-            duration = call.get("call_duration", 0) or 0
-            
-            if status in ["completed", "ended"]:
-                if duration > 30:  # Calls over 30 seconds likely reached humans
-                    call_outcomes["connected"] += 1
-                elif duration > 5:  # Short calls might be voicemail
-                    call_outcomes["voicemail"] += 1
-                else:
-                    call_outcomes["no_answer"] += 1
-            elif status in ["busy"]:
-                call_outcomes["busy"] += 1
-            elif status in ["no_answer", "timeout"]:
-                call_outcomes["no_answer"] += 1
-            else:
-                call_outcomes["failed"] += 1
-            
-            # Track call durations
-            if duration > 0:
-                total_call_duration += duration
-                valid_durations.append(duration)
-            
-            # Track peak response hours
-            if call.get("initiated_at") and status in ["completed", "ended"]:
-                try:
-                    initiated_at = datetime.fromisoformat(call["initiated_at"].replace('Z', '+00:00'))
-                    hour = initiated_at.hour
-                    peak_hours[hour] = peak_hours.get(hour, 0) + 1
-                except:
-                    pass
+        for row in stats_response.data or []:
+            calls = row.get("calls") or 0
+            dimension = row.get("dimension")
+            if dimension == "outcome":
+                call_outcomes[row["bucket"]] = call_outcomes.get(row["bucket"], 0) + calls
+                total_call_duration += row.get("total_duration") or 0
+                timed_calls += row.get("timed_calls") or 0
+            elif dimension == "hour" and calls > 0:
+                peak_hours[int(row["bucket"])] = calls
+            elif dimension == "country" and calls > 0:
+                geographic_performance[row["bucket"]] = {"total": calls, "connected": row.get("connected") or 0}
         
         # Calculate response rate (calls that reached humans)
         connected_calls = call_outcomes["connected"]
         response_rate = (connected_calls / total_numbers * 100) if total_numbers > 0 else 0
         
         # Calculate average call duration
-        avg_call_duration = sum(valid_durations) / len(valid_durations) if valid_durations else 0
+        avg_call_duration = total_call_duration / timed_calls if timed_calls else 0
         
         # Find peak response hours (top 3)
         peak_response_hours = []
@@ -1152,26 +1393,6 @@ async def get_campaign_progress(
             sorted_hours = sorted(peak_hours.items(), key=lambda x: x[1], reverse=True)[:3]
             peak_response_hours = [f"{hour:02d}:00-{hour+1:02d}:00" for hour, _ in sorted_hours]
         
-        # Geographic performance (simplified - by country code)
-        geographic_performance = {}
-        for call in calls_data:
-            phone_number = call.get("phone_number_e164", "") or ""
-            if phone_number.startswith("+1"):
-                country = "US/CA"
-            elif phone_number.startswith("+33"):
-                country = "France"
-            elif phone_number.startswith("+44"):
-                country = "UK"
-            else:
-                country = "Other"
-            
-            if country not in geographic_performance:
-                geographic_performance[country] = {"total": 0, "connected": 0}
-            
-            geographic_performance[country]["total"] += 1
-            if (call.get("status") or "").lower() in ["completed", "ended"] and (call.get("call_duration", 0) or 0) > 30:
-                geographic_performance[country]["connected"] += 1
-        
         return CampaignProgressResponse(
             campaign_id=campaign_id,
             status=campaign_data.get("status", "draft"),
@@ -1208,32 +1429,22 @@ async def get_campaign_analytics(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        try:
-            user_response = supabase_service_client.auth.get_user(token)
-            if not user_response.user:
-                raise HTTPException(status_code=401, detail="Invalid token")
-        except Exception as auth_error:
-            logger.debug(f"Auth error for token: {auth_error}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         campaign_data = await verify_user_access_to_campaign(campaign_id, user_id)
         
         # Get all calls for this campaign
-        calls_response = supabase_service_client.table("calls").select(
+        calls_response = await supabase_async_client.table("calls").select(
             "id, status, call_duration, phone_number_e164, created_at, initiated_at, answered_at, ended_at, call_control_id"
         ).eq("batch_campaign_id", campaign_id).execute()
         
         calls_data = calls_response.data or []
         
         # Get call items for additional context
-        items_response = supabase_service_client.table("batch_call_items").select(
+        items_response = await supabase_async_client.table("batch_call_items").select(
             "id, phone_number_e164, contact_name, status, attempts, last_attempt_at, completed_at, error_message"
         ).eq("batch_campaign_id", campaign_id).execute()
         
@@ -1420,25 +1631,15 @@ async def get_campaign_call_items(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        try:
-            user_response = supabase_service_client.auth.get_user(token)
-            if not user_response.user:
-                raise HTTPException(status_code=401, detail="Invalid token")
-        except Exception as auth_error:
-            logger.debug(f"Auth error for token: {auth_error}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access to campaign
         await verify_user_access_to_campaign(campaign_id, user_id)
         
         # Build query for call items
-        query = supabase_service_client.table("batch_call_items").select(
+        query = supabase_async_client.table("batch_call_items").select(
             "id, batch_campaign_id, phone_number_e164, contact_name, custom_data, status, call_id, attempts, last_attempt_at, completed_at, error_message, created_at, updated_at"
         ).eq("batch_campaign_id", campaign_id)
         
@@ -1447,7 +1648,7 @@ async def get_campaign_call_items(
         
         query = query.order("created_at", desc=False).range(offset, offset + limit - 1)
         
-        response = query.execute()
+        response = await query.execute()
         
         call_items = [BatchCallItemResponse(**item) for item in response.data or []]
         
@@ -1476,19 +1677,29 @@ async def trigger_campaign_completion_check(
         logger.error(f"Error triggering campaign completion check: {e}")
         raise HTTPException(status_code=500, detail="Failed to trigger completion check")
 
-async def update_batch_call_item_from_call_status(call_id: str, call_status: str, call_duration: Optional[int] = None):
-    """Update batch call item status based on call completion"""
+async def update_batch_call_item_from_call_status(
+    call_id: str,
+    call_status: str,
+    call_duration: Optional[int] = None,
+    call_data: Optional[Dict[str, Any]] = None,
+):
+    """Update batch call item status based on call completion.
+
+    Called by PATCH /calls/room/{room_name}/status and the Telnyx call.hangup webhook;
+    call_data is the updated calls row when the caller already has it.
+    """
     try:
-        # Get the call to find the associated batch call item
-        call_response = supabase_service_client.table("calls").select(
-            "id, batch_call_item_id, batch_campaign_id, status, call_duration"
-        ).eq("id", call_id).single().execute()
-        
-        if not call_response.data:
-            logger.debug(f"Call {call_id} not found or not a batch call")
-            return
-        
-        call_data = call_response.data
+        if call_data is None:
+            # Get the call to find the associated batch call item
+            call_response = await supabase_async_client.table("calls").select(
+                "id, batch_call_item_id, batch_campaign_id, status, call_duration"
+            ).eq("id", call_id).single().execute()
+            
+            if not call_response.data:
+                logger.debug(f"Call {call_id} not found or not a batch call")
+                return
+            
+            call_data = call_response.data
         batch_call_item_id = call_data.get("batch_call_item_id")
         batch_campaign_id = call_data.get("batch_campaign_id")
         
@@ -1497,9 +1708,9 @@ async def update_batch_call_item_from_call_status(call_id: str, call_status: str
             return
         
         # Map call status to batch call item status
-        if call_status.lower() in ["completed", "ended"]:
+        if call_status.lower() in ["completed", "ended", "voicemail"]:
             item_status = "completed"
-        elif call_status.lower() in ["failed", "busy", "no_answer", "timeout"]:
+        elif call_status.lower() in ["failed", "busy", "no_answer", "timeout", "cancelled", "canceled", "error"]:
             item_status = "failed"
         else:
             # Don't update for intermediate statuses like "calling"
@@ -1514,7 +1725,7 @@ async def update_batch_call_item_from_call_status(call_id: str, call_status: str
         # If the call failed, we might want to retry
         if item_status == "failed":
             # Get current attempts
-            item_response = supabase_service_client.table("batch_call_items").select(
+            item_response = await supabase_async_client.table("batch_call_items").select(
                 "attempts, batch_campaign_id"
             ).eq("id", batch_call_item_id).single().execute()
             
@@ -1522,7 +1733,7 @@ async def update_batch_call_item_from_call_status(call_id: str, call_status: str
                 current_attempts = item_response.data.get("attempts", 1)
                 
                 # Get campaign retry settings
-                campaign_response = supabase_service_client.table("batch_campaigns").select(
+                campaign_response = await supabase_async_client.table("batch_campaigns").select(
                     "retry_failed, max_retries"
                 ).eq("id", batch_campaign_id).single().execute()
                 
@@ -1537,11 +1748,23 @@ async def update_batch_call_item_from_call_status(call_id: str, call_status: str
                         update_data["attempts"] = current_attempts + 1
                         del update_data["completed_at"]  # Don't mark as completed if retrying
         
-        # Update the batch call item
-        supabase_service_client.table("batch_call_items").update(update_data).eq("id", batch_call_item_id).execute()
+        # Update the batch call item, once: the agent and the hangup webhook both report the end of a call
+        update_response = await supabase_async_client.table("batch_call_items").update(update_data).eq(
+            "id", batch_call_item_id
+        ).eq("status", "calling").or_(f"call_id.is.null,call_id.eq.{call_id}").execute()
+        
+        if not update_response.data:
+            logger.debug(f"Batch call item {batch_call_item_id} already updated for call {call_id}")
+            return
         
         logger.info(f"Updated batch call item {batch_call_item_id} to status '{item_status}' for call {call_id}")
         
+        # Hand the slot back to the campaign dispatcher so the next item is dialed right away
+        # (a dispatcher running in another worker sees the items_in_progress counter drop)
+        dispatcher = _campaign_dispatchers.get(batch_campaign_id)
+        if dispatcher:
+            dispatcher.release(batch_call_item_id)
+        
         # Trigger a check to see if the campaign should be completed
         if item_status in ["completed", "failed"]:
             await check_specific_campaign_completion(batch_campaign_id)
@@ -1552,33 +1775,24 @@ async def update_batch_call_item_from_call_status(call_id: str, call_status: str
 async def check_specific_campaign_completion(campaign_id: str):
     """Check if a specific campaign should be marked as completed"""
     try:
-        # Get campaign status
-        campaign_response = supabase_service_client.table("batch_campaigns").select("status").eq("id", campaign_id).single().execute()
+        # Campaign status and item counters, a single row read
+        campaign_response = await supabase_async_client.table("batch_campaigns").select(
+            "status, items_pending, items_in_progress, items_completed, items_failed, items_cancelled"
+        ).eq("id", campaign_id).single().execute()
+        campaign = campaign_response.data
         
-        if not campaign_response.data or campaign_response.data.get("status") != "running":
+        if not campaign or campaign.get("status") != "running":
             return
         
-        # Get call items for this campaign
-        items_response = supabase_service_client.table("batch_call_items").select("id, status").eq("batch_campaign_id", campaign_id).execute()
-        call_items = items_response.data or []
-        
-        if not call_items:
+        final_items = (campaign.get("items_completed") or 0) + (campaign.get("items_failed") or 0) + (campaign.get("items_cancelled") or 0)
+        if final_items == 0:
             return
         
-        # Check if all items are in a final state
-        final_statuses = {"completed", "failed", "cancelled"}
-        pending_statuses = {"pending", "calling", "retrying"}
-        
-        total_items = len(call_items)
-        final_items = len([item for item in call_items if item.get("status") in final_statuses])
-        pending_items = len([item for item in call_items if item.get("status") in pending_statuses])
-        
-        logger.debug(f"Campaign {campaign_id}: {final_items}/{total_items} items finished, {pending_items} pending")
+        logger.debug(f"Campaign {campaign_id}: {final_items} items finished, {campaign.get('items_pending')} pending, {campaign.get('items_in_progress')} in progress")
         
         # If all items are in final state, mark campaign as completed
-        if final_items == total_items and pending_items == 0:
+        if campaign_items_finished(campaign):
             logger.info(f"All items finished for campaign {campaign_id}, marking as completed")
-            await mark_campaign_completed(campaign_id)
-            
+            await mark_campaign_completed(campaign_id)            
     except Exception as e:
         logger.error(f"Error checking specific campaign completion for {campaign_id}: {e}") 
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+Outbound agent call initiation shared by POST /agents/call and the campaign dispatchers.
+
+resolve_agent_call_context() reads what is common to every call of an agent (agent
+row, caller ID phone number, SIP trunk) once; initiate_agent_call() then only does
+the per-call work: call record, agent launch, pacing and LiveKit dispatch.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .db_client import supabase_async_client
+from .agent_launcher import launch_outbound_agent
+from .live_call_registry import live_call_registry
+from .telnyx_webhooks import call_control_index
+from services import livekit_client
+from services.call_pacer import call_pacer
+from services.livekit_client import LiveKitServiceError
+
+logger = logging.getLogger(__name__)
+
+# Time left to the agent worker to register with LiveKit before the dispatch
+AGENT_REGISTRATION_DELAY_SECONDS = 2
+
+
+class CallInitiationError(Exception):
+    """Raised when an agent call cannot be initiated; call_id is set once the call record exists"""
+
+    def __init__(self, message: str, status_code: int = 500, call_id: Optional[Any] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.call_id = call_id
+
+
+@dataclass
+class AgentCallContext:
+    """Everything an outbound call needs that does not depend on the number called"""
+    agent_id: int
+    agent_config: Dict[str, Any]
+    phone_number_details: Dict[str, Any] = field(default_factory=dict)
+    caller_id_number: Optional[str] = None
+    sip_trunk_id: Optional[str] = None
+
+
+async def resolve_agent_call_context(agent_id: int, agent_config: Optional[Dict[str, Any]] = None) -> AgentCallContext:
+    """Fetch the agent (unless already fetched) and its caller ID phone number"""
+    if agent_config is None:
+        try:
+            agent_response = await supabase_async_client.table("agents").select("*").eq("id", agent_id).single().execute()
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de la configuration de l'agent depuis Supabase: {e}")
+            raise CallInitiationError(f"Failed to fetch agent configuration: {str(e)}")
+
+        if not agent_response.data:
+            logger.error(f"Agent avec l'ID {agent_id} non trouvé dans Supabase.")
+            raise CallInitiationError(f"Agent with ID {agent_id} not found.", status_code=404)
+        agent_config = agent_response.data
+        logger.info(f"Configuration de l'agent {agent_id} récupérée depuis Supabase: {agent_config}")
+
+    # --- Get phone number details from the database for Caller ID ---
+    phone_number_details: Dict[str, Any] = {}
+    caller_id_number = None
+    phone_numbers_id = agent_config.get("phone_numbers_id")
+
+    if phone_numbers_id:
+        try:
+            # Fetch both the phone number and the SIP trunk ID
+            pn_response = await supabase_async_client.table("phone_numbers").select(
+                "phone_number_e164, livekit_sip_trunk_id"
+            ).eq("id", phone_numbers_id).single().execute()
+
+            if pn_response.data:
+                phone_number_details = pn_response.data
+                caller_id_number = phone_number_details.get("phone_number_e164")
+                logger.info(f"Retrieved phone number details for agent {agent_id}: {phone_number_details}")
+                logger.info(f"Agent Caller ID Number: {caller_id_number}")
+        except Exception as e:
+            logger.error(f"Failed to retrieve phone number details for agent {agent_id}: {e}")
+    else:
+        logger.info(f"Agent {agent_id} does not have a phone_numbers_id assigned. No Caller ID will be used.")
+
+    sip_trunk_id = phone_number_details.get("livekit_sip_trunk_id")
+    if not sip_trunk_id and caller_id_number:
+        # Numbers assigned before their trunk id was stored: find the trunk carrying them in LiveKit
+        try:
+            trunk = await livekit_client.get_sip_trunk_by_number(caller_id_number)
+            if trunk:
+                sip_trunk_id = trunk.get("sipTrunkId") or trunk.get("sipOutboundTrunkId")
+                logger.info(f"Using LiveKit SIP trunk {sip_trunk_id} found for caller ID {caller_id_number}")
+        except LiveKitServiceError as e:
+            logger.warning(f"Could not look up the LiveKit SIP trunk for caller ID {caller_id_number}: {e}")
+    sip_trunk_id = sip_trunk_id or agent_config.get("sip_trunk_id") or os.getenv("LIVEKIT_OUTBOUND_TRUNK_ID")
+
+    return AgentCallContext(
+        agent_id=agent_id,
+        agent_config=agent_config,
+        phone_number_details=phone_number_details,
+        caller_id_number=caller_id_number,
+        sip_trunk_id=sip_trunk_id,
+    )
+
+
+def build_dispatch_metadata(
+    context: AgentCallContext,
+    call_id: Any,
+    room_name: str,
+    phone_number: str,
+    auth_token: Optional[str],
+) -> Dict[str, Any]:
+    """Metadata read by the outbound agent worker from its LiveKit dispatch"""
+    agent_config = context.agent_config
+
+    # Pathway agents may run without prompt/greeting: only fall back to defaults for the others
+    if agent_config.get("default_pathway_id") is not None:
+        system_prompt = agent_config.get("system_prompt") or None
+        initial_greeting = agent_config.get("initial_greeting") or None
+    else:
+        system_prompt = agent_config.get("system_prompt", "You are a helpful assistant.")
+        initial_greeting = agent_config.get("initial_greeting", "Hello, how can I help you?")
+
+    return {
+        "firstName": "Valued Customer",
+        "lastName": "",
+        "dial_info": {
+            "agent_id": context.agent_id,
+            "call_direction": "outbound",
+            "room_name": room_name,
+            "supabase_call_id": call_id,
+            "telnyx_call_control_id": None,
+            "default_pathway_id": agent_config.get("default_pathway_id"),
+            "user_id": agent_config.get("user_id"),
+            "auth_token": auth_token,
+            "phone_number": phone_number,
+            "sip_trunk_id": context.sip_trunk_id,
+            "agent_caller_id_number": context.caller_id_number,
+        },
+        "system_prompt": system_prompt,
+        "initial_greeting": initial_greeting,
+        "wait_for_greeting": agent_config.get("wait_for_greeting", False),
+        "pam_tier": agent_config.get("pam_tier", "core"),
+        "interruption_threshold": agent_config.get("interruption_threshold", 100),
+        "ai_models": {
+            "vad": {"provider": "silero"},
+            "stt": {
+                "provider": agent_config.get("stt_provider", "deepgram"),
+                "language": agent_config.get("stt_language", "fr"),
+                "model": agent_config.get("stt_model", "nova-2")
+            },
+            "tts": {
+                "provider": agent_config.get("tts_provider", "cartesia"),
+                "model": agent_config.get("tts_model", "sonic-2"),
+                "voice_id": agent_config.get("tts_voice", "ab7c61f5-3daa-47dd-a23b-4ac0aac5f5c3")
+            },
+            "llm": {
+                "provider": agent_config.get("llm_provider", "openai"),
+                "model": agent_config.get("llm_model", "gpt-4o-mini")
+            }
+        }
+    }
+
+
+async def _mark_call_failed(call_id: Any, error_message: str):
+    try:
+        await supabase_async_client.table("calls").update({
+            "status": "failed",
+            "error_message": error_message
+        }).eq("id", call_id).execute()
+    except Exception as e:
+        logger.error(f"Failed to mark call {call_id} as failed: {e}")
+    live_call_registry.record_call_status(call_id, "failed")
+
+
+async def initiate_agent_call(
+    context: AgentCallContext,
+    phone_number: str,
+    auth_token: Optional[str] = None,
+    batch_campaign_id: Optional[str] = None,
+    batch_call_item_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Create the call record, launch the agent and dispatch it to the call room.
+
+    Returns call_id, room_name, dispatch_id and the normalized phone_number.
+    Raises CallInitiationError; the call record, if created, is then marked failed.
+    """
+    agent_id = context.agent_id
+
+    if not phone_number.startswith('+'):
+        logger.warning(f"Phone number {phone_number} doesn't start with '+'. Adding +1 prefix.")
+        phone_number = '+1' + phone_number
+
+    call_data = {
+        "agent_id": agent_id,
+        "to_phone_number": phone_number,
+        "phone_number_e164": phone_number,
+        "status": "initiating",
+        "call_direction": "outbound",
+        "user_id": context.agent_config.get("user_id"),
+    }
+    if batch_campaign_id:
+        call_data["batch_campaign_id"] = batch_campaign_id
+    if batch_call_item_id:
+        call_data["batch_call_item_id"] = batch_call_item_id
+
+    try:
+        call_response = await supabase_async_client.table("calls").insert(call_data).execute()
+    except Exception as e:
+        logger.error(f"Error creating call record for agent {agent_id}: {e}")
+        raise CallInitiationError(f"Failed to create call record: {str(e)}")
+    if not call_response.data:
+        raise CallInitiationError("Failed to create call record")
+
+    call_record = call_response.data[0]
+    call_id = call_record["id"]
+    logger.info(f"Call record created with ID: {call_id}")
+    live_call_registry.record_call_row(call_record)
+    # Lets the call.initiated webhook link its call_control_id without querying calls
+    call_control_index.register_dial(phone_number, call_id)
+
+    try:
+        # agents/outbound_agent.py relies on the agent-call- prefix
+        room_name = f"agent-call-{call_id}"
+        update_response = await supabase_async_client.table("calls").update({
+            "room_name": room_name
+        }).eq("id", call_id).execute()
+
+        if update_response.data:
+            call_record = update_response.data[0]
+            logger.info(f"Updated call record with room_name: {room_name}")
+        else:
+            logger.error(f"Failed to update call record with room_name")
+            call_record = {**call_record, "room_name": room_name}
+
+        if not await launch_outbound_agent(call_record, agent_id, context.agent_config):
+            await _mark_call_failed(call_id, "Failed to launch agent")
+            raise CallInitiationError("Failed to launch agent for call", call_id=call_id)
+
+        # Give agent worker time to register with LiveKit
+        await asyncio.sleep(AGENT_REGISTRATION_DELAY_SECONDS)
+        logger.info(f"Agent worker launched, waited {AGENT_REGISTRATION_DELAY_SECONDS}s for registration before dispatch")
+
+        metadata = build_dispatch_metadata(context, call_id, room_name, phone_number, auth_token)
+
+        # The agent dials as soon as it is dispatched: stay under the trunk and caller ID CPS limits
+        await call_pacer.acquire(context.sip_trunk_id, context.caller_id_number)
+
+        # Dispatch agent to our specific room (LiveKit creates the room if needed)
+        logger.info(f"Creating LiveKit agent dispatch for room {room_name}")
+        dispatch = await livekit_client.create_agent_dispatch("outbound-caller", json.dumps(metadata), room_name=room_name)
+        logger.info(f"LiveKit dispatch successful: {dispatch}")
+
+        await supabase_async_client.table("calls").update({
+            "status": "dispatched"
+        }).eq("id", call_id).execute()
+
+    except CallInitiationError:
+        raise
+    except LiveKitServiceError as e:
+        logger.error(f"LiveKit dispatch failed: {e} ({e.details})")
+        await _mark_call_failed(call_id, f"LiveKit dispatch failed: {str(e)}")
+        raise CallInitiationError(f"Failed to dispatch agent: {str(e)}", call_id=call_id)
+    except Exception as e:
+        logger.error(f"Unexpected error during dispatch: {e}")
+        await _mark_call_failed(call_id, f"Dispatch error: {str(e)}")
+        raise CallInitiationError(f"Unexpected dispatch error: {str(e)}", call_id=call_id)
+
+    return {
+        "call_id": call_id,
+        "room_name": room_name,
+        "dispatch_id": dispatch["dispatch_id"],
+        "phone_number": phone_number,
+    }
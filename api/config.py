@@ -1,8 +1,14 @@
 '''
 Configuration partagée pour l'application API.
 '''
+import asyncio
 import os
 import logging
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import jwt
 from pydantic import BaseModel as PydanticBaseModel
 # from typing import Optional # Optional not used after Xano removal
 from pathlib import Path
@@ -45,33 +51,133 @@ if supabase_url:
 class BaseModel(PydanticBaseModel):
     pass
 
+# --- Local JWT verification ---
+# Supabase access tokens are verified in-process (HS256 with the project JWT secret,
+# or RS256/ES256 against the project JWKS) and cached by token hash, so authenticated
+# requests do not pay an Auth API round trip. The remote check is only used when a
+# token cannot be verified locally (no secret configured, JWKS unreachable, unknown alg).
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+AUTH_TOKEN_CACHE_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+AUTH_TOKEN_CACHE_MAX_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_MAX_SIZE", "10000"))
+
+_verified_tokens: "OrderedDict[str, tuple[str, float]]" = OrderedDict()  # token hash -> (user_id, expires_at)
+_verified_tokens_lock = threading.Lock()
+_jwks_client = None
+
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _get_cached_user_id(cache_key: str) -> str | None:
+    with _verified_tokens_lock:
+        entry = _verified_tokens.get(cache_key)
+        if entry is None:
+            return None
+        user_id, expires_at = entry
+        if expires_at <= time.time():
+            del _verified_tokens[cache_key]
+            return None
+        _verified_tokens.move_to_end(cache_key)
+        return user_id
+
+
+def _cache_user_id(cache_key: str, user_id: str, token_exp: float | None = None):
+    expires_at = time.time() + AUTH_TOKEN_CACHE_TTL_SECONDS
+    if token_exp:
+        # Never serve a token from cache past its own expiry
+        expires_at = min(expires_at, token_exp)
+    with _verified_tokens_lock:
+        _verified_tokens[cache_key] = (user_id, expires_at)
+        _verified_tokens.move_to_end(cache_key)
+        while len(_verified_tokens) > AUTH_TOKEN_CACHE_MAX_SIZE:
+            _verified_tokens.popitem(last=False)
+
+
+def _get_jwks_client() -> "jwt.PyJWKClient | None":
+    global _jwks_client
+    if _jwks_client is None and supabase_url:
+        headers = {"apikey": supabase_anon} if supabase_anon else None
+        _jwks_client = jwt.PyJWKClient(
+            f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+            cache_keys=True,
+            headers=headers,
+        )
+    return _jwks_client
+
+
+def _verify_token_locally(token: str) -> dict | None:
+    """Return the verified claims, or None if the token cannot be verified locally.
+
+    Raises jwt.InvalidTokenError when the token is verifiably invalid (bad signature, expired...).
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+
+    if algorithm == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key = SUPABASE_JWT_SECRET
+    elif algorithm in ("RS256", "ES256"):
+        jwks_client = _get_jwks_client()
+        if jwks_client is None:
+            return None
+        try:
+            key = jwks_client.get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientError as e:
+            logger_config.warning(f"[AUTH DEBUG] JWKS lookup failed, falling back to Supabase Auth: {e}")
+            return None
+    else:
+        return None
+
+    return jwt.decode(token, key, algorithms=[algorithm], audience=SUPABASE_JWT_AUDIENCE)
+
+
 # Utility function for getting user ID from authorization token
-def get_user_id_from_token(authorization: str) -> str:
+async def get_user_id_from_token(authorization: str) -> str:
     """Extract user ID from authorization token"""
-    from .db_client import supabase_service_client
-    
-    logger_config.info(f"[AUTH DEBUG] get_user_id_from_token called")
-    logger_config.info(f"[AUTH DEBUG] authorization parameter: {authorization[:50] if authorization else 'None'}...")
+    from .db_client import supabase_async_client
     
     if not authorization or not authorization.startswith("Bearer "):
         logger_config.warning(f"[AUTH DEBUG] Invalid authorization header format")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
     token = authorization.replace("Bearer ", "")
-    logger_config.info(f"[AUTH DEBUG] Extracted token length: {len(token)}")
-    logger_config.info(f"[AUTH DEBUG] Token parts count: {len(token.split('.'))}")
-    logger_config.info(f"[AUTH DEBUG] Token first 50 chars: {token[:50]}...")
+    cache_key = _token_cache_key(token)
+    
+    cached_user_id = _get_cached_user_id(cache_key)
+    if cached_user_id:
+        return cached_user_id
+    
+    try:
+        # Off the event loop: a JWKS cache miss fetches the signing keys over the network
+        claims = await asyncio.to_thread(_verify_token_locally, token)
+    except jwt.InvalidTokenError as e:
+        logger_config.warning(f"[AUTH DEBUG] Local token verification failed: {e}")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    
+    if claims is not None:
+        user_id = claims.get("sub")
+        if not user_id:
+            logger_config.warning(f"[AUTH DEBUG] Verified token has no subject claim")
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        _cache_user_id(cache_key, user_id, claims.get("exp"))
+        logger_config.debug(f"[AUTH DEBUG] Verified token locally for user: {user_id}")
+        return user_id
     
     try:
-        # Verify token with Supabase using service client
+        # Local verification impossible: verify token with Supabase using service client
         logger_config.info(f"[AUTH DEBUG] Attempting to verify token with Supabase...")
-        user_response = supabase_service_client.auth.get_user(token)
+        user_response = await supabase_async_client.auth.get_user(token)
         
         if not user_response.user:
             logger_config.warning(f"[AUTH DEBUG] Supabase returned no user for token")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
         
         logger_config.info(f"[AUTH DEBUG] Successfully verified user: {user_response.user.id}")
+        # Signature already checked by Supabase; the exp claim only bounds the cache entry
+        token_exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        _cache_user_id(cache_key, user_response.user.id, token_exp)
         return user_response.user.id
         
     except Exception as e:
@@ -6,16 +6,22 @@ Uses Supabase MCP to generate comprehensive call and campaign reports
 import csv
 import io
 import logging
+import os
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Header, Response
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from api.db_client import supabase_service_client
+from api.config import get_user_id_from_token
+from api.db_client import supabase_async_client
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/reports", tags=["csv_reports"])
 
+# Rows fetched per round-trip while streaming exports
+EXPORT_PAGE_SIZE = int(os.getenv("CSV_EXPORT_PAGE_SIZE", "1000"))
+
 class ReportGenerationRequest(BaseModel):
     report_type: str  # "calls", "campaigns", "agents", "comprehensive"
     start_date: Optional[str] = None
@@ -128,25 +134,187 @@ def get_date_range_filter(time_filter: str, start_date: Optional[str], end_date:
     
     return start, end
 
-async def generate_calls_report(user_id: str, request: ReportGenerationRequest) -> str:
-    """Generate detailed calls report using Supabase MCP"""
+def apply_keyset_cursor(query, cursor: Optional[tuple]):
+    """Restrict a select to rows strictly after ``cursor`` = (created_at, id) in (created_at, id) descending order"""
+    if cursor:
+        created_at, row_id = cursor
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    return query.order("created_at", desc=True).order("id", desc=True)
+
+async def iter_keyset_pages(
+    build_query: Callable[[], Any],
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield pages of rows ordered by (created_at, id) descending using keyset pagination.
+
+    ``build_query`` must return a fresh filtered select (including ``id`` and
+    ``created_at``) on every call, since the query builders are mutable.
+    """
+    cursor: Optional[tuple] = None
+    while True:
+        query = apply_keyset_cursor(build_query(), cursor)
+        response = await query.limit(page_size).execute()
+        rows = response.data or []
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+def _csv_line(values: List[Any]) -> str:
+    """Render a single CSV record"""
+    output = io.StringIO()
+    csv.writer(output).writerow(values)
+    return output.getvalue()
+
+CALLS_REPORT_HEADERS = [
+    "Call ID", "Status", "Call Outcome", "Duration (MM:SS)", "Duration (Seconds)",
+    "Phone Number", "Contact Name", "Geographic Region", "Agent Name", "Agent ID",
+    "Campaign Name", "Campaign ID", "Call Type", "From Number",
+    "To Number", "Created At", "Initiated At", "Answered At", "Ended At",
+    "Date", "Time", "Day of Week", "Hour of Day", "Ended Reason"
+]
+
+CAMPAIGNS_REPORT_HEADERS = [
+    "Campaign ID", "Campaign Name", "Description", "Status", "Agent Name", "Agent ID",
+    "Total Numbers", "Completed Calls", "Successful Calls", "Failed Calls",
+    "Success Rate (%)", "Completion Rate (%)", "Concurrency Limit", "Retry Failed",
+    "Max Retries", "Created At", "Scheduled At", "Started At", "Completed At",
+    "Duration (Hours)", "Calls per Hour", "User Name", "User Email"
+]
+
+def build_call_report_row(call: Dict[str, Any]) -> List[str]:
+    """Build the calls report columns for one call"""
+    # Extract nested data safely
+    agent_name = ""
+    if call.get("agents"):
+        agent_name = call["agents"].get("name", "")
+    
+    campaign_name = ""
+    campaign_id = call.get("batch_campaign_id", "")
+    if call.get("batch_campaigns"):
+        campaign_name = call["batch_campaigns"].get("name", "")
+    
+    # Format timestamps
+    created_at = call.get("created_at", "")
+    if created_at:
+        try:
+            created_dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            date_str = created_dt.strftime("%Y-%m-%d")
+            time_str = created_dt.strftime("%H:%M:%S")
+            day_of_week = created_dt.strftime("%A")
+            hour_of_day = created_dt.strftime("%H:00")
+        except:
+            date_str = time_str = day_of_week = hour_of_day = ""
+    else:
+        date_str = time_str = day_of_week = hour_of_day = ""
+    
+    duration = call.get("call_duration")
+    phone_number = call.get("phone_number_e164", "") or call.get("to_phone_number", "")
+    
+    return [
+        escape_csv_field(call.get("id", "")),
+        escape_csv_field(call.get("status", "")),
+        escape_csv_field(get_call_outcome(call.get("status", ""), duration)),
+        escape_csv_field(format_duration(duration)),
+        escape_csv_field(duration or 0),
+        escape_csv_field(phone_number),
+        escape_csv_field(call.get("contact_name", "")),
+        escape_csv_field(get_geographic_region(phone_number)),
+        escape_csv_field(agent_name),
+        escape_csv_field(call.get("agent_id", "")),
+        escape_csv_field(campaign_name),
+        escape_csv_field(campaign_id),
+        escape_csv_field(call.get("call_type", "")),
+        escape_csv_field(call.get("from_phone_number", "")),
+        escape_csv_field(call.get("to_phone_number", "")),
+        escape_csv_field(created_at),
+        escape_csv_field(call.get("initiated_at", "")),
+        escape_csv_field(call.get("answered_at", "")),
+        escape_csv_field(call.get("ended_at", "")),
+        escape_csv_field(date_str),
+        escape_csv_field(time_str),
+        escape_csv_field(day_of_week),
+        escape_csv_field(hour_of_day),
+        escape_csv_field(call.get("ended_reason", ""))
+    ]
+
+def build_campaign_report_row(campaign: Dict[str, Any]) -> List[str]:
+    """Build the campaigns report columns for one campaign"""
+    # Extract nested data
+    agent_name = ""
+    agent_id = ""
+    if isinstance(campaign.get("agents"), dict):
+        agent_name = campaign["agents"].get("name", "")
+        agent_id = campaign["agents"].get("id", "")
+    
+    user_name = ""
+    user_email = ""
+    if isinstance(campaign.get("users"), dict):
+        user_name = campaign["users"].get("name", "")
+        user_email = campaign["users"].get("email", "")
+    
+    # Calculate metrics
+    total_numbers = campaign.get("total_numbers", 0) or 0
+    completed_calls = campaign.get("completed_calls", 0) or 0
+    successful_calls = campaign.get("successful_calls", 0) or 0
+    failed_calls = campaign.get("failed_calls", 0) or 0
+    
+    success_rate = (successful_calls / total_numbers * 100) if total_numbers > 0 else 0
+    completion_rate = (completed_calls / total_numbers * 100) if total_numbers > 0 else 0
+    
+    # Calculate duration and calls per hour
+    started_at = campaign.get("started_at")
+    completed_at = campaign.get("completed_at")
+    duration_hours = 0
+    calls_per_hour = 0
+    
+    if started_at and completed_at:
+        try:
+            start_dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+            end_dt = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
+            duration = end_dt - start_dt
+            duration_hours = duration.total_seconds() / 3600
+            if duration_hours > 0:
+                calls_per_hour = completed_calls / duration_hours
+        except:
+            pass
+    
+    return [
+        escape_csv_field(campaign.get("id", "")),
+        escape_csv_field(campaign.get("name", "")),
+        escape_csv_field(campaign.get("description", "")),
+        escape_csv_field(campaign.get("status", "")),
+        escape_csv_field(agent_name),
+        escape_csv_field(agent_id),
+        escape_csv_field(total_numbers),
+        escape_csv_field(completed_calls),
+        escape_csv_field(successful_calls),
+        escape_csv_field(failed_calls),
+        escape_csv_field(round(success_rate, 2)),
+        escape_csv_field(round(completion_rate, 2)),
+        escape_csv_field(campaign.get("concurrency_limit", "")),
+        escape_csv_field(campaign.get("retry_failed", "")),
+        escape_csv_field(campaign.get("max_retries", "")),
+        escape_csv_field(campaign.get("created_at", "")),
+        escape_csv_field(campaign.get("scheduled_at", "")),
+        escape_csv_field(campaign.get("started_at", "")),
+        escape_csv_field(campaign.get("completed_at", "")),
+        escape_csv_field(round(duration_hours, 2)),
+        escape_csv_field(round(calls_per_hour, 2)),
+        escape_csv_field(user_name),
+        escape_csv_field(user_email)
+    ]
+
+async def generate_calls_report(user_id: str, request: ReportGenerationRequest) -> AsyncIterator[str]:
+    """Stream the detailed calls report, one CSV record at a time"""
     start_date, end_date = get_date_range_filter(request.time_filter, request.start_date, request.end_date)
     
-    try:
-        # Build query conditions
-        query_conditions = [f"user_id.eq.{user_id}"]
-        
-        if start_date:
-            query_conditions.append(f"created_at.gte.{start_date}")
-        if end_date:
-            query_conditions.append(f"created_at.lte.{end_date}")
-        if request.campaign_id and request.campaign_id != "all":
-            query_conditions.append(f"batch_campaign_id.eq.{request.campaign_id}")
-        if request.agent_id and request.agent_id != "all":
-            query_conditions.append(f"agent_id.eq.{request.agent_id}")
-        
-        # Use Supabase client to get calls data
-        result = supabase_service_client.table("calls").select("""
+    def build_query():
+        query = supabase_async_client.table("calls").select("""
             id, status, call_duration, phone_number_e164, contact_name, created_at, 
             initiated_at, answered_at, ended_at, call_direction, call_type, ended_reason,
             from_phone_number, to_phone_number, call_control_id, telnyx_call_session_id,
@@ -157,102 +325,32 @@ async def generate_calls_report(user_id: str, request: ReportGenerationRequest)
         """).eq("user_id", user_id)
         
         if start_date:
-            result = result.gte("created_at", start_date)
+            query = query.gte("created_at", start_date)
         if end_date:
-            result = result.lte("created_at", end_date)
+            query = query.lte("created_at", end_date)
         if request.campaign_id and request.campaign_id != "all":
-            result = result.eq("batch_campaign_id", request.campaign_id)
+            query = query.eq("batch_campaign_id", request.campaign_id)
         if request.agent_id and request.agent_id != "all":
-            result = result.eq("agent_id", request.agent_id)
-            
-        result = result.order("created_at", desc=True).limit(10000)
-        response = result.execute()
-        calls_data = response.data or []
-        
-    except Exception as e:
-        logger.error(f"Error fetching calls data: {e}")
-        calls_data = []
-    
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    headers = [
-        "Call ID", "Status", "Call Outcome", "Duration (MM:SS)", "Duration (Seconds)",
-        "Phone Number", "Contact Name", "Geographic Region", "Agent Name", "Agent ID",
-        "Campaign Name", "Campaign ID", "Call Type", "From Number",
-        "To Number", "Created At", "Initiated At", "Answered At", "Ended At",
-        "Date", "Time", "Day of Week", "Hour of Day", "Ended Reason"
-    ]
-    writer.writerow(headers)
+            query = query.eq("agent_id", request.agent_id)
+        return query
     
-    # Write data rows
-    for call in calls_data:
-        # Extract nested data safely
-        agent_name = ""
-        if call.get("agents"):
-            agent_name = call["agents"].get("name", "")
-        
-        campaign_name = ""
-        campaign_id = call.get("batch_campaign_id", "")
-        if call.get("batch_campaigns"):
-            campaign_name = call["batch_campaigns"].get("name", "")
-        
-        # Format timestamps
-        created_at = call.get("created_at", "")
-        if created_at:
-            try:
-                created_dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                date_str = created_dt.strftime("%Y-%m-%d")
-                time_str = created_dt.strftime("%H:%M:%S")
-                day_of_week = created_dt.strftime("%A")
-                hour_of_day = created_dt.strftime("%H:00")
-            except:
-                date_str = time_str = day_of_week = hour_of_day = ""
-        else:
-            date_str = time_str = day_of_week = hour_of_day = ""
-        
-        duration = call.get("call_duration")
-        phone_number = call.get("phone_number_e164", "") or call.get("to_phone_number", "")
-        
-        row = [
-            escape_csv_field(call.get("id", "")),
-            escape_csv_field(call.get("status", "")),
-            escape_csv_field(get_call_outcome(call.get("status", ""), duration)),
-            escape_csv_field(format_duration(duration)),
-            escape_csv_field(duration or 0),
-            escape_csv_field(phone_number),
-            escape_csv_field(call.get("contact_name", "")),
-            escape_csv_field(get_geographic_region(phone_number)),
-            escape_csv_field(agent_name),
-            escape_csv_field(call.get("agent_id", "")),
-            escape_csv_field(campaign_name),
-            escape_csv_field(campaign_id),
-            escape_csv_field(call.get("call_type", "")),
-            escape_csv_field(call.get("from_phone_number", "")),
-            escape_csv_field(call.get("to_phone_number", "")),
-            escape_csv_field(created_at),
-            escape_csv_field(call.get("initiated_at", "")),
-            escape_csv_field(call.get("answered_at", "")),
-            escape_csv_field(call.get("ended_at", "")),
-            escape_csv_field(date_str),
-            escape_csv_field(time_str),
-            escape_csv_field(day_of_week),
-            escape_csv_field(hour_of_day),
-            escape_csv_field(call.get("ended_reason", ""))
-        ]
-        writer.writerow(row)
+    yield _csv_line(CALLS_REPORT_HEADERS)
     
-    return output.getvalue()
+    try:
+        async for calls_page in iter_keyset_pages(build_query):
+            for call in calls_page:
+                yield _csv_line(build_call_report_row(call))
+    except Exception as e:
+        logger.error(f"Error fetching calls data: {e}")
+        # Headers are already sent: abort the chunked response so the client sees an incomplete file
+        raise
 
-async def generate_campaigns_report(user_id: str, request: ReportGenerationRequest) -> str:
-    """Generate campaigns performance report"""
+async def generate_campaigns_report(user_id: str, request: ReportGenerationRequest) -> AsyncIterator[str]:
+    """Stream the campaigns performance report, one CSV record at a time"""
     start_date, end_date = get_date_range_filter(request.time_filter, request.start_date, request.end_date)
     
-    try:
-        # Get campaigns data
-        query = supabase_service_client.postgrest.from_("batch_campaigns").select("""
+    def build_query():
+        query = supabase_async_client.postgrest.from_("batch_campaigns").select("""
             id, name, description, status, total_numbers, completed_calls, successful_calls, 
             failed_calls, concurrency_limit, retry_failed, max_retries, scheduled_at, 
             started_at, completed_at, created_at, updated_at,
@@ -266,135 +364,45 @@ async def generate_campaigns_report(user_id: str, request: ReportGenerationReque
             query = query.lte("created_at", end_date)
         if request.campaign_id and request.campaign_id != "all":
             query = query.eq("id", request.campaign_id)
-        
-        query = query.order("created_at", desc=True)
-        response = query.execute()
-        campaigns_data = response.data or []
-        
-    except Exception as e:
-        logger.error(f"Error fetching campaigns data: {e}")
-        campaigns_data = []
-    
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    headers = [
-        "Campaign ID", "Campaign Name", "Description", "Status", "Agent Name", "Agent ID",
-        "Total Numbers", "Completed Calls", "Successful Calls", "Failed Calls",
-        "Success Rate (%)", "Completion Rate (%)", "Concurrency Limit", "Retry Failed",
-        "Max Retries", "Created At", "Scheduled At", "Started At", "Completed At",
-        "Duration (Hours)", "Calls per Hour", "User Name", "User Email"
-    ]
-    writer.writerow(headers)
+        return query
     
-    # Write data rows
-    for campaign in campaigns_data:
-        # Extract nested data
-        agent_name = ""
-        agent_id = ""
-        if isinstance(campaign.get("agents"), dict):
-            agent_name = campaign["agents"].get("name", "")
-            agent_id = campaign["agents"].get("id", "")
-        
-        user_name = ""
-        user_email = ""
-        if isinstance(campaign.get("users"), dict):
-            user_name = campaign["users"].get("name", "")
-            user_email = campaign["users"].get("email", "")
-        
-        # Calculate metrics
-        total_numbers = campaign.get("total_numbers", 0) or 0
-        completed_calls = campaign.get("completed_calls", 0) or 0
-        successful_calls = campaign.get("successful_calls", 0) or 0
-        failed_calls = campaign.get("failed_calls", 0) or 0
-        
-        success_rate = (successful_calls / total_numbers * 100) if total_numbers > 0 else 0
-        completion_rate = (completed_calls / total_numbers * 100) if total_numbers > 0 else 0
-        
-        # Calculate duration and calls per hour
-        started_at = campaign.get("started_at")
-        completed_at = campaign.get("completed_at")
-        duration_hours = 0
-        calls_per_hour = 0
-        
-        if started_at and completed_at:
-            try:
-                start_dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                end_dt = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
-                duration = end_dt - start_dt
-                duration_hours = duration.total_seconds() / 3600
-                if duration_hours > 0:
-                    calls_per_hour = completed_calls / duration_hours
-            except:
-                pass
-        
-        row = [
-            escape_csv_field(campaign.get("id", "")),
-            escape_csv_field(campaign.get("name", "")),
-            escape_csv_field(campaign.get("description", "")),
-            escape_csv_field(campaign.get("status", "")),
-            escape_csv_field(agent_name),
-            escape_csv_field(agent_id),
-            escape_csv_field(total_numbers),
-            escape_csv_field(completed_calls),
-            escape_csv_field(successful_calls),
-            escape_csv_field(failed_calls),
-            escape_csv_field(round(success_rate, 2)),
-            escape_csv_field(round(completion_rate, 2)),
-            escape_csv_field(campaign.get("concurrency_limit", "")),
-            escape_csv_field(campaign.get("retry_failed", "")),
-            escape_csv_field(campaign.get("max_retries", "")),
-            escape_csv_field(campaign.get("created_at", "")),
-            escape_csv_field(campaign.get("scheduled_at", "")),
-            escape_csv_field(campaign.get("started_at", "")),
-            escape_csv_field(campaign.get("completed_at", "")),
-            escape_csv_field(round(duration_hours, 2)),
-            escape_csv_field(round(calls_per_hour, 2)),
-            escape_csv_field(user_name),
-            escape_csv_field(user_email)
-        ]
-        writer.writerow(row)
+    yield _csv_line(CAMPAIGNS_REPORT_HEADERS)
     
-    return output.getvalue()
+    try:
+        async for campaigns_page in iter_keyset_pages(build_query):
+            for campaign in campaigns_page:
+                yield _csv_line(build_campaign_report_row(campaign))
+    except Exception as e:
+        logger.error(f"Error fetching campaigns data: {e}")
+        raise
 
-async def generate_comprehensive_report(user_id: str, request: ReportGenerationRequest) -> str:
-    """Generate comprehensive report with all data"""
-    start_date, end_date = get_date_range_filter(request.time_filter, request.start_date, request.end_date)
-    
-    # Generate all individual reports
-    calls_csv = await generate_calls_report(user_id, request)
-    campaigns_csv = await generate_campaigns_report(user_id, request)
-    
-    # Combine into a comprehensive report with sections
-    output = io.StringIO()
-    
-    # Add report header
-    output.write("PAM Analytics Comprehensive Report\n")
-    output.write(f"Generated on: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}\n")
-    output.write(f"Time Filter: {request.time_filter}\n")
+async def generate_comprehensive_report(user_id: str, request: ReportGenerationRequest) -> AsyncIterator[str]:
+    """Stream the comprehensive report with all sections"""
+    # Report header
+    yield "PAM Analytics Comprehensive Report\n"
+    yield f"Generated on: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
+    yield f"Time Filter: {request.time_filter}\n"
     if request.start_date:
-        output.write(f"Start Date: {request.start_date}\n")
+        yield f"Start Date: {request.start_date}\n"
     if request.end_date:
-        output.write(f"End Date: {request.end_date}\n")
+        yield f"End Date: {request.end_date}\n"
     if request.campaign_id and request.campaign_id != "all":
-        output.write(f"Campaign ID: {request.campaign_id}\n")
+        yield f"Campaign ID: {request.campaign_id}\n"
     if request.agent_id and request.agent_id != "all":
-        output.write(f"Agent ID: {request.agent_id}\n")
-    output.write("\n")
-    
-    # Add calls section
-    output.write("=== CALLS REPORT ===\n")
-    output.write(calls_csv)
-    output.write("\n\n")
+        yield f"Agent ID: {request.agent_id}\n"
+    yield "\n"
     
-    # Add campaigns section
-    output.write("=== CAMPAIGNS REPORT ===\n")
-    output.write(campaigns_csv)
-    output.write("\n")
+    # Calls section
+    yield "=== CALLS REPORT ===\n"
+    async for line in generate_calls_report(user_id, request):
+        yield line
+    yield "\n\n"
     
-    return output.getvalue()
+    # Campaigns section
+    yield "=== CAMPAIGNS REPORT ===\n"
+    async for line in generate_campaigns_report(user_id, request):
+        yield line
+    yield "\n"
 
 @router.post("/generate")
 async def generate_report(
@@ -405,32 +413,26 @@ async def generate_report(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
-        # Generate the appropriate report
+        # Pick the appropriate report stream
         if request.report_type == "calls":
-            csv_content = await generate_calls_report(user_id, request)
+            csv_stream = generate_calls_report(user_id, request)
             filename = f"pam_calls_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         elif request.report_type == "campaigns":
-            csv_content = await generate_campaigns_report(user_id, request)
+            csv_stream = generate_campaigns_report(user_id, request)
             filename = f"pam_campaigns_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         elif request.report_type == "comprehensive":
-            csv_content = await generate_comprehensive_report(user_id, request)
+            csv_stream = generate_comprehensive_report(user_id, request)
             filename = f"pam_comprehensive_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         else:
             raise HTTPException(status_code=400, detail="Invalid report type")
         
-        # Return CSV as downloadable response
-        return Response(
-            content=csv_content,
+        # Stream CSV as downloadable response
+        return StreamingResponse(
+            csv_stream,
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
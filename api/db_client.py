@@ -1,5 +1,8 @@
+import asyncio
 import os
-from supabase import create_client, Client
+import weakref
+from supabase import create_client, Client, AsyncClient, acreate_client
+from supabase.lib.client_options import AsyncClientOptions
 import logging
 
 # Import config to ensure environment variables are loaded
@@ -64,5 +67,63 @@ def get_supabase_anon_client() -> Client:
         raise ValueError("Supabase URL or Anon Key not configured for anon client.")
     return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+
+# --- Async client for FastAPI handlers ---
+# The synchronous client above blocks the event loop for the whole PostgREST
+# round trip. Async handlers must use `supabase_async_client` instead:
+#
+#     response = await supabase_async_client.table("calls").select("*").execute()
+#
+# Each event loop gets its own AsyncClient (and therefore its own pooled
+# keep-alive httpx connections), since connections cannot be shared across
+# loops. The background scheduler threads run their own loops.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_client_for_running_loop() -> AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+            raise ValueError("Supabase URL or Service Role Key not configured for async client.")
+        options = AsyncClientOptions(
+            persist_session=False,
+            auto_refresh_token=False,
+            postgrest_client_timeout=int(os.getenv("SUPABASE_HTTP_TIMEOUT", "30")),
+        )
+        client = AsyncClient(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options)
+        _async_clients[loop] = client
+        logger.info("Supabase async service client initialized for current event loop.")
+    return client
+
+
+class _AsyncServiceClientProxy:
+    """Module-level handle that resolves to the pooled AsyncClient of the running loop."""
+
+    def __getattr__(self, name):
+        return getattr(_get_async_client_for_running_loop(), name)
+
+
+# Service-role async client (bypasses RLS). Only usable from inside a coroutine.
+supabase_async_client: AsyncClient = _AsyncServiceClientProxy()  # type: ignore
+
+
+async def get_supabase_async_anon_client() -> AsyncClient:
+    """Async counterpart of get_supabase_anon_client (fresh client, holds its own session)."""
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        raise ValueError("Supabase URL or Anon Key not configured for anon client.")
+    return await acreate_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+
+async def close_supabase_async_client():
+    """Close the pooled connections of the current loop's async client (app shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is None:
+        return
+    try:
+        await client.postgrest.aclose()
+    except Exception as e:
+        logger.warning(f"Error closing Supabase async client: {e}")
+
 # Primarily, you'll import and use supabase_service_client from this module
 # for backend operations that need elevated privileges or don't have a user context. 
\ No newline at end of file
@@ -139,7 +139,7 @@ async def list_user_connections(
 ):
     """Get user's app connections with real-time token expiration checking"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         # Use service client for admin access to join with app_integrations
         from .db_client import supabase_service_client
         supabase = supabase_service_client
@@ -235,7 +235,7 @@ async def initiate_oauth_flow(
 ):
     """Initiate OAuth flow for app connection"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         app_name = request.app_name.lower()
         
         # Validate app is supported
@@ -520,7 +520,7 @@ async def test_connection(
 ):
     """Test an app connection to verify it's working"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         # Get connection details
         from .oauth_utils import get_user_connection_with_valid_creds
@@ -568,7 +568,7 @@ async def delete_connection(
 ):
     """Delete an app connection"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         supabase = get_supabase_anon_client()
         
         # Verify connection belongs to user
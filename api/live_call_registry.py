@@ -0,0 +1,252 @@
+"""
+In-process registry of live calls for /analytics/real-time.
+
+Fed by call status transitions (call creation, agent status updates, Telnyx webhooks)
+and by campaign dispatchers, it keeps per-user gauges of calls in progress and
+per-minute counters over the last hour, so the endpoint reads memory only.
+
+The registry is per process: with several API workers each one reports the calls
+whose transitions it handled.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+LIVE_CALL_WINDOW_MINUTES = 60
+# Calls that never report a terminal status stop counting as in progress after this
+LIVE_CALL_MAX_AGE_SECONDS = int(os.getenv("LIVE_CALL_MAX_AGE_SECONDS", str(2 * 3600)))
+LIVE_CALL_PRUNE_INTERVAL_SECONDS = 60
+# Recently ended call ids, so a repeated terminal update is not counted twice
+LIVE_CALL_ENDED_MEMORY_SIZE = 10000
+# Weight of the latest request in the API response time moving average
+API_RESPONSE_TIME_EWMA_ALPHA = 0.1
+
+SUCCESSFUL_CALL_STATUSES = {"completed", "ended"}
+TERMINAL_CALL_STATUSES = SUCCESSFUL_CALL_STATUSES | {
+    "failed", "busy", "no_answer", "cancelled", "canceled", "voicemail", "timeout", "error"
+}
+
+
+class _MinuteWindow:
+    """Ring of per-minute counters covering the last LIVE_CALL_WINDOW_MINUTES minutes"""
+
+    __slots__ = ("minutes", "started", "ended", "successful", "duration")
+
+    def __init__(self):
+        size = LIVE_CALL_WINDOW_MINUTES
+        self.minutes = [-1] * size
+        self.started = [0] * size
+        self.ended = [0] * size
+        self.successful = [0] * size
+        self.duration = [0] * size
+
+    def _slot(self, minute: int) -> int:
+        index = minute % LIVE_CALL_WINDOW_MINUTES
+        if self.minutes[index] != minute:
+            # Slot still holds a minute from the previous hour
+            self.minutes[index] = minute
+            self.started[index] = self.ended[index] = self.successful[index] = self.duration[index] = 0
+        return index
+
+    def add_started(self, minute: int):
+        self.started[self._slot(minute)] += 1
+
+    def add_ended(self, minute: int, successful: bool, duration: int):
+        index = self._slot(minute)
+        self.ended[index] += 1
+        self.successful[index] += int(successful)
+        self.duration[index] += duration
+
+    def snapshot(self, now_minute: int) -> Dict[str, Any]:
+        totals = {"started": 0, "ended": 0, "successful": 0, "duration": 0}
+        per_minute = {}
+        for index, minute in enumerate(self.minutes):
+            if now_minute - LIVE_CALL_WINDOW_MINUTES < minute <= now_minute:
+                totals["started"] += self.started[index]
+                totals["ended"] += self.ended[index]
+                totals["successful"] += self.successful[index]
+                totals["duration"] += self.duration[index]
+                per_minute[minute] = (self.started[index], self.successful[index])
+        totals["per_minute"] = per_minute
+        return totals
+
+
+class LiveCallRegistry:
+    def __init__(self):
+        # call_id -> {"user_id", "campaign_id", "agent_id", "status", "started_at"}
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._in_progress_by_user: Dict[str, int] = {}
+        self._in_progress_by_campaign: Dict[str, int] = {}
+        self._windows: Dict[str, _MinuteWindow] = {}
+        # user_id -> {campaign_id: name} of campaigns with a running dispatcher
+        self._running_campaigns: Dict[str, Dict[str, str]] = {}
+        self._recently_ended: "OrderedDict[str, None]" = OrderedDict()
+        self._last_prune = time.monotonic()
+        self._api_response_time_ms: Optional[float] = None
+        # Fed from the request loop and from the scheduler threads
+        self._lock = threading.Lock()
+
+    # --- feeding ---
+
+    def record_call_status(
+        self,
+        call_id: Any,
+        status: Optional[str],
+        user_id: Optional[str] = None,
+        campaign_id: Optional[str] = None,
+        agent_id: Optional[Any] = None,
+        duration_seconds: Optional[int] = None,
+    ):
+        """Apply a status transition of a call; unknown calls are registered on the fly"""
+        if not call_id or not status:
+            return
+        call_id = str(call_id)
+        status = status.lower()
+        now = time.time()
+        minute = int(now // 60)
+
+        with self._lock:
+            self._maybe_prune(now)
+            call = self._active.get(call_id)
+
+            if status not in TERMINAL_CALL_STATUSES:
+                if call is not None:
+                    call["status"] = status
+                    return
+                if call_id in self._recently_ended or not user_id:
+                    return
+                self._active[call_id] = {
+                    "user_id": str(user_id),
+                    "campaign_id": str(campaign_id) if campaign_id else None,
+                    "agent_id": agent_id,
+                    "status": status,
+                    "started_at": now,
+                }
+                self._adjust_gauges(self._active[call_id], 1)
+                self._window(str(user_id)).add_started(minute)
+                return
+
+            # Terminal status
+            if call_id in self._recently_ended:
+                return
+            self._recently_ended[call_id] = None
+            if len(self._recently_ended) > LIVE_CALL_ENDED_MEMORY_SIZE:
+                self._recently_ended.popitem(last=False)
+
+            if call is not None:
+                self._active.pop(call_id)
+                self._adjust_gauges(call, -1)
+                user_id = call["user_id"]
+                if duration_seconds is None:
+                    duration_seconds = int(now - call["started_at"])
+            elif not user_id:
+                return
+            self._window(str(user_id)).add_ended(minute, status in SUCCESSFUL_CALL_STATUSES, int(duration_seconds or 0))
+
+    def record_call_row(self, call: Optional[Dict[str, Any]]):
+        """Apply the status of a 'calls' row as returned by Supabase after an insert/update"""
+        if not call:
+            return
+        self.record_call_status(
+            call.get("id"),
+            call.get("status"),
+            user_id=call.get("user_id"),
+            campaign_id=call.get("batch_campaign_id"),
+            agent_id=call.get("agent_id"),
+            duration_seconds=call.get("call_duration"),
+        )
+
+    def campaign_started(self, user_id: Optional[str], campaign_id: str, name: Optional[str]):
+        if not user_id:
+            return
+        with self._lock:
+            self._running_campaigns.setdefault(str(user_id), {})[str(campaign_id)] = name or "Unknown"
+
+    def campaign_finished(self, user_id: Optional[str], campaign_id: str):
+        if not user_id:
+            return
+        with self._lock:
+            campaigns = self._running_campaigns.get(str(user_id))
+            if campaigns is not None:
+                campaigns.pop(str(campaign_id), None)
+
+    def record_api_response_time(self, elapsed_ms: float):
+        previous = self._api_response_time_ms
+        self._api_response_time_ms = elapsed_ms if previous is None else previous + API_RESPONSE_TIME_EWMA_ALPHA * (elapsed_ms - previous)
+
+    @property
+    def api_response_time_ms(self) -> Optional[float]:
+        return self._api_response_time_ms
+
+    # --- internals (lock held) ---
+
+    def _window(self, user_id: str) -> _MinuteWindow:
+        window = self._windows.get(user_id)
+        if window is None:
+            window = self._windows[user_id] = _MinuteWindow()
+        return window
+
+    def _adjust_gauges(self, call: Dict[str, Any], delta: int):
+        user_id = call["user_id"]
+        self._in_progress_by_user[user_id] = self._in_progress_by_user.get(user_id, 0) + delta
+        if call["campaign_id"]:
+            campaign_id = call["campaign_id"]
+            self._in_progress_by_campaign[campaign_id] = self._in_progress_by_campaign.get(campaign_id, 0) + delta
+
+    def _maybe_prune(self, now: float):
+        if time.monotonic() - self._last_prune < LIVE_CALL_PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = time.monotonic()
+        stale = [call_id for call_id, call in self._active.items() if now - call["started_at"] > LIVE_CALL_MAX_AGE_SECONDS]
+        for call_id in stale:
+            self._adjust_gauges(self._active.pop(call_id), -1)
+
+    # --- reading ---
+
+    def snapshot(self, user_id: str, minutes: int = 16) -> Dict[str, Any]:
+        """Live metrics of one user, in the shape used by /analytics/real-time"""
+        user_id = str(user_id)
+        now = time.time()
+        now_minute = int(now // 60)
+        with self._lock:
+            self._maybe_prune(now)
+            window = self._windows.get(user_id)
+            totals = window.snapshot(now_minute) if window else {"started": 0, "ended": 0, "successful": 0, "duration": 0, "per_minute": {}}
+            calls_in_progress = self._in_progress_by_user.get(user_id, 0)
+            campaigns = [
+                {
+                    "campaign_id": campaign_id,
+                    "campaign_name": name,
+                    "status": "running",
+                    "calls_in_progress": self._in_progress_by_campaign.get(campaign_id, 0),
+                }
+                for campaign_id, name in self._running_campaigns.get(user_id, {}).items()
+            ]
+
+        minute_by_minute: List[Dict[str, Any]] = []
+        for offset in range(minutes - 1, -1, -1):
+            minute = now_minute - offset
+            started, successful = totals["per_minute"].get(minute, (0, 0))
+            minute_by_minute.append({
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:00", time.gmtime(minute * 60)),
+                "calls": started,
+                "successful": successful,
+            })
+
+        ended = totals["ended"]
+        return {
+            "calls_in_progress": calls_in_progress,
+            "calls_last_hour": totals["started"],
+            "ended_last_hour": ended,
+            "successful_last_hour": totals["successful"],
+            "success_rate_last_hour": round(totals["successful"] / ended * 100, 2) if ended else 0,
+            "avg_call_duration_last_hour": round(totals["duration"] / ended, 2) if ended else 0,
+            "minute_by_minute": minute_by_minute,
+            "active_campaigns": campaigns,
+        }
+
+
+live_call_registry = LiveCallRegistry()
@@ -3,11 +3,10 @@ import base64
 import json
 import logging
 import os
-import random
-import re
-import subprocess
-import uuid
+import threading
+import time
 import httpx
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional, Dict, Any
 from pathlib import Path
@@ -41,19 +40,26 @@ print(f"[MAIN.PY DEBUG] SUPABASE_SERVICE_ROLE_KEY at startup: {'SET' if os.geten
 
 from fastapi import FastAPI, HTTPException, status, Header, Request, File, UploadFile, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, Field, validator
 from supabase import create_client
 
 from .config import BaseModel, get_user_id_from_token
-from .db_client import supabase_service_client, get_supabase_anon_client
+from .db_client import supabase_service_client, supabase_async_client, get_supabase_async_anon_client, close_supabase_async_client
 from .telnyx_routes import router as telnyx_router
-from .batch_routes import router as batch_router
-from .csv_reports import router as csv_reports_router
+from .batch_routes import router as batch_router, campaign_scheduler
+from .csv_reports import router as csv_reports_router, iter_keyset_pages, apply_keyset_cursor
 # from .webhook_tools_routes import router as webhook_tools_router  # Disabled - tools system removed
 from .pathway_routes import router as pathway_router
 from .integrations_routes import router as integrations_router
+from .telnyx_webhooks import call_control_index, telnyx_webhook_dispatcher
+from .live_call_registry import live_call_registry
+from .scheduler_lease import SchedulerLease
+from services import livekit_client, telnyx_service
+from services.livekit_client import LiveKitServiceError
+from services.voice_preview_cache import voice_preview_cache, voice_preview_cache_key
+from services.dependency_health import dependency_health
 
 # Import new route modules
 from .routes import (
@@ -71,7 +77,21 @@ from .routes import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PAM API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the pooled clients and start the background schedulers; release them all on shutdown"""
+    # Opened on the request event loop before the first request
+    telnyx_service.get_telnyx_http_client()
+    await start_background_schedulers()
+    yield
+    # Before closing the Supabase client: releasing the scheduler lease goes through it
+    await stop_background_schedulers()
+    await telnyx_webhook_dispatcher.drain()
+    await close_supabase_async_client()
+    await livekit_client.close_livekit_api()
+    await telnyx_service.close_telnyx_http_client()
+
+app = FastAPI(title="PAM API", version="1.0.0", lifespan=lifespan)
 
 # Global exception handler to prevent backend crashes
 @app.exception_handler(Exception)
@@ -125,9 +145,18 @@ app.add_middleware(
     allow_credentials=True, # Autoriser les cookies (si vous en utilisez)
     allow_methods=["*"], # Méthodes HTTP autorisées - All methods
     allow_headers=["*"], # Autoriser tous les en-têtes, y compris Content-Type et X-Xano-Authorization
+    expose_headers=["X-Next-Cursor"], # Pagination cursor of GET /calls
 )
 # --- Fin Configuration CORS ---
 
+@app.middleware("http")
+async def track_api_response_time(request: Request, call_next):
+    # Moving average reported in the system_health of /analytics/real-time
+    started = time.perf_counter()
+    response = await call_next(request)
+    live_call_registry.record_api_response_time((time.perf_counter() - started) * 1000)
+    return response
+
 app.include_router(telnyx_routes.router) # Include Telnyx routes
 app.include_router(batch_router) # Include Batch Campaign routes
 app.include_router(csv_reports_router) # Include CSV Reports routes
@@ -142,45 +171,21 @@ app.include_router(agents_router) # Agent management routes
 app.include_router(calls_router) # Call management routes
 app.include_router(users_router) # User management routes
 
-
-
-# ===== Background Scheduler for Batch Campaigns =====
-import threading
-import time
+# ===== Background Schedulers =====
+# Run on the app event loop, started and stopped by lifespan() above. Every
+# worker runs the campaign scheduler for the campaigns scheduled through it; the worker
+# holding the scheduler lease also runs its database resync and the token refresh.
 
 async def run_campaign_scheduler():
-    """Background task to check and start scheduled campaigns"""
+    """Background task starting scheduled campaigns when they become due"""
     logger.info("Starting batch campaign scheduler background task")
     
     while True:
         try:
-            # Import here to avoid circular imports
-            from .batch_routes import check_and_start_scheduled_campaigns
-            
-            # Run the scheduler check
-            await check_and_start_scheduled_campaigns()
-            
+            await campaign_scheduler.run()
         except Exception as e:
             logger.error(f"Error in campaign scheduler: {e}")
-        
-        # Check every 60 seconds
-        await asyncio.sleep(60)
-
-def run_scheduler_thread():
-    """Run the scheduler in a new event loop"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(run_campaign_scheduler())
-    except Exception as e:
-        logger.error(f"Scheduler thread error: {e}")
-    finally:
-        loop.close()
-
-# Start the scheduler in a background thread
-scheduler_thread = threading.Thread(target=run_scheduler_thread, daemon=True)
-scheduler_thread.start()
-logger.info("Batch campaign scheduler started")
+            await asyncio.sleep(5)
 
 async def run_token_refresh_scheduler():
     """Background task to check and refresh expiring OAuth tokens"""
@@ -191,8 +196,17 @@ async def run_token_refresh_scheduler():
             # Import here to avoid circular imports
             from .oauth_utils import check_and_refresh_expiring_tokens
             
-            # Run the token refresh check
-            await check_and_refresh_expiring_tokens()
+            # Uses the blocking Supabase client: run it on its own loop in a worker thread
+            stop_event = threading.Event()
+            refresh = asyncio.ensure_future(asyncio.to_thread(asyncio.run, check_and_refresh_expiring_tokens(stop_event)))
+            try:
+                await asyncio.shield(refresh)
+            except asyncio.CancelledError:
+                # The thread cannot be cancelled: stop it after the connection being refreshed
+                # and wait for it, so the lease is only given up once no refresh runs here
+                stop_event.set()
+                await asyncio.gather(refresh, return_exceptions=True)
+                raise
             
         except Exception as e:
             logger.error(f"Error in token refresh scheduler: {e}")
@@ -200,22 +214,26 @@ async def run_token_refresh_scheduler():
         # Check every 30 minutes (1800 seconds)
         await asyncio.sleep(1800)
 
-def run_token_refresh_thread():
-    """Run the token refresh scheduler in a new event loop"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(run_token_refresh_scheduler())
-    except Exception as e:
-        logger.error(f"Token refresh scheduler thread error: {e}")
-    finally:
-        loop.close()
+scheduler_lease = SchedulerLease(
+    "background_schedulers",
+    leader_loops=[run_token_refresh_scheduler],
+    on_change=campaign_scheduler.set_leader,
+)
+_scheduler_tasks: List[asyncio.Task] = []
 
-# Start the token refresh scheduler in a background thread
-token_refresh_thread = threading.Thread(target=run_token_refresh_thread, daemon=True)
-token_refresh_thread.start()
-logger.info("OAuth token refresh scheduler started")
+async def start_background_schedulers():
+    """Start the campaign scheduler and the scheduler lease loop on the app event loop"""
+    _scheduler_tasks.append(asyncio.create_task(run_campaign_scheduler()))
+    _scheduler_tasks.append(asyncio.create_task(scheduler_lease.run()))
+    logger.info(f"Background schedulers started (lease holder id {scheduler_lease.holder})")
 
+async def stop_background_schedulers():
+    """Stop the schedulers and release the lease so another worker takes over right away"""
+    for task in _scheduler_tasks:
+        task.cancel()
+    await asyncio.gather(*_scheduler_tasks, return_exceptions=True)
+    _scheduler_tasks.clear()
+    await scheduler_lease.release()
 
 
 # Définir les fournisseurs supportés par le worker actuel
@@ -261,15 +279,6 @@ class CallRequest(BaseModel):
     # Ajouter la configuration des modèles IA comme champ optionnel
     ai_models: AIModelConfig = Field(default_factory=AIModelConfig)
 
-# Modèle pour le nouvel endpoint /agents/call
-class AgentCallRequest(BaseModel):
-    agent_id: int
-    phoneNumber: str
-    lastName: str | None = None
-    # Batch campaign context (optional)
-    batch_campaign_id: Optional[str] = None
-    batch_call_item_id: Optional[str] = None
-
 class UserCreateRequest(BaseModel): # For creating in public.users directly
     email: str
     name: str | None = None
@@ -280,40 +289,11 @@ class UserSignupRequest(BaseModel): # New model for auth signup
     password: str
     name: str | None = None # Optional name for public.users profile
 
-class CallStatusUpdateRequest(BaseModel):
-    new_status: str
-    supabase_call_id: str # This ID is the ID of the row in the 'calls' table of Supabase
-    call_duration_seconds: Optional[int] = None
-    telnyx_call_control_id: Optional[str] = None
-
 # Modèle pour les webhooks Telnyx
 class TelnyxWebhook(BaseModel):
     data: dict
     meta: dict
 
-# --- Helper function to parse lk output ---
-def parse_lk_dispatch_output(output: str) -> tuple[str | None, str | None]:
-    """Tries to parse room name and job ID from lk dispatch output."""
-    room_name = None
-    job_id = None
-    
-    room_match = re.search(r'room:"([^"]+)"', output)
-    if room_match:
-        room_name = room_match.group(1)
-        
-    # Note: 'lk dispatch create' might not directly output the 'job_id' easily parsable.
-    # It often outputs a 'dispatch_id' or just the room name. Let's focus on room name.
-    # job_id_match = re.search(r"id: (JB_\S+)", output) # Example if job ID format is JB_...
-    # if job_id_match:
-    #     job_id = job_id_match.group(1)
-        
-    # Often, the room name itself contains the job/dispatch ID for dispatch-created rooms
-    if room_name and room_name.startswith("RM_"): # Default LiveKit room prefix
-         pass # Room name is usually sufficient reference initially
-
-    logger.info(f"Parsed from lk output - Room: {room_name}") # Removed Job ID for now
-    return room_name, job_id # Job ID might be None
-
 # --- API Endpoints ---
 @app.post("/call")
 async def initiate_call(request: CallRequest):
@@ -389,10 +369,13 @@ async def initiate_call(request: CallRequest):
             # These might be set by the agent worker or a later process if known
         }
         logger.info(f"Attempting to insert call log into Supabase 'calls' table: {call_log_payload}")
-        call_log_response = supabase_service_client.table("calls").insert(call_log_payload).execute()
+        call_log_response = await supabase_async_client.table("calls").insert(call_log_payload).execute()
         if call_log_response.data and len(call_log_response.data) > 0:
             supabase_call_id = call_log_response.data[0].get("id")
             logger.info(f"Successfully logged call initiation to Supabase 'calls' table. Supabase Call ID: {supabase_call_id}")
+            # Lets the call.initiated webhook link this row without scanning 'calls'
+            call_control_index.register_dial(request.phoneNumber, supabase_call_id)
+            live_call_registry.record_call_row(call_log_response.data[0])
         else:
             error_detail = "No data returned from Supabase after call log insert."
             if hasattr(call_log_response, 'error') and call_log_response.error:
@@ -418,55 +401,16 @@ async def initiate_call(request: CallRequest):
 
     metadata_json = json.dumps(metadata)
 
-    # Construct the lk dispatch command
-    command = [
-        "lk",
-        "dispatch",
-        "create",
-        "--new-room",
-        "--agent-name", "outbound-caller", # Ensure this matches your agent name
-        "--metadata", metadata_json
-    ]
-
     try:
-        # Execute the command
-        logger.info(f"Executing command: {' '.join(command)}")
-        # --- Début Modification Subprocess ---
-        # Passer explicitement l'environnement actuel au sous-processus
-        process_env = os.environ.copy()
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False, # Utiliser shell=False (plus sûr)
-            env=process_env # Passer l'environnement
-        )
-        # --- Fin Modification Subprocess ---
-
-        logger.info(f"lk dispatch command output: {result.stdout}")
-        logger.info(f"lk dispatch command stderr: {result.stderr}")
+        # Dispatch the agent in-process through the shared LiveKit API client
+        dispatch = await livekit_client.create_agent_dispatch("outbound-caller", metadata_json) # Ensure this matches your agent name
+        return {"message": "Call initiated successfully", "dispatch_details": dispatch}
 
-        # Check for specific success indicators
-        if "Dispatch created" not in result.stdout and "id: " not in result.stdout: # Check pour l'ID aussi
-             logger.warning("Dispatch command executed but success message/ID not found in output.")
-             # Peut-être vérifier le code de retour si check=True n'est pas suffisant
-
-        return {"message": "Call initiated successfully", "dispatch_details": result.stdout}
-
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to execute lk dispatch command: {e}")
-        logger.error(f"Command output (stdout): {e.stdout}")
-        logger.error(f"Command output (stderr): {e.stderr}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to initiate call: {e.stderr or e.stdout or 'Unknown error'}",
-        )
-    except FileNotFoundError:
-        logger.error("Error: 'lk' command not found. Make sure LiveKit CLI is installed and in PATH.")
+    except LiveKitServiceError as e:
+        logger.error(f"Failed to create LiveKit agent dispatch: {e} ({e.details})")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="'lk' command not found. Server configuration issue."
+            detail=f"Failed to initiate call: {str(e)}",
         )
     except Exception as e:
         logger.exception("An unexpected error occurred") # Log the full traceback
@@ -475,589 +419,17 @@ async def initiate_call(request: CallRequest):
             detail=f"An unexpected error occurred: {str(e)}",
         )
 
-# Nouvel endpoint pour lancer un appel basé sur un agent Xano
-@app.post("/agents/call")
-async def initiate_agent_call(request: AgentCallRequest, authorization: str | None = Header(None, alias="Authorization")):
-    agent_id = request.agent_id
-    logger.info(f"Received call request for agent_id {agent_id} to number {request.phoneNumber}")
-
-    # Extract JWT token from Authorization header
-    xano_token = None
-    if authorization and authorization.startswith("Bearer "):
-        xano_token = authorization.replace("Bearer ", "")
-        logger.info(f"✅ JWT token extracted successfully (length: {len(xano_token)})")
-    else:
-        logger.warning(f"❌ No valid JWT token found in Authorization header")
-
-    # Xano token is no longer used for fetching agent config from Supabase.
-    # But we now pass it to the agent for backend API calls
-
-    # --- Étape 1: Récupérer la configuration de l'agent depuis Supabase ---
-    agent_config = None
-    logger.info(f"Attempting to fetch config for agent_id {agent_id} from Supabase.")
-
-    try:
-        # Assuming agent_id in the request corresponds to 'id' in your Supabase 'agents' table
-        # And user_id in agents table links to users(id) which is auth.users(id)
-        # select_query = "*, users!inner(id)" # Example if you needed to join with users table
-        select_query = "*" 
-        
-        agent_response = supabase_service_client.table("agents").select(select_query).eq("id", agent_id).single().execute()
-        
-        if agent_response.data:
-            agent_config = agent_response.data
-            logger.info(f"Configuration de l'agent {agent_id} récupérée depuis Supabase: {agent_config}")
-        else:
-            logger.error(f"Agent config not found in Supabase for agent_id {agent_id}. Response: {agent_response.error or 'No data'}")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Agent with ID {agent_id} not found.")
-    except Exception as e: 
-        logger.error(f"Error fetching agent config for {agent_id} from Supabase: {e}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Could not fetch agent config: {str(e)}")
-
-    if not agent_config: # Should be caught by the exception above, but as a safeguard
-         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to load agent configuration.")
-
-    # --- Récupérer le numéro de téléphone de l'agent (Caller ID) et son LiveKit SIP Trunk ID depuis Supabase ---
-    agent_caller_id_number = None
-    sip_trunk_id_from_phone_number_config = None # Explicitly for the number assigned to agent
-    phone_numbers_id = agent_config.get("phone_numbers_id") # This is the PK of the phone_numbers record assigned to the agent
-
-    if phone_numbers_id: 
-        try:
-            logger.info(f"Attempting to fetch phone number details for phone_numbers_id {phone_numbers_id} (assigned to agent {agent_id}) from Supabase.")
-            # Select phone_number_e164 and livekit_sip_trunk_id
-            pn_response = supabase_service_client.table("phone_numbers").select("phone_number_e164, livekit_sip_trunk_id").eq("id", phone_numbers_id).single().execute()
-            
-            if pn_response.data:
-                phone_number_details = pn_response.data
-                agent_caller_id_number = phone_number_details.get("phone_number_e164")
-                sip_trunk_id_from_phone_number_config = phone_number_details.get("livekit_sip_trunk_id")
-                
-                if agent_caller_id_number:
-                    logger.info(f"Agent Caller ID from Supabase phone_numbers record {phone_numbers_id}: {agent_caller_id_number}")
-                else:
-                    logger.warning(f"phone_number_e164 not found in Supabase phone_numbers record {phone_numbers_id} for agent {agent_id}.")
-
-                if sip_trunk_id_from_phone_number_config:
-                    logger.info(f"LiveKit SIP Trunk ID from Supabase phone_numbers record {phone_numbers_id}: {sip_trunk_id_from_phone_number_config}")
-                else:
-                    logger.warning(f"livekit_sip_trunk_id not found in Supabase phone_numbers record {phone_numbers_id} for agent {agent_id}.")
-            else:
-                logger.warning(f"Phone number details not found in Supabase for phone_numbers_id {phone_numbers_id} (assigned to agent {agent_id}). Response: {pn_response.error or 'No data'}")
-        except Exception as e:
-            logger.error(f"Error fetching phone number details for phone_numbers_id {phone_numbers_id} from Supabase: {e}", exc_info=True)
-            # Not raising HTTPException here to allow fallback logic for caller ID / trunk ID
-    else:
-        logger.info(f"Agent {agent_id} does not have a phone_numbers_id assigned in their agent config. Caller ID and specific trunk from phone_numbers table will not be used.")
-
-    # --- Extraire les valeurs de la config agent (avec des valeurs par défaut) ---
-    system_prompt_from_config = agent_config.get("system_prompt", "Default prompt: Please handle the call.")
-    stt_language_from_config = agent_config.get("stt_language", "fr")
-    tts_voice_id_from_config = agent_config.get("tts_voice", "65b25c5d-ff07-4687-a04c-da2f43ef6fa9") # Default Natasha (French)
-    agent_name_from_config = agent_config.get("name", f"Agent {agent_id}")
-    initial_greeting_from_config = agent_config.get("initial_greeting", "Bonjour, ceci est un test de Pam.")
-    sip_trunk_id_directly_on_agent = agent_config.get("sip_trunk_id") # This is agents.sip_trunk_id
-
-    logger.info(f"Extracted from Agent Config - Prompt: '{system_prompt_from_config}', Lang: '{stt_language_from_config}', Voice: '{tts_voice_id_from_config}', Greeting: '{initial_greeting_from_config}'")
-    logger.info(f"SIP Trunk ID directly on agent record (agents.sip_trunk_id): {sip_trunk_id_directly_on_agent}")
-
-    # Extract VAD provider from agent config
-    vad_provider_from_config = agent_config.get("vad_provider", "silero")
-    
-    # Extract PAM tier and advanced settings
-    pam_tier = agent_config.get("pam_tier", "core")
-    wait_for_greeting = agent_config.get("wait_for_greeting", False)
-    llm_temperature = agent_config.get("llm_temperature", 0.5)
-    interruption_threshold = agent_config.get("interruption_threshold", 100)
-    
-    # Extract call handling settings
-    transfer_to = agent_config.get("transfer_to")
-    voicemail_detection = agent_config.get("voicemail_detection", False)
-    voicemail_hangup_immediately = agent_config.get("voicemail_hangup_immediately", False)
-    voicemail_message = agent_config.get("voicemail_message")
-    
-    logger.info(f"PAM Tier: {pam_tier}, Wait for Greeting: {wait_for_greeting}, Temperature: {llm_temperature}, Interruption Threshold: {interruption_threshold}")
-    logger.info(f"Call Handling - Transfer To: {transfer_to}, Voicemail Detection: {voicemail_detection}, Hangup Immediately: {voicemail_hangup_immediately}, Custom Message: {'Set' if voicemail_message else 'Not set'}")
-
-    ai_models_metadata = {
-        "vad": {"provider": vad_provider_from_config},
-        "stt": {
-            "provider": agent_config.get("stt_provider", "deepgram"), 
-            "language": stt_language_from_config, 
-            "model_name": agent_config.get("stt_model", "nova-2")
-        },
-        "tts": {
-            "provider": "dynamic",  # Will be determined by voice lookup
-            "model_name": agent_config.get("tts_model", "sonic-2-2025-03-07"), 
-            "voice_id": tts_voice_id_from_config
-        },
-        "llm": {
-            "provider": agent_config.get("llm_provider", "openai"), 
-            "model_name": agent_config.get("llm_model", "gpt-4o-mini"),
-            "temperature": llm_temperature  # Pass temperature to LLM config
-        }
-    }
-
-    # --- Déterminer le SIP Trunk ID final ---
-    final_sip_trunk_id = None
-    source_of_sip_trunk_id = "Unknown"
-
-    if sip_trunk_id_from_phone_number_config: # Highest priority: trunk from agent's assigned number
-        final_sip_trunk_id = sip_trunk_id_from_phone_number_config
-        source_of_sip_trunk_id = f"phone_numbers table (record id {phone_numbers_id} assigned to agent)"
-    elif sip_trunk_id_directly_on_agent: # Second priority: trunk ID set directly on the agent record
-        final_sip_trunk_id = sip_trunk_id_directly_on_agent
-        source_of_sip_trunk_id = "agents table (agents.sip_trunk_id field)"
-    
-    if not final_sip_trunk_id:
-        logger.error(f"CRITICAL: No SIP Trunk ID could be determined for agent {agent_id}. Searched agent's assigned phone_number and agent record.")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="SIP trunk ID is not configured for this agent.")
-    
-    logger.info(f"Final SIP Trunk ID to be used for the call: {final_sip_trunk_id} (Source: {source_of_sip_trunk_id})")
-
-    # --- Créer le log d'appel Supabase AVANT le job LiveKit ---
-    call_log_payload_supabase = {
-        "agent_id": agent_id,
-        "to_phone_number": request.phoneNumber,
-        "status": "initiating",
-        "livekit_outbound_trunk_id": final_sip_trunk_id,
-        "user_id": agent_config.get("user_id"), 
-        "from_phone_number": agent_caller_id_number if agent_caller_id_number else None
-    }
-    
-    # Add batch campaign context if provided
-    if request.batch_campaign_id:
-        call_log_payload_supabase["batch_campaign_id"] = request.batch_campaign_id
-        logger.info(f"Call will be linked to batch campaign: {request.batch_campaign_id}")
-        
-    if request.batch_call_item_id:
-        call_log_payload_supabase["batch_call_item_id"] = request.batch_call_item_id
-        logger.info(f"Call will be linked to batch call item: {request.batch_call_item_id}")
-    
-    supabase_call_id = None
-    try:
-        logger.info(f"Attempting to insert call log into Supabase 'calls' table: {call_log_payload_supabase}")
-        call_log_response = supabase_service_client.table("calls").insert(call_log_payload_supabase).execute()
-        if call_log_response.data and len(call_log_response.data) > 0:
-            supabase_call_id = call_log_response.data[0].get("id")
-            logger.info(f"Successfully logged call initiation to Supabase 'calls' table. Supabase Call ID: {supabase_call_id}")
-        else:
-            logger.error(f"Failed to log call to Supabase 'calls' table or get ID back. Response: {call_log_response.error or 'No data'}")
-            # This is critical, so raise an error
-            raise HTTPException(status_code=500, detail="Could not create call log in Supabase database (no ID returned).")
-    except Exception as log_e:
-        logger.error(f"Error occurred while trying to log call to Supabase 'calls' table: {log_e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Could not create call log in Supabase database: {str(log_e)}")
-
-    if not supabase_call_id: # Should be caught by exceptions above, but as a safeguard
-        raise HTTPException(status_code=500, detail="Could not create call log in Supabase database (ID is null).")
-
-    # --- Auto-start pathway if agent has default pathway assigned ---
-    try:
-        from api.agent_pathway_integration import auto_start_pathway_for_new_call
-        
-        # Prepare session metadata for pathway execution
-        session_metadata = {
-            "phone_number": request.phoneNumber,
-            "contact_name": request.lastName,
-            "agent_name": agent_name_from_config,
-            "call_id": str(supabase_call_id),
-            "batch_campaign_id": request.batch_campaign_id,
-            "batch_call_item_id": request.batch_call_item_id
-        }
-        
-        # Attempt to auto-start pathway (non-blocking)
-        execution_id = await auto_start_pathway_for_new_call(
-            call_id=str(supabase_call_id),
-            agent_id=agent_id,
-            session_metadata=session_metadata
-        )
-        
-        if execution_id:
-            logger.info(f"✅ Auto-started pathway execution {execution_id} for call {supabase_call_id}")
-        else:
-            logger.info(f"No pathway auto-started for call {supabase_call_id} (agent has no default pathway or pathway inactive)")
-            
-    except Exception as pathway_error:
-        # Don't fail the call if pathway auto-start fails
-        logger.error(f"Failed to auto-start pathway for call {supabase_call_id}: {pathway_error}")
-
-    # --- Préparer les métadonnées pour LiveKit ---
-    metadata = {
-        "phoneNumber": request.phoneNumber,
-        "agent_id_requested": agent_id,
-        "agent_id": agent_id,
-        "system_prompt": system_prompt_from_config,
-        "ai_models": ai_models_metadata,
-        "agentName": agent_name_from_config,
-        "supabase_call_id": str(supabase_call_id), # Pass the new Supabase call ID
-        "initial_greeting": initial_greeting_from_config,
-        "sip_trunk_id": final_sip_trunk_id,
-        "agent_caller_id_number": agent_caller_id_number if agent_caller_id_number else None,
-        # PAM tier and advanced settings
-        "pam_tier": pam_tier,
-        "wait_for_greeting": wait_for_greeting,
-        "interruption_threshold": interruption_threshold,
-        "transfer_to": transfer_to,
-        "voicemail_detection": voicemail_detection,
-        "voicemail_hangup_immediately": voicemail_hangup_immediately,
-        "voicemail_message": voicemail_message,
-        # ✅ ADD JWT TOKEN FOR BACKEND API CALLS
-        "auth_token": xano_token,
-        "user_id": agent_config.get("user_id")
-    }
-    logger.info(f"Métadonnées finales envoyées au job LiveKit: {metadata}")
-    metadata_json = json.dumps(metadata)
-
-    # --- Créer le job LiveKit ---
-    command = [
-        "lk", "dispatch", "create",
-        "--new-room",
-        "--agent-name", "outbound-caller",
-        "--metadata", metadata_json
-    ]
-    try:
-        logger.info(f"Executing command: {' '.join(command)}")
-        process_env = os.environ.copy()
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False,
-            env=process_env
-        )
-        logger.info(f"lk dispatch command output: {result.stdout}")
-        logger.info(f"lk dispatch command stderr: {result.stderr}")
-        lk_room_name, lk_job_id = parse_lk_dispatch_output(result.stdout)
-        return {"message": f"Call for agent {agent_id} initiated successfully", "dispatch_details": result.stdout}
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to execute lk dispatch command for agent {agent_id}: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to initiate call: {e.stderr or e.stdout or 'Unknown error'}",
-        )
-    except FileNotFoundError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="'lk' command not found. Server configuration issue."
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An unexpected error occurred: {str(e)}",
-        )
-
-@app.patch("/calls/room/{room_name}/status")
-async def update_call_status_by_room(
-    room_name: str,
-    status_update: CallStatusUpdateRequest, # Contains supabase_call_id
-    x_agent_token: str | None = Header(None, alias="X-Agent-Token")
-):
-    # The CallStatusUpdateRequest model now uses supabase_call_id.
-    # The agent.py should send `supabase_call_id` field containing the Supabase call ID.
-    supabase_call_id_value = status_update.supabase_call_id
-    
-    logger.info(f"Requête de mise à jour de statut/info pour room {room_name} (Supabase Call ID: {supabase_call_id_value}) reçue avec payload: {status_update.dict()}")
-
-    EXPECTED_AGENT_TOKEN = os.getenv("AGENT_INTERNAL_TOKEN")
-    if not EXPECTED_AGENT_TOKEN:
-        logger.error("AGENT_INTERNAL_TOKEN n'est pas configuré côté serveur API. Authentification agent impossible.")
-        # Ne pas lever d'exception ici si on veut quand même traiter des appels locaux par exemple, mais logguer l'erreur.
-        # Pour des appels externes par l'agent, ce token est crucial.
-    elif not x_agent_token or x_agent_token != EXPECTED_AGENT_TOKEN:
-        logger.error(f"Token agent invalide ou manquant pour la mise à jour de statut de la room {room_name}.")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing agent token")
-    else:
-        logger.info(f"Token agent validé pour la room {room_name}.")
-
-    if not supabase_call_id_value: # Check if the Supabase ID is present
-        logger.error(f"Supabase Call ID (supabase_call_id) manquant dans la requête PATCH pour room {room_name}.")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Supabase Call ID (supabase_call_id in request body) is required.")
-
-    # Update Supabase 'calls' table
-    payload_to_supabase = {}
-    if status_update.new_status:
-        payload_to_supabase["status"] = status_update.new_status
-    if status_update.call_duration_seconds is not None:
-        payload_to_supabase["call_duration"] = status_update.call_duration_seconds
-    if status_update.telnyx_call_control_id is not None: # Assuming this is Telnyx's call_control_id
-        payload_to_supabase["call_control_id"] = status_update.telnyx_call_control_id
-    
-    # Add updated_at manually or ensure DB trigger handles it
-    payload_to_supabase["updated_at"] = datetime.utcnow().isoformat()
-
-
-    if not payload_to_supabase:
-        logger.info(f"Aucun champ à mettre à jour pour Supabase Call ID {supabase_call_id_value} (room {room_name}).")
-        return {"message": f"No fields to update for Supabase call ID {supabase_call_id_value}."}
-
-    logger.info(f"Envoi du payload PATCH à Supabase 'calls' table (ID: {supabase_call_id_value}): {payload_to_supabase}")
-
-    try:
-        # supabase_service_client should be imported from .db_client
-        update_response = supabase_service_client.table("calls").update(payload_to_supabase).eq("id", supabase_call_id_value).execute()
-        
-        if update_response.data and len(update_response.data) > 0:
-            logger.info(f"Infos pour Supabase Call ID {supabase_call_id_value} (room {room_name}) mises à jour dans Supabase: {update_response.data[0]}")
-            
-            # Update batch call item status if this is a batch campaign call
-            if status_update.new_status:
-                try:
-                    # Import here to avoid circular imports
-                    from api.batch_routes import update_batch_call_item_from_call_status
-                    
-                    await update_batch_call_item_from_call_status(
-                        supabase_call_id_value, 
-                        status_update.new_status, 
-                        status_update.call_duration_seconds
-                    )
-                except Exception as e:
-                    logger.error(f"Error updating batch call item for call {supabase_call_id_value}: {e}")
-                    # Don't fail the main call update if batch update fails
-            
-            return update_response.data[0]
-        elif update_response.error:
-            logger.error(f"Erreur Supabase lors de la mise à jour pour Call ID {supabase_call_id_value}: {update_response.error.message}")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Supabase PATCH error: {update_response.error.message}")
-        else:
-            # This case might occur if .eq("id", supabase_call_id_value) found no matching record.
-            logger.warning(f"Mise à jour Supabase pour Call ID {supabase_call_id_value} n'a retourné aucune donnée ni erreur. L'enregistrement existe-t-il ?")
-            # Check if the record exists. If not, it's a 404 situation.
-            try: # Add try-except for the check itself
-                check_exists = supabase_service_client.table("calls").select("id").eq("id", supabase_call_id_value).maybe_single().execute()
-                if not check_exists.data:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Call record with ID {supabase_call_id_value} not found in Supabase.")
-            except Exception as e_check:
-                 logger.error(f"Error checking existence of Supabase Call ID {supabase_call_id_value}: {e_check}", exc_info=True)
-                 # Reraise as 500, or handle as appropriate if check fails
-                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error verifying call record existence: {str(e_check)}")
-            return {"message": f"Update for Supabase Call ID {supabase_call_id_value} processed, but no data returned from Supabase (possibly no change or record not found and rechecked)."}
-
-    except Exception as e_generic:
-        logger.error(f"Erreur générique lors de la mise à jour Supabase pour Call ID {supabase_call_id_value}: {e_generic}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected Supabase error: {str(e_generic)}")
-
 # --- API Endpoints ---
 @app.post("/webhook/telnyx")
 async def telnyx_webhook(webhook: TelnyxWebhook):
     """
     Endpoint pour recevoir les webhooks de Telnyx.
-    Les webhooks contiennent des informations sur les événements d'appel.
+    Acknowledged right away; the event is processed by the telnyx_webhook_dispatcher workers.
     """
-    try:
-        logger.info(f"Webhook Telnyx reçu: Event: {webhook.data.get('event_type')}, Full Data: {webhook.data}")
-        
-        event_type = webhook.data.get("event_type")
-        payload = webhook.data.get("payload", {})
-        call_control_id = payload.get("call_control_id") 
-        
-        if not event_type:
-            logger.warning("Webhook Telnyx incomplet: event_type manquant.")
-            return {"status": "warning", "message": "Webhook incomplet: event_type manquant"}
-            
-        supabase_call_id_to_update = None
-        
-        # Tentative 1: Extraire supabase_call_id depuis client_state
-        client_state_base64 = payload.get("client_state")
-        if client_state_base64:
-            try:
-                client_state_bytes = client_state_base64.encode('utf-8')
-                decoded_client_state = base64.b64decode(client_state_bytes).decode('utf-8')
-                if decoded_client_state.isdigit():
-                    supabase_call_id_to_update = int(decoded_client_state)
-                    logger.info(f"Supabase Call ID '{supabase_call_id_to_update}' extrait de client_state.")
-                else:
-                    # Try to match if it's a UUID (string) directly
-                    try:
-                        uuid_obj = uuid.UUID(decoded_client_state, version=4) # Check if it's a valid UUID string
-                        supabase_call_id_to_update = str(uuid_obj) # Keep as string if it's a UUID
-                        logger.info(f"Supabase Call ID (UUID) '{supabase_call_id_to_update}' extrait de client_state.")
-                    except ValueError:
-                        logger.warning(f"client_state décodé ('{decoded_client_state}') ne semble pas être un ID Supabase valide (entier ou UUID). Ignoré.")
-            except Exception as e:
-                logger.error(f"Erreur de décodage client_state: {e}. client_state reçu: {client_state_base64}")
-        
-        update_data_for_supabase = {}
-        is_number_order_event = event_type.startswith("number.order.")
-
-        if is_number_order_event:
-            logger.info(f"Traitement Webhook: Événement de commande de numéro '{event_type}'.")
-            telnyx_number_id_from_payload = None
-            
-            # Extraire telnyx_number_id du payload spécifique aux commandes de numéro
-            if event_type == "number.order.phone_number.updated" or event_type == "number.order.completed":
-                 if "id" in payload and event_type == "number.order.phone_number.updated":
-                     telnyx_number_id_from_payload = payload.get("id")
-                 elif "phone_numbers" in payload and isinstance(payload["phone_numbers"], list) and payload["phone_numbers"]:
-                     telnyx_number_id_from_payload = payload["phone_numbers"][0].get("id")
-
-            if not telnyx_number_id_from_payload and "number_order_phone_number_id" in payload: 
-                telnyx_number_id_from_payload = payload.get("number_order_phone_number_id")
-            
-            if not telnyx_number_id_from_payload:
-                logger.warning(f"Webhook '{event_type}': Impossible d'extraire telnyx_number_id du payload: {payload}. Mise à jour Supabase impossible.")
-                return {"status": "warning", "message": f"Webhook {event_type} non traitable: telnyx_number_id manquant."}
-
-            logger.info(f"Webhook '{event_type}': Recherche dans Supabase table 'phone_numbers' par 'telnyx_number_id' = '{telnyx_number_id_from_payload}'.")
-            pn_response = supabase_service_client.table("phone_numbers").select("id, status, telnyx_connection_id").eq("telnyx_number_id", telnyx_number_id_from_payload).maybe_single().execute()
-
-            if pn_response.data:
-                supabase_phone_number_id = pn_response.data.get("id")
-                phone_number_update_payload = {}
-                new_status_from_webhook = payload.get("status")
-                if event_type == "number.order.phone_number.updated" and "status" in payload:
-                    new_status_from_webhook = payload.get("status")
-                elif event_type == "number.order.completed":
-                    new_status_from_webhook = "active"
-                    # For number.order.completed, also extract the actual phone number if available
-                    if "phone_numbers" in payload and isinstance(payload["phone_numbers"], list) and payload["phone_numbers"]:
-                        phone_number_e164_from_order = payload["phone_numbers"][0].get("phone_number")
-                        if phone_number_e164_from_order:
-                            phone_number_update_payload["phone_number_e164"] = phone_number_e164_from_order
-                            logger.info(f"Webhook 'number.order.completed': Extracted phone_number_e164 '{phone_number_e164_from_order}' for update.")
-
-                if new_status_from_webhook and new_status_from_webhook != pn_response.data.get("status"):
-                    phone_number_update_payload["status"] = new_status_from_webhook
-                
-                telnyx_connection_id_from_webhook = None
-                if "voice" in payload and payload["voice"] and "connection_id" in payload["voice"]:
-                     telnyx_connection_id_from_webhook = payload["voice"]["connection_id"]
-                elif "connection_id" in payload:
-                     telnyx_connection_id_from_webhook = payload.get("connection_id")
-
-                if telnyx_connection_id_from_webhook and telnyx_connection_id_from_webhook != pn_response.data.get("telnyx_connection_id"):
-                    phone_number_update_payload["telnyx_connection_id"] = telnyx_connection_id_from_webhook
-                
-                if phone_number_update_payload: # Only update if there are changes
-                    phone_number_update_payload["updated_at"] = datetime.utcnow().isoformat()
-                    logger.info(f"Webhook '{event_type}': Envoi PATCH à Supabase 'phone_numbers' ID {supabase_phone_number_id} avec données: {phone_number_update_payload}")
-                    update_pn_response = supabase_service_client.table("phone_numbers").update(phone_number_update_payload).eq("id", supabase_phone_number_id).execute()
-                    if update_pn_response.data:
-                        logger.info(f"Webhook '{event_type}': Enregistrement Supabase 'phone_numbers' ID {supabase_phone_number_id} mis à jour: {update_pn_response.data[0]}")
-                    elif update_pn_response.error:
-                         logger.error(f"Webhook '{event_type}': Erreur Supabase MAJ 'phone_numbers' ID {supabase_phone_number_id}: {update_pn_response.error.message}")
-                else:
-                    logger.info(f"Webhook '{event_type}': Pas de données nouvelles à mettre à jour pour Supabase 'phone_numbers' ID {supabase_phone_number_id}.")
-            else:
-                logger.warning(f"Webhook '{event_type}': Aucun enregistrement 'phone_numbers' trouvé pour telnyx_number_id '{telnyx_number_id_from_payload}'.")
-        
-            return {"status": "success", "message": f"Webhook number order event {event_type} traité."}
-        
-        # --- Logique pour les événements d'appel (non-commande de numéro) ---
-        if not call_control_id and event_type in ["call.initiated", "call.answered", "call.hangup"]:
-            logger.warning(f"Webhook '{event_type}' reçu sans call_control_id.")
-            if not supabase_call_id_to_update:
-                 logger.warning(f"Impossible de lier '{event_type}' à un appel Supabase sans call_control_id ou client_state valide.")
-                 return {"status": "warning", "message": f"Webhook {event_type} sans call_control_id et sans client_state valide."}
-        
-        if not supabase_call_id_to_update and call_control_id:
-            logger.info(f"Webhook '{event_type}': supabase_call_id non trouvé via client_state. Recherche dans Supabase 'calls' par 'call_control_id' = '{call_control_id}'.")
-            try:
-                call_record_response = supabase_service_client.table("calls").select("id").eq("call_control_id", call_control_id).maybe_single().execute()
-                if call_record_response.data:
-                    supabase_call_id_to_update = call_record_response.data.get("id")
-                    logger.info(f"Webhook '{event_type}': Supabase Call ID '{supabase_call_id_to_update}' trouvé par recherche sur call_control_id.")
-                else:
-                    logger.info(f"Webhook '{event_type}': Aucun enregistrement 'calls' existant trouvé dans Supabase avec 'call_control_id' = '{call_control_id}'.")
-                    # If call.initiated and not found by call_control_id, it might be a very new call.
-                    # The agent.py will send supabase_call_id in X-Client-State, which is preferred.
-                    # If that failed or this is a direct Telnyx originated call (e.g. inbound not via Pam agent), this lookup path is important.
-            except Exception as e_search_ccid:
-                logger.error(f"Webhook '{event_type}': Exception lors de la recherche Supabase 'calls' par call_control_id: {e_search_ccid}", exc_info=True)
-
-        if not supabase_call_id_to_update and event_type == "call.initiated":
-            direction = payload.get("direction")
-            if direction == "outbound":
-                to_phone_number = payload.get("to")
-                if to_phone_number:
-                    logger.info(f"Webhook 'call.initiated': supabase_call_id non identifié. Tentative de liaison par numéro '{to_phone_number}' et statut 'initiating'/'dialing'.")
-                    try:
-                        possible_calls_response = supabase_service_client.table("calls") \
-                            .select("id, created_at") \
-                            .eq("to_phone_number", to_phone_number) \
-                            .is_("call_control_id", None) \
-                            .in_("status", ["initiating", "dialing"]) \
-                            .order("created_at", desc=True) \
-                            .limit(1) \
-                            .execute()
-                        
-                        if possible_calls_response.data:
-                            call_to_link = possible_calls_response.data[0]
-                            supabase_call_id_to_update = call_to_link.get("id")
-                            logger.info(f"Webhook 'call.initiated': Liaison réussie. Supabase Call ID '{supabase_call_id_to_update}' choisi pour '{to_phone_number}'.")
-                        else:
-                            logger.warning(f"Webhook 'call.initiated': Aucun appel Supabase à lier trouvé pour '{to_phone_number}'.")
-                    except Exception as e_link_initiated:
-                        logger.error(f"Webhook 'call.initiated': Exception lors de la tentative de liaison: {e_link_initiated}", exc_info=True)
-                else:
-                    logger.warning(f"Webhook 'call.initiated': Numéro 'to' manquant dans payload pour liaison.")
-            else:
-                logger.info(f"Webhook 'call.initiated' reçu pour un appel non sortant (direction: {direction}). Ignoré car la gestion des appels entrants est supprimée.")
-
-        # Préparer les données à envoyer à Supabase pour les événements d'appel
-        # Add Telnyx call_session_id if available, maps to telnyx_call_session_id in Supabase
-        telnyx_call_session_id = payload.get("call_session_id")
-        if telnyx_call_session_id:
-            update_data_for_supabase["telnyx_call_session_id"] = telnyx_call_session_id
-
-        if call_control_id:
-             update_data_for_supabase["call_control_id"] = call_control_id
-
-        if event_type == "call.initiated":
-            logger.info(f"Traitement Webhook: Appel initié (Supabase ID: {supabase_call_id_to_update or 'Non lié'})")
-            update_data_for_supabase["initiated_at"] = webhook.data.get("occurred_at")
-            update_data_for_supabase["from_phone_number"] = payload.get("from")
-            # update_data_for_supabase["status"] = "dialing" # Optionnel
-            
-        elif event_type == "call.answered":
-            logger.info(f"Traitement Webhook: Appel répondu (Supabase ID: {supabase_call_id_to_update or 'Non lié'})")
-            update_data_for_supabase["answered_at"] = webhook.data.get("occurred_at")
-            update_data_for_supabase["status"] = "active"
-            
-        elif event_type == "call.hangup":
-            logger.info(f"Traitement Webhook: Appel terminé (Supabase ID: {supabase_call_id_to_update or 'Non lié'})")
-            update_data_for_supabase["ended_at"] = payload.get("end_time") 
-            update_data_for_supabase["ended_reason"] = payload.get("hangup_cause", "")
-            update_data_for_supabase["status"] = "completed"
-            start_time_str = payload.get("start_time")
-            end_time_str = payload.get("end_time")
-            if start_time_str and end_time_str:
-                try:
-                    start_dt = datetime.fromisoformat(start_time_str.replace("Z", "+00:00"))
-                    end_dt = datetime.fromisoformat(end_time_str.replace("Z", "+00:00"))
-                    call_duration_webhook = int((end_dt - start_dt).total_seconds())
-                    update_data_for_supabase["call_duration"] = call_duration_webhook
-                    logger.info(f"Webhook 'call.hangup': Durée calculée: {call_duration_webhook}s")
-                except Exception as e_dur:
-                    logger.error(f"Webhook 'call.hangup': Erreur calcul durée: {e_dur}")
-        
-        # Mettre à jour la table 'calls' dans Supabase (Partie commentée pour ce step)
-        if supabase_call_id_to_update:
-            update_data_for_supabase["updated_at"] = datetime.utcnow().isoformat()
-            if len(update_data_for_supabase) > 1: 
-                logger.info(f"Webhook '{event_type}': Données préparées pour Supabase 'calls' ID {supabase_call_id_to_update}: {update_data_for_supabase}")
-                try:
-                    final_update_response = supabase_service_client.table("calls").update(update_data_for_supabase).eq("id", supabase_call_id_to_update).execute()
-                    if final_update_response.data:
-                        logger.info(f"Webhook '{event_type}': Enregistrement Supabase 'calls' ID {supabase_call_id_to_update} mis à jour: {final_update_response.data[0]}")
-                    elif final_update_response.error:
-                        logger.error(f"Webhook '{event_type}': Erreur Supabase MAJ 'calls' ID {supabase_call_id_to_update}: {final_update_response.error.message}")
-                    # Consider case where update doesn't return data but also no error (e.g. record not found by eq)
-                    else:
-                        logger.warning(f"Webhook '{event_type}': Supabase update for 'calls' ID {supabase_call_id_to_update} returned no data and no error.")
-                except Exception as e_final_update:
-                    logger.error(f"Webhook '{event_type}': Erreur Supabase générique MAJ 'calls' ID {supabase_call_id_to_update}: {e_final_update}", exc_info=True)
-            else:
-                logger.info(f"Webhook '{event_type}': Pas de données nouvelles (autres que updated_at) à mettre à jour pour Supabase 'calls' ID {supabase_call_id_to_update}.")
-        else:
-            logger.warning(f"Webhook Appel '{event_type}': supabase_call_id non identifié. Aucune mise à jour Supabase 'calls'. Webhook Data: {webhook.data}")
-            
-        return {"status": "success", "message": f"Webhook {event_type} traité (préparation données appel)."}
-        
-    except Exception as e:
-        logger.error(f"Erreur globale lors du traitement du webhook Telnyx: {e}", exc_info=True)
-        return {"status": "internal_error_logged", "message": "Error processed internally"}, 200
+    event_type = webhook.data.get("event_type")
+    outcome = await telnyx_webhook_dispatcher.submit(webhook.data)
+    logger.info(f"Webhook Telnyx reçu: Event: {event_type}, id: {webhook.data.get('id')} ({outcome})")
+    return {"status": "success", "message": f"Webhook {event_type} {outcome}."}
 
 # Endpoint to create a user in public.users table (kept for direct public.users entries if needed)
 @app.post("/users", status_code=status.HTTP_201_CREATED)
@@ -1072,7 +444,7 @@ async def create_user_in_public_users(request: UserCreateRequest):
         user_payload["auth_user_id"] = request.auth_user_id
 
     try:
-        response = supabase_service_client.table("users").insert(user_payload).execute()
+        response = await supabase_async_client.table("users").insert(user_payload).execute()
         if response.data and len(response.data) > 0:
             created_user_data = response.data[0]
             logger.info(f"User created successfully in public.users: {created_user_data}")
@@ -1100,9 +472,9 @@ async def auth_login(request: UserLoginRequest):
     try:
         # Step 1: Authenticate with Supabase Auth using anon client
         # Use anon client for user authentication, not service client
-        auth_client = get_supabase_anon_client()
+        auth_client = await get_supabase_async_anon_client()
         
-        auth_response = auth_client.auth.sign_in_with_password({
+        auth_response = await auth_client.auth.sign_in_with_password({
             "email": request.email,
             "password": request.password,
         })
@@ -1119,7 +491,7 @@ async def auth_login(request: UserLoginRequest):
 
         # Step 2: Get user profile from public.users using service client
         try:
-            user_profile_response = supabase_service_client.table("users").select("*").eq("id", auth_user_id).single().execute()
+            user_profile_response = await supabase_async_client.table("users").select("*").eq("id", auth_user_id).single().execute()
             if not user_profile_response.data:
                 logger.warning(f"User {auth_user_id} authenticated but no profile found in public.users")
                 user_profile = {
@@ -1182,9 +554,9 @@ async def refresh_token(request: TokenRefreshRequest):
     logger.info("Received token refresh request")
     try:
         # Use anon client to refresh the session
-        auth_client = get_supabase_anon_client()
+        auth_client = await get_supabase_async_anon_client()
         
-        refresh_response = auth_client.auth.refresh_session({
+        refresh_response = await auth_client.auth.refresh_session({
             "refresh_token": request.refresh_token
         })
         
@@ -1198,7 +570,7 @@ async def refresh_token(request: TokenRefreshRequest):
         access_token = refresh_response.session.access_token
         
         # Get or create user profile
-        user_profile_response = supabase_service_client.table("user_profiles").select("*").eq("auth_user_id", auth_user_id).execute()
+        user_profile_response = await supabase_async_client.table("user_profiles").select("*").eq("auth_user_id", auth_user_id).execute()
         
         user_profile = None
         if user_profile_response.data and len(user_profile_response.data) > 0:
@@ -1239,20 +611,13 @@ async def get_current_user(authorization: str = Header(None, alias="Authorizatio
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase using service client
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        auth_user_id = user_response.user.id
+        # Verify token
+        auth_user_id = await get_user_id_from_token(authorization)
         
         # Get user profile from public.users using service client
         try:
-            user_profile_response = supabase_service_client.table("users").select("*").eq("id", auth_user_id).single().execute()
+            user_profile_response = await supabase_async_client.table("users").select("*").eq("id", auth_user_id).single().execute()
             if not user_profile_response.data:
                 # If no profile exists, create a basic one
                 user_profile = {
@@ -1281,8 +646,9 @@ async def get_current_user(authorization: str = Header(None, alias="Authorizatio
 async def auth_signup(request: UserSignupRequest):
     logger.info(f"Received signup request for email: {request.email}")
     try:
-        # Step 1: Sign up user with Supabase Auth
-        auth_response = supabase_service_client.auth.sign_up({
+        # Step 1: Sign up user with Supabase Auth using anon client, not service client
+        auth_client = await get_supabase_async_anon_client()
+        auth_response = await auth_client.auth.sign_up({
             "email": request.email,
             "password": request.password,
         })
@@ -1309,12 +675,12 @@ async def auth_signup(request: UserSignupRequest):
         }
         
         logger.info(f"Attempting to create profile in public.users: {public_user_profile_payload}")
-        profile_response = supabase_service_client.table("users").insert(public_user_profile_payload).execute()
+        profile_response = await supabase_async_client.table("users").insert(public_user_profile_payload).execute()
 
         if not (profile_response.data and len(profile_response.data) > 0):
             logger.error(f"Auth signup for {request.email} (Auth User ID: {auth_user_id}) succeeded, but failed to create profile in public.users. Supabase profile insertion error: {profile_response.error}. Cleaning up auth user.")
             try:
-                delete_auth_user_response = supabase_service_client.auth.admin.delete_user(auth_user_id)
+                delete_auth_user_response = await supabase_async_client.auth.admin.delete_user(auth_user_id)
                 logger.info(f"Cleaned up auth.users entry for {auth_user_id} due to public.users profile creation failure. Response: {delete_auth_user_response}")
             except Exception as cleanup_e:
                 logger.error(f"Failed to cleanup auth.users entry {auth_user_id} after public.users profile failure: {cleanup_e}")
@@ -1412,16 +778,9 @@ async def create_agent(request: AgentCreateRequest, authorization: str = Header(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase and get user_id
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Received request to create agent: {request.name} for user {user_id}")
 
         agent_payload = {
@@ -1457,7 +816,7 @@ async def create_agent(request: AgentCreateRequest, authorization: str = Header(
         if request.sip_trunk_id:
             agent_payload["sip_trunk_id"] = request.sip_trunk_id
 
-        response = supabase_service_client.table("agents").insert(agent_payload).execute()
+        response = await supabase_async_client.table("agents").insert(agent_payload).execute()
         if response.data and len(response.data) > 0:
             created_agent = response.data[0]
             logger.info(f"Agent created successfully: {created_agent}")
@@ -1496,10 +855,10 @@ async def get_agents(authorization: str = Header(None, alias="Authorization")):
     Get a list of all agents for the authenticated user, including their phone numbers.
     """
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Fetching agents for user_id: {user_id}")
 
-        response = supabase_service_client.table("agents").select(
+        response = await supabase_async_client.table("agents").select(
              """
             *,
             phone_numbers!agents_phone_numbers_id_fkey!left (
@@ -1541,47 +900,96 @@ async def get_agents(authorization: str = Header(None, alias="Authorization")):
         logger.error(f"Error fetching agents: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching agents.")
 
+# Columns returned by GET /calls by default; transcripts and metadata need include_details=true
+CALLS_LIST_COLUMNS = (
+    "id, created_at, user_id, agent_id, status, from_phone_number, to_phone_number, "
+    "room_name, livekit_outbound_trunk_id, call_duration, initiated_at, answered_at, "
+    "ended_at, ended_reason, call_control_id, batch_campaign_id, agents(name)"
+)
+CALLS_PAGE_SIZE_DEFAULT = int(os.getenv("CALLS_PAGE_SIZE_DEFAULT", "50"))
+CALLS_PAGE_SIZE_MAX = int(os.getenv("CALLS_PAGE_SIZE_MAX", "200"))
+
+def _encode_calls_cursor(call: Dict[str, Any]) -> str:
+    raw = json.dumps([call["created_at"], call["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_calls_cursor(cursor: str) -> tuple:
+    """Inverse of _encode_calls_cursor; the values end up in a PostgREST filter so both are validated"""
+    try:
+        created_at, call_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+        if not str(call_id).replace("-", "").isalnum():
+            raise ValueError(call_id)
+        return created_at, call_id
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
 @app.get("/calls")
-async def get_calls(authorization: str = Header(None, alias="Authorization")):
-    """Get all calls for the authenticated user"""
+async def get_calls(
+    response: Response,
+    authorization: str = Header(None, alias="Authorization"),
+    limit: int = CALLS_PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = None,
+    agent_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    include_details: bool = False
+):
+    """Get one page of the authenticated user's calls, most recent first.
+
+    Pages are keyset-paginated on (created_at, id): pass the X-Next-Cursor response
+    header back as ``cursor`` to get the next page; the header is absent on the last page.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
+    limit = max(1, min(limit, CALLS_PAGE_SIZE_MAX))
+    page_cursor = _decode_calls_cursor(cursor) if cursor else None
     
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
-        logger.info(f"Fetching calls for user: {user_id}")
-        
-        # Get all calls for this user, ordered by created_at desc (most recent first)
-        calls_response = supabase_service_client.table("calls").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        
-        if not calls_response.data:
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
+        logger.info(f"Fetching calls for user: {user_id} (limit={limit}, cursor={'yes' if cursor else 'no'})")
+        
+        query = supabase_async_client.table("calls").select("*, agents(name)" if include_details else CALLS_LIST_COLUMNS).eq("user_id", user_id)
+        if status_filter:
+            query = query.eq("status", status_filter)
+        if agent_id is not None:
+            query = query.eq("agent_id", agent_id)
+        if start_date:
+            query = query.gte("created_at", start_date)
+        if end_date:
+            query = query.lte("created_at", end_date)
+        
+        # One extra row tells whether another page is left, without a second query
+        calls_response = await apply_keyset_cursor(query, page_cursor).limit(limit + 1).execute()
+        calls = calls_response.data or []
+        
+        if len(calls) > limit:
+            calls = calls[:limit]
+            response.headers["X-Next-Cursor"] = _encode_calls_cursor(calls[-1])
+        
+        if not calls:
             logger.info(f"No calls found for user {user_id}")
             return []
         
-        calls = calls_response.data
         logger.info(f"Found {len(calls)} calls for user {user_id}")
         
         # Process calls to match frontend expectations
         processed_calls = []
         for call in calls:
+            agent = call.pop("agents", None) or {}
             processed_call = {
                 "id": call.get("id"),
                 "created_at": call.get("created_at", ""),
                 "agent_id": call.get("agent_id"),
-                "agent_name": call.get("agent_name", f"Agent {call.get('agent_id')}" if call.get("agent_id") else "Unknown Agent"),
+                "agent_name": call.get("agent_name") or agent.get("name") or (f"Agent {call.get('agent_id')}" if call.get("agent_id") else "Unknown Agent"),
                 "user_id": call.get("user_id"),
                 "from_phone_number": call.get("from_phone_number", ""),
                 "to_phone_number": call.get("to_phone_number", ""),
                 "status": call.get("status", "unknown"),
-                "livekit_room_name": call.get("livekit_room_name", ""),
+                "livekit_room_name": call.get("livekit_room_name") or call.get("room_name", ""),
                 "livekit_outbound_trunk_id": call.get("livekit_outbound_trunk_id", ""),
                 "call_duration": call.get("call_duration"),  # Duration in seconds
                 "initiated_at": call.get("initiated_at"),
@@ -1592,10 +1000,14 @@ async def get_calls(authorization: str = Header(None, alias="Authorization")):
                 "call_control_id": call.get("call_control_id"),
                 "livekit_participant_identity": call.get("livekit_participant_identity")
             }
+            if include_details:
+                processed_call = {**call, **processed_call}
             processed_calls.append(processed_call)
         
         return processed_calls
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching calls: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch calls")
@@ -1606,20 +1018,13 @@ async def get_phone_numbers(authorization: str = Header(None, alias="Authorizati
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Fetching phone numbers for user: {user_id}")
         
         # Get all phone numbers for this user, ordered by created_at desc (most recent first)
-        phone_numbers_response = supabase_service_client.table("phone_numbers").select("*").eq("users_id", user_id).order("created_at", desc=True).execute()
+        phone_numbers_response = await supabase_async_client.table("phone_numbers").select("*").eq("users_id", user_id).order("created_at", desc=True).execute()
         
         if not phone_numbers_response.data:
             logger.info(f"No phone numbers found for user {user_id}")
@@ -1664,20 +1069,13 @@ async def get_user_settings(authorization: str = Header(None, alias="Authorizati
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Fetching settings for user: {user_id}")
         
         # Get user profile from public.users with settings
-        user_profile_response = supabase_service_client.table("users").select("*").eq("id", user_id).single().execute()
+        user_profile_response = await supabase_async_client.table("users").select("*").eq("id", user_id).single().execute()
         
         if not user_profile_response.data:
             # If no profile exists, return default settings
@@ -1735,16 +1133,9 @@ async def update_user_settings(request: UserSettingsUpdateRequest, authorization
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Updating settings for user: {user_id}")
         
         # Build update payload with only provided fields
@@ -1767,7 +1158,7 @@ async def update_user_settings(request: UserSettingsUpdateRequest, authorization
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update")
         
         # Check if user profile exists, if not create it
-        user_check = supabase_service_client.table("users").select("id").eq("id", user_id).maybe_single().execute()
+        user_check = await supabase_async_client.table("users").select("id").eq("id", user_id).maybe_single().execute()
         
         if not user_check.data:
             # Create user profile if it doesn't exist
@@ -1778,7 +1169,7 @@ async def update_user_settings(request: UserSettingsUpdateRequest, authorization
             }
             create_payload.update(update_payload)
             
-            create_response = supabase_service_client.table("users").insert(create_payload).execute()
+            create_response = await supabase_async_client.table("users").insert(create_payload).execute()
             if not create_response.data:
                 logger.error(f"Failed to create user profile for {user_id}. Response: {create_response.error or 'No data returned'}")
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create user profile")
@@ -1786,7 +1177,7 @@ async def update_user_settings(request: UserSettingsUpdateRequest, authorization
             updated_user = create_response.data[0]
         else:
             # Update existing user profile
-            update_response = supabase_service_client.table("users").update(update_payload).eq("id", user_id).execute()
+            update_response = await supabase_async_client.table("users").update(update_payload).eq("id", user_id).execute()
             
             if not update_response.data:
                 logger.error(f"Failed to update user settings for {user_id}. Response: {update_response.error or 'No data returned'}")
@@ -1822,15 +1213,15 @@ async def update_user_settings(request: UserSettingsUpdateRequest, authorization
 async def delete_agent(agent_id: int, authorization: str = Header(None, alias="Authorization")):
     """Delete an agent"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify the agent belongs to the user before deleting
-        agent_response = supabase_service_client.table("agents").select("id").eq("id", agent_id).eq("user_id", user_id).single().execute()
+        agent_response = await supabase_async_client.table("agents").select("id").eq("id", agent_id).eq("user_id", user_id).single().execute()
         if not agent_response.data:
             raise HTTPException(status_code=404, detail="Agent not found or access denied")
             
         # Perform deletion
-        delete_response = supabase_service_client.table("agents").delete().eq("id", agent_id).execute()
+        delete_response = await supabase_async_client.table("agents").delete().eq("id", agent_id).execute()
         
         if not delete_response.data:
             raise HTTPException(status_code=500, detail="Failed to delete agent")
@@ -1851,11 +1242,11 @@ async def get_agent(agent_id: int, authorization: str = Header(None, alias="Auth
     This function now uses a two-step fetch to avoid ambiguous join issues.
     """
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Step 1: Fetching agent {agent_id} for user {user_id}")
 
         # Step 1: Fetch the core agent data without any joins
-        agent_response = supabase_service_client.table("agents").select("*") \
+        agent_response = await supabase_async_client.table("agents").select("*") \
             .eq("id", agent_id).eq("user_id", user_id).single().execute()
 
         if not agent_response.data:
@@ -1871,7 +1262,7 @@ async def get_agent(agent_id: int, authorization: str = Header(None, alias="Auth
         if phone_numbers_id:
             logger.info(f"Step 2: Agent {agent_id} has linked phone_numbers_id {phone_numbers_id}. Fetching details.")
             try:
-                phone_response = supabase_service_client.table("phone_numbers").select("*") \
+                phone_response = await supabase_async_client.table("phone_numbers").select("*") \
                     .eq("id", phone_numbers_id).single().execute()
                 
                 if phone_response.data:
@@ -1925,20 +1316,13 @@ async def update_agent(agent_id: int, request: AgentUpdateRequest, authorization
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Updating agent {agent_id} for user: {user_id}")
         
         # First, check if the agent exists and belongs to this user
-        agent_check = supabase_service_client.table("agents").select("id, name, user_id").eq("id", agent_id).eq("user_id", user_id).single().execute()
+        agent_check = await supabase_async_client.table("agents").select("id, name, user_id").eq("id", agent_id).eq("user_id", user_id).single().execute()
         
         if not agent_check.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Agent with ID {agent_id} not found or you don't have permission to update it")
@@ -1953,7 +1337,7 @@ async def update_agent(agent_id: int, request: AgentUpdateRequest, authorization
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update")
         
         # Update the agent
-        update_response = supabase_service_client.table("agents").update(update_payload).eq("id", agent_id).eq("user_id", user_id).execute()
+        update_response = await supabase_async_client.table("agents").update(update_payload).eq("id", agent_id).eq("user_id", user_id).execute()
         
         if not update_response.data:
             logger.error(f"Failed to update agent {agent_id}. Response: {update_response.error or 'No data returned'}")
@@ -2013,51 +1397,25 @@ async def get_dashboard_stats(authorization: str = Header(None, alias="Authoriza
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase Auth using anon client
-        anon_client = get_supabase_anon_client()
-        user_response = anon_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"Dashboard stats requested by user: {user_id}")
         
-        # Get user's agents count with error handling
-        try:
-            agents_response = supabase_service_client.table("agents").select("id", count="exact").eq("user_id", user_id).execute()
-            total_agents = agents_response.count if agents_response.count is not None else 0
-        except Exception as e:
-            logger.error(f"Error fetching agents count: {e}")
-            total_agents = 0
-        
-        # Get active agents count with error handling
-        try:
-            active_agents_response = supabase_service_client.table("agents").select("id", count="exact").eq("user_id", user_id).eq("status", "active").execute()
-            active_agents = active_agents_response.count if active_agents_response.count is not None else 0
-        except Exception as e:
-            logger.error(f"Error fetching active agents count: {e}")
-            active_agents = 0
-        
-        # Get total calls count for user with error handling
+        # All the counters in a single round trip (see supabase/migrations/*_dashboard_stats.sql)
+        thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
         try:
-            calls_response = supabase_service_client.table("calls").select("id", count="exact").eq("user_id", user_id).execute()
-            total_calls = calls_response.count if calls_response.count is not None else 0
+            stats_response = await supabase_async_client.rpc(
+                "get_dashboard_stats", {"p_user_id": user_id, "p_since": thirty_days_ago}
+            ).execute()
+            counters = stats_response.data or {}
         except Exception as e:
-            logger.error(f"Error fetching calls count: {e}")
-            total_calls = 0
+            logger.error(f"Error fetching dashboard counters: {e}")
+            counters = {}
         
-        # Get calls from last 30 days to calculate change with error handling
-        try:
-            thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
-            recent_calls_response = supabase_service_client.table("calls").select("id", count="exact").eq("user_id", user_id).gte("created_at", thirty_days_ago).execute()
-            recent_calls = recent_calls_response.count if recent_calls_response.count is not None else 0
-        except Exception as e:
-            logger.error(f"Error fetching recent calls count: {e}")
-            recent_calls = 0
+        total_agents = counters.get("total_agents") or 0
+        active_agents = counters.get("active_agents") or 0
+        total_calls = counters.get("total_calls") or 0
+        recent_calls = counters.get("recent_calls") or 0
         
         # Calculate calls change percentage (simplified)
         calls_change_percentage = 0
@@ -2112,7 +1470,7 @@ async def create_test_agent():
     }
     
     try:
-        result = supabase_service_client.table("agents").insert(test_agent_data).execute()
+        result = await supabase_async_client.table("agents").insert(test_agent_data).execute()
         logger.info(f"Test agent created successfully: {result.data}")
         return {"success": True, "agent": result.data[0] if result.data else None}
     except Exception as e:
@@ -2181,7 +1539,7 @@ async def get_voices(
     """Get all voices with optional filtering"""
     try:
         # Build query
-        query = supabase_service_client.table("voices").select("*")
+        query = supabase_async_client.table("voices").select("*")
         
         # Apply filters
         if language_code:
@@ -2194,7 +1552,7 @@ async def get_voices(
             query = query.eq("provider", provider)
         
         # Execute query with ordering
-        response = query.order("language_code, name").execute()
+        response = await query.order("language_code, name").execute()
         
         if not response.data:
             return []
@@ -2233,19 +1591,12 @@ async def create_voice(request: VoiceCreateRequest, authorization: str = Header(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         
         # Check if voice with same cartesia_voice_id already exists
-        existing_voice = supabase_service_client.table("voices").select("cartesia_voice_id").eq("cartesia_voice_id", request.cartesia_voice_id).execute()
+        existing_voice = await supabase_async_client.table("voices").select("cartesia_voice_id").eq("cartesia_voice_id", request.cartesia_voice_id).execute()
         
         if existing_voice.data:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Voice with Cartesia ID {request.cartesia_voice_id} already exists")
@@ -2256,7 +1607,7 @@ async def create_voice(request: VoiceCreateRequest, authorization: str = Header(
         voice_payload["updated_by"] = user_id
         
         # Insert voice
-        response = supabase_service_client.table("voices").insert(voice_payload).execute()
+        response = await supabase_async_client.table("voices").insert(voice_payload).execute()
         
         if not response.data:
             logger.error(f"Failed to create voice. Response: {response.error}")
@@ -2293,7 +1644,7 @@ async def create_voice(request: VoiceCreateRequest, authorization: str = Header(
 async def get_voice(voice_id: str):
     """Get a specific voice by ID"""
     try:
-        response = supabase_service_client.table("voices").select("*").eq("id", voice_id).single().execute()
+        response = await supabase_async_client.table("voices").select("*").eq("id", voice_id).single().execute()
         
         if not response.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Voice not found")
@@ -2329,19 +1680,12 @@ async def update_voice(voice_id: str, request: VoiceUpdateRequest, authorization
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         
         # Check if voice exists
-        existing_voice = supabase_service_client.table("voices").select("*").eq("id", voice_id).single().execute()
+        existing_voice = await supabase_async_client.table("voices").select("*").eq("id", voice_id).single().execute()
         
         if not existing_voice.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Voice not found")
@@ -2358,7 +1702,7 @@ async def update_voice(voice_id: str, request: VoiceUpdateRequest, authorization
         update_payload["updated_by"] = user_id
         
         # Update voice
-        response = supabase_service_client.table("voices").update(update_payload).eq("id", voice_id).execute()
+        response = await supabase_async_client.table("voices").update(update_payload).eq("id", voice_id).execute()
         
         if not response.data:
             logger.error(f"Failed to update voice {voice_id}")
@@ -2400,18 +1744,11 @@ async def delete_voice(voice_id: str, authorization: str = Header(None, alias="A
         if not authorization or not authorization.startswith("Bearer "):
             raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
         
-        token = authorization.replace("Bearer ", "")
-        
-        # Verify token with Supabase
-        user_response = supabase_service_client.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        # Verify token
+        user_id = await get_user_id_from_token(authorization)
         
         # Delete the voice from Supabase
-        response = supabase_service_client.table("voices").delete().eq("id", voice_id).execute()
+        response = await supabase_async_client.table("voices").delete().eq("id", voice_id).execute()
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Voice not found")
@@ -2432,13 +1769,13 @@ async def get_voice_preview(voice_id: str):
     """
     try:
         # Get voice from database with all relevant fields
-        voice_response = supabase_service_client.table("voices").select(
+        voice_response = await supabase_async_client.table("voices").select(
             "id, cartesia_voice_id, name, language_code, provider, provider_model"
         ).eq("id", voice_id).execute()
         
         if not voice_response.data:
             # If not found by id, try by cartesia_voice_id (backward compatibility)
-            voice_response = supabase_service_client.table("voices").select(
+            voice_response = await supabase_async_client.table("voices").select(
                 "id, cartesia_voice_id, name, language_code, provider, provider_model"
             ).eq("cartesia_voice_id", voice_id).execute()
         
@@ -2478,11 +1815,27 @@ async def get_voice_preview(voice_id: str):
         
         # Route to appropriate provider
         if provider == "elevenlabs":
-            return await generate_elevenlabs_preview(voice_data, sample_text, voice_name)
+            synthesize = lambda: generate_elevenlabs_preview(voice_data, sample_text, voice_name)
         elif provider == "cartesia":
-            return await generate_cartesia_preview(voice_data, sample_text, voice_name, language_code)
+            synthesize = lambda: generate_cartesia_preview(voice_data, sample_text, voice_name, language_code)
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported voice provider: {provider}")
+        
+        # Same provider/voice/model/language/text always yields the same sample, so synthesize it once
+        cache_key = voice_preview_cache_key(
+            provider, voice_data.get("cartesia_voice_id"), voice_data.get("provider_model"), language_code, sample_text
+        )
+        audio_content = await voice_preview_cache.get_or_create(cache_key, synthesize)
+        
+        return Response(
+            content=audio_content,
+            media_type="audio/mpeg",
+            headers={
+                "Content-Type": "audio/mpeg",
+                "Cache-Control": "public, max-age=1800",  # Cache for 30 minutes
+                "Content-Disposition": f'inline; filename="{voice_name}_preview.mp3"'
+            }
+        )
             
     except HTTPException:
         raise
@@ -2491,8 +1844,8 @@ async def get_voice_preview(voice_id: str):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate voice preview")
 
 
-async def generate_cartesia_preview(voice_data: dict, sample_text: str, voice_name: str, language_code: str):
-    """Generate voice preview using Cartesia API"""
+async def generate_cartesia_preview(voice_data: dict, sample_text: str, voice_name: str, language_code: str) -> bytes:
+    """Synthesize voice preview audio (mp3 bytes) using Cartesia API"""
     cartesia_voice_id = voice_data.get("cartesia_voice_id")
     if not cartesia_voice_id:
         raise HTTPException(status_code=404, detail="Cartesia voice ID not available for this voice")
@@ -2535,20 +1888,11 @@ async def generate_cartesia_preview(voice_data: dict, sample_text: str, voice_na
             logger.error(f"Cartesia TTS API error for voice {voice_name}: {response.status_code} - {response.text}")
             raise HTTPException(status_code=response.status_code, detail=f"Failed to generate voice preview: {response.text}")
         
-        # Return the audio content with proper headers
-        return Response(
-            content=response.content,
-            media_type="audio/mpeg",
-            headers={
-                "Content-Type": "audio/mpeg",
-                "Cache-Control": "public, max-age=1800",  # Cache for 30 minutes
-                "Content-Disposition": f'inline; filename="{voice_name}_preview.mp3"'
-            }
-        )
+        return response.content
 
 
-async def generate_elevenlabs_preview(voice_data: dict, sample_text: str, voice_name: str):
-    """Generate voice preview using ElevenLabs API"""
+async def generate_elevenlabs_preview(voice_data: dict, sample_text: str, voice_name: str) -> bytes:
+    """Synthesize voice preview audio (mp3 bytes) using ElevenLabs API"""
     elevenlabs_voice_id = voice_data.get("cartesia_voice_id")  # We'll use this field for ElevenLabs voice ID too
     if not elevenlabs_voice_id:
         raise HTTPException(status_code=404, detail="ElevenLabs voice ID not available for this voice")
@@ -2590,16 +1934,7 @@ async def generate_elevenlabs_preview(voice_data: dict, sample_text: str, voice_
             logger.error(f"ElevenLabs TTS API error for voice {voice_name}: {response.status_code} - {response.text}")
             raise HTTPException(status_code=response.status_code, detail=f"Failed to generate voice preview: {response.text}")
         
-        # Return the audio content with proper headers
-        return Response(
-            content=response.content,
-            media_type="audio/mpeg",
-            headers={
-                "Content-Type": "audio/mpeg",
-                "Cache-Control": "public, max-age=1800",  # Cache for 30 minutes
-                "Content-Disposition": f'inline; filename="{voice_name}_preview.mp3"'
-            }
-        )
+        return response.content
 
 @app.post("/fix-database")
 async def fix_database_columns():
@@ -2611,10 +1946,10 @@ async def fix_database_columns():
         logger.info("Attempting to refresh Supabase schema cache...")
         
         # This will force PostgREST to reload the schema
-        response = supabase_service_client.rpc('refresh_schema_cache').execute()
+        response = await supabase_async_client.rpc('refresh_schema_cache').execute()
         
         # If that doesn't work, try a simple query to force cache refresh
-        test_response = supabase_service_client.table("agents").select("*").limit(1).execute()
+        test_response = await supabase_async_client.table("agents").select("*").limit(1).execute()
         
         logger.info("Schema cache refresh successful")
         return {"message": "Database schema cache refreshed successfully"}
@@ -2628,7 +1963,7 @@ async def fix_database_columns():
             logger.info("Attempting alternative schema refresh method...")
             
             # This should force PostgREST to re-examine the table structure
-            supabase_service_client.table("agents").select("*").limit(0).execute()
+            await supabase_async_client.table("agents").select("*").limit(0).execute()
             
             return {"message": "Schema cache refreshed using alternative method"}
         except Exception as e2:
@@ -2640,7 +1975,7 @@ async def test_schema_check():
     """Test endpoint to verify schema cache is working"""
     try:
         # Try to query the agents table with the problematic column
-        response = supabase_service_client.table("agents").select("id, name, interruption_threshold, pam_tier").limit(1).execute()
+        response = await supabase_async_client.table("agents").select("id, name, interruption_threshold, pam_tier").limit(1).execute()
         
         return {
             "status": "success",
@@ -2658,7 +1993,7 @@ async def test_db_connection():
     """Test endpoint to verify database connection"""
     try:
         # Test basic connection
-        response = supabase_service_client.table("users").select("id").limit(1).execute()
+        response = await supabase_async_client.table("users").select("id").limit(1).execute()
         
         return {
             "status": "success",
@@ -2698,10 +2033,10 @@ async def debug_dashboard_stats(authorization: str = Header(None, alias="Authori
         
         # Try to get user with anon client
         try:
-            anon_client = get_supabase_anon_client()
+            anon_client = await get_supabase_async_anon_client()
             debug_info["step"] = "anon_client_created"
             
-            user_response = anon_client.auth.get_user(token)
+            user_response = await anon_client.auth.get_user(token)
             debug_info["step"] = "user_fetched"
             debug_info["user_id"] = user_response.user.id if user_response.user else None
             
@@ -2716,7 +2051,7 @@ async def debug_dashboard_stats(authorization: str = Header(None, alias="Authori
             
             # Test agents table
             try:
-                agents_response = supabase_service_client.table("agents").select("id", count="exact").eq("user_id", user_id).execute()
+                agents_response = await supabase_async_client.table("agents").select("id", count="exact").eq("user_id", user_id).execute()
                 debug_info["agents_query"] = "success"
                 debug_info["total_agents"] = agents_response.count if agents_response.count is not None else 0
             except Exception as e:
@@ -2725,7 +2060,7 @@ async def debug_dashboard_stats(authorization: str = Header(None, alias="Authori
             
             # Test calls table
             try:
-                calls_response = supabase_service_client.table("calls").select("id", count="exact").eq("user_id", user_id).execute()
+                calls_response = await supabase_async_client.table("calls").select("id", count="exact").eq("user_id", user_id).execute()
                 debug_info["calls_query"] = "success"
                 debug_info["total_calls"] = calls_response.count if calls_response.count is not None else 0
             except Exception as e:
@@ -2745,9 +2080,6 @@ async def debug_dashboard_stats(authorization: str = Header(None, alias="Authori
         debug_info["step"] = "unexpected_failure"
         return {"debug": debug_info, "success": False}
 
-# Import batch routes functions
-from api.batch_routes import update_batch_call_item_from_call_status
-
 # Global Analytics endpoint
 @app.get("/analytics/global")
 async def get_global_analytics(
@@ -2762,15 +2094,9 @@ async def get_global_analytics(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Calculate date range
         end_date_dt = datetime.now(timezone.utc)
@@ -2785,102 +2111,59 @@ async def get_global_analytics(
         period_length = end_date_dt - start_date_dt
         previous_start = start_date_dt - period_length
         
-        # Build base query filters
-        base_filters = [f"user_id=eq.{user_id}"]
-        base_filters.append(f"created_at=gte.{start_date_dt.isoformat()}")
-        base_filters.append(f"created_at=lte.{end_date_dt.isoformat()}")
-        
-        if campaign_id:
-            base_filters.append(f"batch_campaign_id=eq.{campaign_id}")
-        if agent_id:
-            base_filters.append(f"agent_id=eq.{agent_id}")
-        
-        # Get calls data with enhanced fields
-        calls_query = "&".join(base_filters)
-        calls_response = supabase_service_client.table("calls").select(
-            "id, status, call_duration, phone_number_e164, created_at, initiated_at, answered_at, ended_at, agent_id, batch_campaign_id"
-        ).eq("user_id", user_id).gte("created_at", start_date_dt.isoformat()).lte("created_at", end_date_dt.isoformat())
-        
-        if campaign_id:
-            calls_response = calls_response.eq("batch_campaign_id", campaign_id)
-        if agent_id:
-            calls_response = calls_response.eq("agent_id", agent_id)
-            
-        calls_response = calls_response.execute()
-        calls_data = calls_response.data or []
-        
-        # Get agents data
-        agents_response = supabase_service_client.table("agents").select(
-            "id, name, status"
-        ).eq("user_id", user_id).execute()
+        # Aggregates come from the hourly buckets of call_hourly_rollups (kept up to date by a trigger),
+        # grouped by agent, region and day: the cost depends on the number of buckets, not of calls
+        start_hour = start_date_dt.replace(minute=0, second=0, microsecond=0)
+        previous_start_hour = previous_start.replace(minute=0, second=0, microsecond=0)
+        current_rollups_response, previous_rollups_response, agents_response, campaigns_response = await asyncio.gather(
+            supabase_async_client.rpc("get_call_rollup_analytics", {
+                "p_user_id": user_id,
+                "p_start": start_hour.isoformat(),
+                "p_end": end_date_dt.isoformat(),
+                "p_campaign_id": campaign_id,
+                "p_agent_id": agent_id,
+            }).execute(),
+            # Previous period is compared without campaign/agent filters
+            supabase_async_client.rpc("get_call_rollup_analytics", {
+                "p_user_id": user_id,
+                "p_start": previous_start_hour.isoformat(),
+                "p_end": start_hour.isoformat(),
+            }).execute(),
+            supabase_async_client.table("agents").select("id, name, status").eq("user_id", user_id).execute(),
+            supabase_async_client.table("batch_campaigns").select(
+                "id, name, status, total_numbers, completed_calls, successful_calls, failed_calls, created_at"
+            ).eq("user_id", user_id).execute(),
+        )
+        rollups = current_rollups_response.data or []
+        previous_rollups = previous_rollups_response.data or []
         agents_data = agents_response.data or []
-        
-        # Get campaigns data with enhanced metrics
-        campaigns_response = supabase_service_client.table("batch_campaigns").select(
-            "id, name, status, total_numbers, completed_calls, successful_calls, failed_calls, created_at"
-        ).eq("user_id", user_id).execute()
         campaigns_data = campaigns_response.data or []
         
-        # Get previous period calls for comparison
-        previous_calls_response = supabase_service_client.table("calls").select(
-            "id, status, call_duration"
-        ).eq("user_id", user_id).gte("created_at", previous_start.isoformat()).lte("created_at", start_date_dt.isoformat()).execute()
-        previous_calls_data = previous_calls_response.data or []
-        
         # ===== PHASE 1 ENHANCEMENTS =====
         
-        # 1. Geographic Performance Analysis
+        # 1. Geographic Performance Analysis (region computed by public.call_region)
         geographic_data = {}
-        for call in calls_data:
-            phone_number = call.get("phone_number_e164", "") or ""
-            
-            # Enhanced geographic detection
-            if phone_number.startswith("+1"):
-                # US/Canada - extract area code for more granular analysis
-                if len(phone_number) >= 5:
-                    area_code = phone_number[2:5]
-                    # Map some major area codes to cities/regions
-                    area_code_map = {
-                        "212": "New York, NY", "213": "Los Angeles, CA", "312": "Chicago, IL",
-                        "415": "San Francisco, CA", "617": "Boston, MA", "702": "Las Vegas, NV",
-                        "305": "Miami, FL", "206": "Seattle, WA", "713": "Houston, TX",
-                        "404": "Atlanta, GA", "214": "Dallas, TX", "602": "Phoenix, AZ"
-                    }
-                    region = area_code_map.get(area_code, f"US/CA ({area_code})")
-                else:
-                    region = "US/CA"
-            elif phone_number.startswith("+33"):
-                region = "France"
-            elif phone_number.startswith("+44"):
-                region = "United Kingdom"
-            elif phone_number.startswith("+49"):
-                region = "Germany"
-            elif phone_number.startswith("+34"):
-                region = "Spain"
-            elif phone_number.startswith("+39"):
-                region = "Italy"
-            elif phone_number.startswith("+61"):
-                region = "Australia"
-            elif phone_number.startswith("+81"):
-                region = "Japan"
-            else:
-                region = "Other"
-            
-            if region not in geographic_data:
-                geographic_data[region] = {
-                    "total_calls": 0,
-                    "successful_calls": 0,
-                    "total_duration": 0,
-                    "avg_duration": 0
-                }
-            
-            geographic_data[region]["total_calls"] += 1
+        calls_by_agent = {}
+        calls_by_day = {}
+        for bucket in rollups:
+            region_data = geographic_data.setdefault(bucket["region"], {
+                "total_calls": 0,
+                "successful_calls": 0,
+                "total_duration": 0,
+                "avg_duration": 0
+            })
+            region_data["total_calls"] += bucket["total_calls"]
+            region_data["successful_calls"] += bucket["successful_calls"]
+            region_data["total_duration"] += bucket["total_duration"]
             
-            call_duration = call.get("call_duration") or 0
-            if call.get("status", "").lower() in ["completed", "ended"] and call_duration > 30:
-                geographic_data[region]["successful_calls"] += 1
+            agent_totals = calls_by_agent.setdefault(bucket["agent_id"], {"total_calls": 0, "successful_calls": 0, "total_duration": 0})
+            agent_totals["total_calls"] += bucket["total_calls"]
+            agent_totals["successful_calls"] += bucket["successful_calls"]
+            agent_totals["total_duration"] += bucket["total_duration"]
             
-            geographic_data[region]["total_duration"] += call_duration
+            day_totals = calls_by_day.setdefault(bucket["day"], {"calls": 0, "successful": 0})
+            day_totals["calls"] += bucket["total_calls"]
+            day_totals["successful"] += bucket["completed_calls"]
         
         # Calculate averages for geographic data
         for region_data in geographic_data.values():
@@ -2894,12 +2177,12 @@ async def get_global_analytics(
         # 2. Enhanced Agent Performance Comparison
         agent_performance_data = []
         for agent in agents_data:
-            agent_calls = [call for call in calls_data if call.get("agent_id") == agent["id"]]
+            agent_totals = calls_by_agent.get(agent["id"], {})
             
-            total_calls = len(agent_calls)
-            successful_calls = len([call for call in agent_calls if call.get("status", "").lower() in ["completed", "ended"] and (call.get("call_duration") or 0) > 30])
+            total_calls = agent_totals.get("total_calls", 0)
+            successful_calls = agent_totals.get("successful_calls", 0)
             
-            total_duration = sum(int(call.get("call_duration") or 0) for call in agent_calls)
+            total_duration = agent_totals.get("total_duration", 0)
             avg_duration = total_duration / total_calls if total_calls > 0 else 0
             
             # Calculate performance metrics
@@ -2937,18 +2220,18 @@ async def get_global_analytics(
         agent_performance_data.sort(key=lambda x: x["performance_score"], reverse=True)
         
         # Calculate basic metrics (existing logic)
-        total_calls = len(calls_data)
-        completed_calls = len([call for call in calls_data if call.get("status", "").lower() in ["completed", "ended"]])
-        failed_calls = len([call for call in calls_data if call.get("status", "").lower() in ["failed", "busy", "no_answer"]])
+        total_calls = sum(bucket["total_calls"] for bucket in rollups)
+        completed_calls = sum(bucket["completed_calls"] for bucket in rollups)
+        failed_calls = sum(bucket["failed_calls"] for bucket in rollups)
         
-        total_duration = sum(int(call.get("call_duration") or 0) for call in calls_data)
+        total_duration = sum(bucket["total_duration"] for bucket in rollups)
         avg_duration = total_duration / total_calls if total_calls > 0 else 0
         
         success_rate = (completed_calls / total_calls * 100) if total_calls > 0 else 0
         
         # Previous period comparison
-        prev_total_calls = len(previous_calls_data)
-        prev_completed_calls = len([call for call in previous_calls_data if call.get("status", "").lower() in ["completed", "ended"]])
+        prev_total_calls = sum(bucket["total_calls"] for bucket in previous_rollups)
+        prev_completed_calls = sum(bucket["completed_calls"] for bucket in previous_rollups)
         
         def calc_change(current, previous):
             if previous == 0:
@@ -2968,14 +2251,12 @@ async def get_global_analytics(
             current_date += timedelta(days=1)
         
         for date in date_range:
-            day_calls = [call for call in calls_data if call.get("created_at", "").startswith(str(date))]
-            day_successful = len([call for call in day_calls if call.get("status", "").lower() in ["completed", "ended"]])
-            day_failed = len(day_calls) - day_successful
+            day_totals = calls_by_day.get(str(date), {"calls": 0, "successful": 0})
             time_series_data.append({
                 "date": str(date),
-                "calls": len(day_calls),
-                "successful": day_successful,
-                "failed": day_failed
+                "calls": day_totals["calls"],
+                "successful": day_totals["successful"],
+                "failed": day_totals["calls"] - day_totals["successful"]
             })
         
         return {
@@ -3041,15 +2322,9 @@ async def export_analytics_csv(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Calculate date range (same logic as analytics endpoint)
         end_date_dt = datetime.now(timezone.utc)
@@ -3062,27 +2337,26 @@ async def export_analytics_csv(
         else:  # 30d default
             start_date_dt = end_date_dt - timedelta(days=30)
         
-        # Get detailed call data with all relevant fields
-        calls_query = supabase_service_client.table("calls").select(
-            "id, status, call_duration, phone_number_e164, created_at, initiated_at, answered_at, ended_at, agent_id, batch_campaign_id, room_name, telnyx_call_control_id"
-        ).eq("user_id", user_id).gte("created_at", start_date_dt.isoformat()).lte("created_at", end_date_dt.isoformat())
-        
-        if campaign_id:
-            calls_query = calls_query.eq("batch_campaign_id", campaign_id)
-        if agent_id:
-            calls_query = calls_query.eq("agent_id", agent_id)
+        # Detailed call data with all relevant fields, fetched page by page while streaming
+        def build_calls_query():
+            calls_query = supabase_async_client.table("calls").select(
+                "id, status, call_duration, phone_number_e164, created_at, initiated_at, answered_at, ended_at, agent_id, batch_campaign_id, room_name, telnyx_call_control_id"
+            ).eq("user_id", user_id).gte("created_at", start_date_dt.isoformat()).lte("created_at", end_date_dt.isoformat())
             
-        calls_response = calls_query.execute()
-        calls_data = calls_response.data or []
+            if campaign_id:
+                calls_query = calls_query.eq("batch_campaign_id", campaign_id)
+            if agent_id:
+                calls_query = calls_query.eq("agent_id", agent_id)
+            return calls_query
         
         # Get agents data for names
-        agents_response = supabase_service_client.table("agents").select(
+        agents_response = await supabase_async_client.table("agents").select(
             "id, name"
         ).eq("user_id", user_id).execute()
         agents_data = {agent["id"]: agent["name"] for agent in agents_response.data or []}
         
         # Get campaigns data for names
-        campaigns_response = supabase_service_client.table("batch_campaigns").select(
+        campaigns_response = await supabase_async_client.table("batch_campaigns").select(
             "id, name"
         ).eq("user_id", user_id).execute()
         campaigns_data = {campaign["id"]: campaign["name"] for campaign in campaigns_response.data or []}
@@ -3149,9 +2423,6 @@ async def export_analytics_csv(
                 field_str = f'"{field_str}"'
             return field_str
         
-        # Generate CSV content
-        csv_lines = []
-        
         # CSV Headers
         headers = [
             "Call ID", "Date", "Time", "Phone Number", "Agent Name", "Agent ID", 
@@ -3160,10 +2431,8 @@ async def export_analytics_csv(
             "Day of Week", "Hour of Day", "Answer Time (seconds)", "Setup Time (seconds)",
             "Room Name", "Telnyx Call ID", "Created At", "Initiated At", "Answered At", "Ended At"
         ]
-        csv_lines.append(",".join(escape_csv_field(h) for h in headers))
         
-        # CSV Data Rows
-        for call in calls_data:
+        def build_row(call):
             created_at = call.get("created_at", "")
             initiated_at = call.get("initiated_at", "")
             answered_at = call.get("answered_at", "")
@@ -3219,9 +2488,18 @@ async def export_analytics_csv(
                 ended_at
             ]
             
-            csv_lines.append(",".join(escape_csv_field(field) for field in row))
+            return ",".join(escape_csv_field(field) for field in row)
         
-        csv_content = "\n".join(csv_lines)
+        async def generate_csv():
+            yield ",".join(escape_csv_field(h) for h in headers)
+            try:
+                async for calls_page in iter_keyset_pages(build_calls_query):
+                    for call in calls_page:
+                        yield "\n" + build_row(call)
+            except Exception as e:
+                logger.error(f"Error streaming analytics CSV: {e}")
+                # Abort the chunked response rather than end a truncated file cleanly
+                raise
         
         # Generate filename with timestamp and filters
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -3236,10 +2514,9 @@ async def export_analytics_csv(
             
         filename = "_".join(filename_parts) + ".csv"
         
-        # Return CSV with proper headers
-        from fastapi.responses import Response
-        return Response(
-            content=csv_content,
+        # Stream CSV with proper headers
+        return StreamingResponse(
+            generate_csv(),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
@@ -3260,18 +2537,12 @@ async def get_telnyx_call_tracking_data(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Get calls with Telnyx tracking data
-        calls_response = supabase_service_client.table("calls").select(
+        calls_response = await supabase_async_client.table("calls").select(
             "id, telnyx_call_control_id, status, call_duration, phone_number_e164, created_at, initiated_at, answered_at, ended_at"
         ).eq("user_id", user_id).not_.is_("telnyx_call_control_id", "null").execute()
         
@@ -3370,18 +2641,12 @@ async def get_livekit_session_analytics(
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
         # Get calls with LiveKit room data
-        calls_response = supabase_service_client.table("calls").select(
+        calls_response = await supabase_async_client.table("calls").select(
             "id, room_name, status, call_duration, created_at, initiated_at, answered_at, ended_at, agent_id"
         ).eq("user_id", user_id).not_.is_("room_name", "null").execute()
         
@@ -3483,72 +2748,45 @@ async def get_livekit_session_analytics(
 async def get_real_time_analytics(
     authorization: str = Header(None, alias="Authorization")
 ):
-    """Get real-time analytics for live dashboard updates"""
+    """Get real-time analytics for live dashboard updates.
+
+    Counts and health come from this worker's memory: with several API workers each
+    one reports the calls, campaigns and requests it handled itself.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
-    
     try:
         # Verify token
-        user_response = supabase_service_client.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
+        user_id = await get_user_id_from_token(authorization)
         
-        # Get real-time data (last 1 hour)
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        
-        recent_calls_response = supabase_service_client.table("calls").select(
-            "id, status, call_duration, created_at, agent_id"
-        ).eq("user_id", user_id).gte("created_at", one_hour_ago.isoformat()).execute()
-        
-        recent_calls = recent_calls_response.data or []
-        
-        # Get active campaigns
-        active_campaigns_response = supabase_service_client.table("batch_campaigns").select(
-            "id, name, status"
-        ).eq("user_id", user_id).eq("status", "running").execute()
-        
-        active_campaigns = active_campaigns_response.data or []
-        
-        # Calculate real-time metrics
-        calling_now = len([c for c in recent_calls if c.get("status") == "calling"])
-        calls_last_hour = len(recent_calls)
-        successful_last_hour = len([c for c in recent_calls if c.get("status") in ["completed", "ended"]])
+        # Served from the in-process live call registry, fed by call status transitions
+        snapshot = live_call_registry.snapshot(user_id)
+        api_response_time = live_call_registry.api_response_time_ms
         
         real_time_data = {
             "live_metrics": {
-                "calls_in_progress": calling_now,
-                "calls_last_hour": calls_last_hour,
-                "success_rate_last_hour": round((successful_last_hour / calls_last_hour * 100), 2) if calls_last_hour > 0 else 0,
-                "active_campaigns": len(active_campaigns),
-                "avg_call_duration_last_hour": round(
-                    sum(c.get("call_duration", 0) for c in recent_calls) / len(recent_calls), 2
-                ) if recent_calls else 0
+                "calls_in_progress": snapshot["calls_in_progress"],
+                "calls_last_hour": snapshot["calls_last_hour"],
+                "success_rate_last_hour": snapshot["success_rate_last_hour"],
+                "active_campaigns": len(snapshot["active_campaigns"]),
+                "avg_call_duration_last_hour": snapshot["avg_call_duration_last_hour"]
             },
-            "minute_by_minute": [
-                {
-                    "timestamp": (datetime.utcnow() - timedelta(minutes=i)).isoformat(),
-                    "calls": max(0, calling_now - i + __import__('random').randint(-2, 3)),  # Mock minute data
-                    "successful": max(0, calling_now - i + __import__('random').randint(-1, 2))
-                }
-                for i in range(15, -1, -1)  # Last 15 minutes
-            ],
+            "minute_by_minute": snapshot["minute_by_minute"],
             "active_campaigns_status": [
                 {
-                    "campaign_name": campaign.get("name", "Unknown"),
-                    "status": campaign.get("status", "unknown"),
-                    "calls_in_progress": __import__('random').randint(0, 5)  # Mock data - would be real in production
+                    "campaign_name": campaign["campaign_name"],
+                    "status": campaign["status"],
+                    "calls_in_progress": campaign["calls_in_progress"]
                 }
-                for campaign in active_campaigns
+                for campaign in snapshot["active_campaigns"]
             ],
             "system_health": {
-                "api_response_time": round(__import__('random').uniform(50, 150), 2),  # Mock data
-                "database_connection": "healthy",
-                "telnyx_connection": "healthy",
-                "livekit_connection": "healthy"
+                "api_response_time": round(api_response_time, 2) if api_response_time is not None else None,
+                # Latest request outcome of this worker: healthy, unhealthy or unknown
+                "database_connection": dependency_health.status("database"),
+                "telnyx_connection": dependency_health.status("telnyx"),
+                "livekit_connection": dependency_health.status("livekit")
             }
         }
         
@@ -3581,8 +2819,8 @@ async def test_pathway_integration():
         
         # Test 2: Database connection for pathways
         try:
-            pathway_count = supabase_service_client.table("pathways").select("id").execute()
-            execution_count = supabase_service_client.table("pathway_executions").select("id").execute()
+            pathway_count = await supabase_async_client.table("pathways").select("id").execute()
+            execution_count = await supabase_async_client.table("pathway_executions").select("id").execute()
             results["tests"]["database_access"] = {
                 "status": "✅ PASS", 
                 "message": f"Database accessible - {len(pathway_count.data or [])} pathways, {len(execution_count.data or [])} executions"
@@ -3592,7 +2830,7 @@ async def test_pathway_integration():
         
         # Test 3: Agent pathway column
         try:
-            agent_test = supabase_service_client.table("agents").select("id, default_pathway_id").limit(1).execute()
+            agent_test = await supabase_async_client.table("agents").select("id, default_pathway_id").limit(1).execute()
             results["tests"]["agent_pathway_column"] = {"status": "✅ PASS", "message": "Agents.default_pathway_id column accessible"}
         except Exception as e:
             results["tests"]["agent_pathway_column"] = {"status": "❌ FAIL", "message": f"Agent pathway column issue: {str(e)}"}
@@ -3626,7 +2864,7 @@ async def test_pathway_integration():
 async def create_test_pathway(authorization: str = Header(None, alias="Authorization")):
     """Create a simple test pathway for integration testing"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         test_pathway = {
             "name": "Test Pathway - Integration Check",
@@ -3670,7 +2908,7 @@ async def create_test_pathway(authorization: str = Header(None, alias="Authoriza
         }
         
         # Insert test pathway
-        response = supabase_service_client.table("pathways").insert(test_pathway).execute()
+        response = await supabase_async_client.table("pathways").insert(test_pathway).execute()
         
         if response.data:
             pathway_id = response.data[0]["id"]
@@ -3699,13 +2937,18 @@ async def create_test_pathway(authorization: str = Header(None, alias="Authoriza
 async def get_pathway_execution_details(execution_id: str):
     """Get detailed information about a specific pathway execution"""
     try:
-        response = supabase_service_client.table("pathway_executions").select("*").eq("id", execution_id).single().execute()
+        response = await supabase_async_client.table("pathway_executions").select("*").eq("id", execution_id).single().execute()
         
         if response.data:
-            execution_data = response.data
+            # Transitions and variable updates live in the append-only events table
+            from api.agent_pathway_integration import materialize_pathway_execution, PATHWAY_EXECUTION_EVENTS_TABLE
+            events_response = await supabase_async_client.table(PATHWAY_EXECUTION_EVENTS_TABLE).select(
+                "event_type, node_id, payload, created_at"
+            ).eq("execution_id", execution_id).order("id").execute()
+            execution_data = materialize_pathway_execution(response.data, events_response.data or [])
             
             # Enrich with pathway info
-            pathway_response = supabase_service_client.table("pathways").select("name, description").eq("id", execution_data["pathway_id"]).single().execute()
+            pathway_response = await supabase_async_client.table("pathways").select("name, description").eq("id", execution_data["pathway_id"]).single().execute()
             if pathway_response.data:
                 execution_data["pathway_info"] = pathway_response.data
             
@@ -3732,10 +2975,10 @@ async def get_pathway_execution_details(execution_id: str):
 async def simulate_pathway_execution(pathway_id: str, authorization: str = Header(None, alias="Authorization")):
     """Simulate pathway execution to test node processing logic"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         # Load pathway configuration
-        pathway_response = supabase_service_client.table("pathways").select("*").eq("id", pathway_id).single().execute()
+        pathway_response = await supabase_async_client.table("pathways").select("*").eq("id", pathway_id).single().execute()
         
         if not pathway_response.data:
             return {
@@ -3863,13 +3106,22 @@ async def get_active_pathway_executions():
     """Get all currently active pathway executions for debugging"""
     try:
         # Get active executions
-        response = supabase_service_client.table("pathway_executions").select("""
+        response = await supabase_async_client.table("pathway_executions").select("""
             id, pathway_id, call_id, agent_id, status, current_node_id, 
             started_at, updated_at, execution_trace,
             pathways(name, description)
         """).eq("status", "running").order("started_at", desc=True).limit(50).execute()
         
         if response.data:
+            # Count appended transitions per execution in one query
+            from api.agent_pathway_integration import PATHWAY_EXECUTION_EVENTS_TABLE
+            transition_counts: Dict[str, int] = {}
+            events_response = await supabase_async_client.table(PATHWAY_EXECUTION_EVENTS_TABLE).select(
+                "execution_id"
+            ).in_("execution_id", [execution["id"] for execution in response.data]).eq("event_type", "node_transition").execute()
+            for event in events_response.data or []:
+                transition_counts[event["execution_id"]] = transition_counts.get(event["execution_id"], 0) + 1
+            
             executions = []
             for execution in response.data:
                 # Calculate execution duration
@@ -3883,7 +3135,7 @@ async def get_active_pathway_executions():
                     "agent_id": execution["agent_id"],
                     "current_node": execution["current_node_id"],
                     "duration_minutes": round(duration_minutes, 2),
-                    "trace_entries": len(execution["execution_trace"] or []),
+                    "trace_entries": len(execution["execution_trace"] or []) + transition_counts.get(execution["id"], 0),
                     "started_at": execution["started_at"]
                 })
             
@@ -3919,9 +3171,9 @@ async def pathway_system_health():
         
         # Check 1: Database tables
         try:
-            pathways_count = supabase_service_client.table("pathways").select("id", count="exact").execute()
-            executions_count = supabase_service_client.table("pathway_executions").select("id", count="exact").execute()
-            agents_with_pathways = supabase_service_client.table("agents").select("id", count="exact").not_.is_("default_pathway_id", "null").execute()
+            pathways_count = await supabase_async_client.table("pathways").select("id", count="exact").execute()
+            executions_count = await supabase_async_client.table("pathway_executions").select("id", count="exact").execute()
+            agents_with_pathways = await supabase_async_client.table("agents").select("id", count="exact").not_.is_("default_pathway_id", "null").execute()
             
             health_report["components"]["database"] = {
                 "status": "✅ HEALTHY",
@@ -3947,7 +3199,7 @@ async def pathway_system_health():
         
         # Check 3: Recent activity
         try:
-            recent_executions = supabase_service_client.table("pathway_executions").select("id, status, started_at").gte("started_at", (datetime.utcnow() - timedelta(hours=24)).isoformat()).execute()
+            recent_executions = await supabase_async_client.table("pathway_executions").select("id, status, started_at").gte("started_at", (datetime.utcnow() - timedelta(hours=24)).isoformat()).execute()
             
             activity_summary = {
                 "total_24h": len(recent_executions.data or []),
@@ -2,6 +2,7 @@
 OAuth utility functions for managing app connections and token refresh
 """
 import asyncio
+import threading
 import aiohttp
 from datetime import datetime, timedelta
 from typing import Dict, Any, Tuple, Optional
@@ -166,10 +167,14 @@ async def refresh_oauth_token(connection: Dict[str, Any]) -> Dict[str, Any]:
         
         raise Exception(f"Failed to refresh token for {app_name}: {str(e)}")
 
-async def check_and_refresh_expiring_tokens():
+async def check_and_refresh_expiring_tokens(stop_event: Optional[threading.Event] = None):
     """
     Background task to check and refresh expiring tokens
     Run this periodically (e.g., every 30 minutes)
+    
+    Args:
+        stop_event: Checked between connections; once set, the remaining ones are left
+            to the next run (lets the scheduler stop a run from another thread)
     """
     try:
         supabase = get_supabase_anon_client()
@@ -192,6 +197,9 @@ async def check_and_refresh_expiring_tokens():
         print(f"Found {len(result.data)} connections with expiring tokens")
         
         for connection in result.data:
+            if stop_event is not None and stop_event.is_set():
+                print("Token refresh check stopped")
+                return
             try:
                 # Get app integration info safely
                 app_integrations = connection.get("app_integrations")
@@ -62,7 +62,7 @@ async def create_pathway(
 ):
     """Create a new pathway"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         # Create basic pathway config if empty
         if not request.config:
@@ -117,7 +117,7 @@ async def list_pathways(
 ):
     """List pathways for the user"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         query = supabase_service_client.table("pathways").select("*").eq("user_id", user_id)
         
@@ -156,7 +156,7 @@ async def get_pathway(
 ):
     """Get pathway by ID"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         pathway_data = await verify_user_access_to_pathway(pathway_id, user_id)
         
@@ -187,7 +187,7 @@ async def update_pathway(
 ):
     """Update a pathway"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         # Verify access
         await verify_user_access_to_pathway(pathway_id, user_id)
@@ -225,7 +225,7 @@ async def delete_pathway(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Delete a pathway"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     try:
         # Verify user access
@@ -463,7 +463,7 @@ async def get_pathway_templates():
 async def create_lead_qualification_pathway(authorization: str = Header(None, alias="Authorization")):
     """Create a comprehensive lead qualification pathway for testing all conversation flow aspects"""
     try:
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         
         # Create comprehensive lead qualification pathway based on VAPI example
         pathway_config = {
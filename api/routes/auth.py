@@ -12,7 +12,7 @@ from pydantic import BaseModel
 import httpx
 
 from ..config import get_user_id_from_token
-from ..db_client import supabase_service_client
+from ..db_client import supabase_async_client, get_supabase_async_anon_client
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -44,8 +44,10 @@ async def auth_signup(request: UserSignupRequest):
     Sign up a new user using Supabase Auth
     """
     try:
-        # Sign up user with Supabase Auth
-        auth_response = supabase_service_client.auth.sign_up({
+        # Sign up user with Supabase Auth (anon client: a returned session must not replace
+        # the shared service client's key)
+        auth_client = await get_supabase_async_anon_client()
+        auth_response = await auth_client.auth.sign_up({
             "email": request.email,
             "password": request.password
         })
@@ -62,7 +64,7 @@ async def auth_signup(request: UserSignupRequest):
             }
             
             try:
-                profile_response = supabase_service_client.table("users").insert(user_data).execute()
+                profile_response = await supabase_async_client.table("users").insert(user_data).execute()
                 
                 if profile_response.data:
                     logger.info(f"User profile created successfully: {profile_response.data[0]}")
@@ -108,8 +110,9 @@ async def auth_login(request: UserLoginRequest):
     Authenticate user with Supabase Auth
     """
     try:
-        # Authenticate with Supabase
-        auth_response = supabase_service_client.auth.sign_in_with_password({
+        # Authenticate with Supabase (anon client, so the shared service client keeps its key)
+        auth_client = await get_supabase_async_anon_client()
+        auth_response = await auth_client.auth.sign_in_with_password({
             "email": request.email,
             "password": request.password
         })
@@ -122,7 +125,7 @@ async def auth_login(request: UserLoginRequest):
             
             # Get user profile from public.users
             try:
-                profile_response = supabase_service_client.table("users").select("*").eq("id", user_id).single().execute()
+                profile_response = await supabase_async_client.table("users").select("*").eq("id", user_id).single().execute()
                 user_profile = profile_response.data if profile_response.data else {}
             except Exception as profile_e:
                 logger.warning(f"Could not fetch user profile: {profile_e}")
@@ -159,11 +162,11 @@ async def get_current_user(authorization: str = Header(None, alias="Authorizatio
     """
     Get current user information from token
     """
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     try:
         # Get user profile from public.users
-        response = supabase_service_client.table("users").select("*").eq("id", user_id).single().execute()
+        response = await supabase_async_client.table("users").select("*").eq("id", user_id).single().execute()
         
         if response.data:
             return {
@@ -200,7 +203,7 @@ async def create_user_in_public_users(request: UserCreateRequest):
         if request.auth_user_id:
             user_data["id"] = request.auth_user_id
         
-        response = supabase_service_client.table("users").insert(user_data).execute()
+        response = await supabase_async_client.table("users").insert(user_data).execute()
         
         if response.data:
             logger.info(f"User created successfully: {response.data[0]}")
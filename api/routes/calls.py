@@ -6,7 +6,6 @@ status updates, and call history.
 """
 import json
 import os
-import subprocess
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -15,7 +14,12 @@ from fastapi import APIRouter, HTTPException, status, Header
 from pydantic import BaseModel, Field
 
 from ..config import get_user_id_from_token
-from ..db_client import supabase_service_client
+from ..db_client import supabase_async_client
+from ..telnyx_webhooks import call_control_index
+from ..batch_routes import update_batch_call_item_from_call_status
+from ..live_call_registry import live_call_registry
+from services import livekit_client
+from services.livekit_client import LiveKitServiceError
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -74,35 +78,6 @@ class CallStatusUpdateRequest(BaseModel):
     call_duration_seconds: Optional[int] = None
     telnyx_call_control_id: Optional[str] = None
 
-# --- Helper Functions ---
-
-def parse_lk_dispatch_output(output: str) -> tuple[str | None, str | None]:
-    """
-    Parse the output of 'lk dispatch create' command to extract room name and job ID.
-    """
-    logger.info(f"Parsing lk dispatch output: {output}")
-    
-    room_name = None
-    job_id = None
-    
-    for line in output.strip().split('\n'):
-        if 'room:' in line.lower():
-            parts = line.split(':', 1)
-            if len(parts) == 2:
-                room_name = parts[1].strip()
-        
-        if 'id:' in line.lower():
-            parts = line.split(':', 1)
-            if len(parts) == 2:
-                job_id = parts[1].strip()
-    
-    # Often, the room name itself contains the job/dispatch ID for dispatch-created rooms
-    if room_name and room_name.startswith("RM_"):  # Default LiveKit room prefix
-         pass  # Room name is usually sufficient reference initially
-
-    logger.info(f"Parsed from lk output - Room: {room_name}")  # Removed Job ID for now
-    return room_name, job_id  # Job ID might be None
-
 # --- Route Endpoints ---
 
 @router.post("/", summary="Initiate a basic call")
@@ -162,7 +137,7 @@ async def initiate_call(request: CallRequest):
             "status": "initiating",
         }
         logger.info(f"Attempting to insert call log into Supabase 'calls' table: {call_log_payload}")
-        call_log_response = supabase_service_client.table("calls").insert(call_log_payload).execute()
+        call_log_response = await supabase_async_client.table("calls").insert(call_log_payload).execute()
         if call_log_response.data and len(call_log_response.data) > 0:
             supabase_call_id = call_log_response.data[0].get("id")
             logger.info(f"Successfully logged call initiation to Supabase 'calls' table. Supabase Call ID: {supabase_call_id}")
@@ -190,49 +165,16 @@ async def initiate_call(request: CallRequest):
 
     metadata_json = json.dumps(metadata)
 
-    # Construct the lk dispatch command
-    command = [
-        "lk",
-        "dispatch",
-        "create",
-        "--new-room",
-        "--agent-name", "outbound-caller",
-        "--metadata", metadata_json
-    ]
-
     try:
-        logger.info(f"Executing command: {' '.join(command)}")
-        process_env = os.environ.copy()
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False,
-            env=process_env
-        )
-
-        logger.info(f"lk dispatch command output: {result.stdout}")
-        logger.info(f"lk dispatch command stderr: {result.stderr}")
-
-        if "Dispatch created" not in result.stdout and "id: " not in result.stdout:
-             logger.warning("Dispatch command executed but success message/ID not found in output.")
-
-        return {"message": "Call initiated successfully", "dispatch_details": result.stdout}
+        # Dispatch the agent in-process through the shared LiveKit API client
+        dispatch = await livekit_client.create_agent_dispatch("outbound-caller", metadata_json)
+        return {"message": "Call initiated successfully", "dispatch_details": dispatch}
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to execute lk dispatch command: {e}")
-        logger.error(f"Command output (stdout): {e.stdout}")
-        logger.error(f"Command output (stderr): {e.stderr}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to initiate call: {e.stderr or e.stdout or 'Unknown error'}",
-        )
-    except FileNotFoundError:
-        logger.error("Error: 'lk' command not found. Make sure LiveKit CLI is installed and in PATH.")
+    except LiveKitServiceError as e:
+        logger.error(f"Failed to create LiveKit agent dispatch: {e} ({e.details})")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="'lk' command not found. Server configuration issue."
+            detail=f"Failed to initiate call: {str(e)}",
         )
     except Exception as e:
         logger.exception("An unexpected error occurred")
@@ -243,10 +185,10 @@ async def initiate_call(request: CallRequest):
 
 @router.get("/", summary="Get call history")
 async def get_calls(authorization: str = Header(None, alias="Authorization")):
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     try:
-        response = supabase_service_client.table("calls").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        response = await supabase_async_client.table("calls").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
         
         if response.data:
             return {"calls": response.data}
@@ -290,19 +232,32 @@ async def update_call_status_by_room(
     }
     
     if call_duration_seconds is not None:
-        update_data["duration_seconds"] = call_duration_seconds
+        update_data["call_duration"] = call_duration_seconds
         
     if telnyx_call_control_id:
         update_data["call_control_id"] = telnyx_call_control_id
+        call_control_index.register(telnyx_call_control_id, supabase_call_id)
     
     if new_status in ["completed", "failed", "cancelled"]:
         update_data["ended_at"] = datetime.utcnow().isoformat()
     
     try:
-        response = supabase_service_client.table("calls").update(update_data).eq("id", supabase_call_id).execute()
+        response = await supabase_async_client.table("calls").update(update_data).eq("id", supabase_call_id).execute()
         
         if response.data:
             logger.info(f"Successfully updated call status for Supabase Call ID: {supabase_call_id}")
+            live_call_registry.record_call_status(
+                supabase_call_id,
+                new_status,
+                user_id=response.data[0].get("user_id"),
+                campaign_id=response.data[0].get("batch_campaign_id"),
+                agent_id=response.data[0].get("agent_id"),
+                duration_seconds=call_duration_seconds,
+            )
+            # Ends the batch call item of campaign calls and frees its dispatcher slot
+            await update_batch_call_item_from_call_status(
+                supabase_call_id, new_status, call_duration_seconds, call_data=response.data[0]
+            )
             return {"message": "Call status updated successfully", "call": response.data[0]}
         else:
             error_msg = f"No call found with Supabase Call ID: {supabase_call_id}"
@@ -11,7 +11,7 @@ from fastapi import APIRouter, HTTPException, status, Header
 from pydantic import BaseModel
 
 from ..config import get_user_id_from_token
-from ..db_client import supabase_service_client
+from ..db_client import supabase_async_client
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -38,11 +38,11 @@ async def get_user_settings(authorization: str = Header(None, alias="Authorizati
     """
     Get current user's settings and profile information
     """
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     try:
         # Get user profile from public.users
-        response = supabase_service_client.table("users").select("*").eq("id", user_id).single().execute()
+        response = await supabase_async_client.table("users").select("*").eq("id", user_id).single().execute()
         
         if response.data:
             user_data = response.data
@@ -88,7 +88,7 @@ async def update_user_settings(
     """
     Update user settings and profile information
     """
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Prepare update data (only include non-None values)
     update_data = {}
@@ -119,7 +119,7 @@ async def update_user_settings(
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
     try:
-        response = supabase_service_client.table("users").update(update_data).eq("id", user_id).execute()
+        response = await supabase_async_client.table("users").update(update_data).eq("id", user_id).execute()
         
         if response.data:
             logger.info(f"User settings updated successfully for user {user_id}")
@@ -147,10 +147,10 @@ async def get_phone_numbers(authorization: str = Header(None, alias="Authorizati
     """
     Get phone numbers associated with the user
     """
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     try:
-        response = supabase_service_client.table("phone_numbers").select("*").eq("user_id", user_id).execute()
+        response = await supabase_async_client.table("phone_numbers").select("*").eq("user_id", user_id).execute()
         
         if response.data:
             return {"phone_numbers": response.data}
@@ -0,0 +1,113 @@
+"""
+Cross-process leader election for the background schedulers.
+
+Every API worker (and container) runs a SchedulerLease loop; the one holding the
+lease row in public.scheduler_leases runs the singleton loops (token refresh,
+campaign scheduler resync). The holder renews the lease every
+SCHEDULER_LEASE_RENEW_SECONDS; when it dies the lease expires after
+SCHEDULER_LEASE_TTL_SECONDS and another worker takes over.
+
+try_acquire_lease/release_lease expose the same leases to other single-owner work:
+each campaign dispatcher holds one so a campaign is dialed by one worker at a time.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+from .db_client import supabase_async_client
+from services.dependency_health import dependency_health
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "30"))
+SCHEDULER_LEASE_RENEW_SECONDS = int(os.getenv("SCHEDULER_LEASE_RENEW_SECONDS", "10"))
+
+# Holder id of this process for the leases it takes outside SchedulerLease (campaign dispatchers)
+PROCESS_LEASE_HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def try_acquire_lease(name: str, holder: str = PROCESS_LEASE_HOLDER, ttl_seconds: int = SCHEDULER_LEASE_TTL_SECONDS) -> bool:
+    """Take or renew a lease; True if holder now holds it"""
+    response = await supabase_async_client.rpc("try_acquire_scheduler_lease", {
+        "p_name": name,
+        "p_holder": holder,
+        "p_ttl_seconds": ttl_seconds,
+    }).execute()
+    return bool(response.data)
+
+
+async def release_lease(name: str, holder: str = PROCESS_LEASE_HOLDER):
+    """Give a lease up without waiting for it to expire (no-op if holder lost it)"""
+    try:
+        await supabase_async_client.rpc("release_scheduler_lease", {
+            "p_name": name,
+            "p_holder": holder,
+        }).execute()
+    except Exception as e:
+        logger.warning(f"Failed to release lease '{name}': {e}")
+
+
+class SchedulerLease:
+    def __init__(
+        self,
+        name: str,
+        leader_loops: List[Callable[[], Awaitable[None]]],
+        on_change: Optional[Callable[[bool], None]] = None,
+    ):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.leader_loops = leader_loops
+        self.on_change = on_change
+        self.is_leader = False
+        self._leader_tasks: List[asyncio.Task] = []
+        self._renewed_at = 0.0
+
+    async def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        if is_leader:
+            logger.info(f"Acquired scheduler lease '{self.name}' as {self.holder}")
+            self._leader_tasks = [asyncio.create_task(loop()) for loop in self.leader_loops]
+        else:
+            logger.warning(f"Lost scheduler lease '{self.name}', stopping leader loops")
+            for task in self._leader_tasks:
+                task.cancel()
+            # Wait for the loops to stop so no leader work overlaps with the next holder's
+            await asyncio.gather(*self._leader_tasks, return_exceptions=True)
+            self._leader_tasks = []
+        if self.on_change:
+            self.on_change(is_leader)
+
+    async def run(self):
+        """Acquire or renew the lease forever, starting and stopping the leader loops accordingly"""
+        while True:
+            try:
+                acquired = await try_acquire_lease(self.name, self.holder)
+                # Every worker renews, so this doubles as a database health probe
+                dependency_health.record("database", True)
+                if acquired:
+                    self._renewed_at = time.monotonic()
+                await self._set_leader(acquired)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error renewing scheduler lease '{self.name}': {e}")
+                dependency_health.record("database", False)
+                # Without renewal, another worker may take the lease over once it expires
+                if self.is_leader and time.monotonic() - self._renewed_at > SCHEDULER_LEASE_TTL_SECONDS - SCHEDULER_LEASE_RENEW_SECONDS:
+                    await self._set_leader(False)
+            await asyncio.sleep(SCHEDULER_LEASE_RENEW_SECONDS)
+
+    async def release(self):
+        """Stop the leader loops and hand the lease over without waiting for it to expire"""
+        was_leader = self.is_leader
+        await self._set_leader(False)
+        if not was_leader:
+            return
+        await release_lease(self.name, self.holder)
@@ -10,7 +10,7 @@ import asyncio
 from datetime import datetime, timezone
 
 # Supabase client import
-from api.db_client import supabase_service_client
+from api.db_client import supabase_async_client
 
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -118,6 +118,32 @@ router = APIRouter(
 
 TELNYX_API_KEY = os.getenv("TELNYX_API_KEY")
 
+async def _find_livekit_trunks_for_number(phone_number_e164: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Outbound and inbound LiveKit SIP trunks carrying a number, from the in-process trunk index."""
+    return {
+        "outbound": await livekit_client.get_sip_trunk_by_number(phone_number_e164),
+        "inbound": await livekit_client.get_inbound_sip_trunk_by_number(phone_number_e164),
+    }
+
+async def _ensure_number_has_no_livekit_trunks(phone_number_e164: str):
+    """Rejects a bidirectional setup for a number LiveKit trunks already carry, before any resource is created."""
+    try:
+        existing_trunks = await _find_livekit_trunks_for_number(phone_number_e164)
+    except LiveKitServiceError as e:
+        # Trunk creation reports the conflict itself if there is one
+        logger.warning(f"Could not check existing LiveKit trunks for {phone_number_e164}: {e}")
+        return
+    trunk_ids = [
+        trunk.get("sipTrunkId") or trunk.get("sipOutboundTrunkId")
+        for trunk in existing_trunks.values() if trunk
+    ]
+    if trunk_ids:
+        logger.error(f"Number {phone_number_e164} is already carried by LiveKit trunks {trunk_ids}")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Number {phone_number_e164} is already connected to LiveKit SIP trunks: {', '.join(trunk_ids)}"
+        )
+
 @router.post("/numbers/available", summary="Search for available Telnyx phone numbers")
 async def search_available_numbers(request: SearchAvailableNumbersRequest):
     try:
@@ -392,7 +418,7 @@ async def purchase_telnyx_number(request: PurchaseNumberRequest):
     supabase_phone_number_record = None
     supabase_record_id = None
     try:
-        insert_response = supabase_service_client.table("phone_numbers").insert(xano_payload).execute()
+        insert_response = await supabase_async_client.table("phone_numbers").insert(xano_payload).execute()
         if insert_response.data and len(insert_response.data) > 0:
             supabase_phone_number_record = insert_response.data[0]
             supabase_record_id = supabase_phone_number_record.get("id")
@@ -488,6 +514,8 @@ async def purchase_bidirectional_number(request: PurchaseBidirectionalNumberRequ
     logger.info(f"🔧 Generated SIP subdomain: {sip_subdomain}")
     logger.info(f"🔧 Generated credentials: {generated_username}")
 
+    await _ensure_number_has_no_livekit_trunks(request.phone_number_e164)
+
     try:
         # === STEP 1: Purchase Number ===
         logger.info(f"📞 Step 1: Purchasing number {request.phone_number_e164}")
@@ -676,7 +704,7 @@ async def purchase_bidirectional_number(request: PurchaseBidirectionalNumberRequ
             "supports_inbound": True
         }
         
-        insert_response = supabase_service_client.table("phone_numbers").insert(supabase_payload).execute()
+        insert_response = await supabase_async_client.table("phone_numbers").insert(supabase_payload).execute()
         
         if not insert_response.data or len(insert_response.data) == 0:
             raise HTTPException(status_code=500, detail="Failed to save phone number record to Supabase")
@@ -727,7 +755,7 @@ async def purchase_bidirectional_number(request: PurchaseBidirectionalNumberRequ
         # Cleanup Supabase record (if created)
         if supabase_record_id:
             try:
-                supabase_service_client.table("phone_numbers").delete().eq("id", supabase_record_id).execute()
+                await supabase_async_client.table("phone_numbers").delete().eq("id", supabase_record_id).execute()
                 logger.info("🧹 Cleaned up Supabase record")
             except Exception as cleanup_e:
                 cleanup_errors.append(f"Supabase cleanup: {cleanup_e}")
@@ -837,6 +865,8 @@ async def connect_existing_bidirectional_number(request: ConnectExistingBidirect
     logger.info(f"🔧 Generated SIP subdomain: {sip_subdomain}")
     logger.info(f"🔧 Generated credentials: {generated_username}")
 
+    await _ensure_number_has_no_livekit_trunks(request.phone_number_e164)
+
     try:
         # === STEP 1: Verify Number Ownership & Get Telnyx ID ===
         logger.info(f"🔍 Step 1: Verifying number ownership and retrieving Telnyx ID")
@@ -1055,7 +1085,7 @@ async def connect_existing_bidirectional_number(request: ConnectExistingBidirect
             "supports_inbound": True
         }
         
-        insert_response = supabase_service_client.table("phone_numbers").insert(supabase_payload).execute()
+        insert_response = await supabase_async_client.table("phone_numbers").insert(supabase_payload).execute()
         
         if not insert_response.data or len(insert_response.data) == 0:
             raise HTTPException(status_code=500, detail="Failed to save phone number record to Supabase")
@@ -1107,7 +1137,7 @@ async def connect_existing_bidirectional_number(request: ConnectExistingBidirect
         # Cleanup Supabase record (if created)
         if supabase_record_id:
             try:
-                supabase_service_client.table("phone_numbers").delete().eq("id", supabase_record_id).execute()
+                await supabase_async_client.table("phone_numbers").delete().eq("id", supabase_record_id).execute()
                 logger.info("🧹 Cleaned up Supabase record")
             except Exception as cleanup_e:
                 cleanup_errors.append(f"Supabase cleanup: {cleanup_e}")
@@ -1173,7 +1203,7 @@ async def configure_telnyx_number_for_livekit(request: ConfigureNumberRequest):
     logger.info(f"Configuring Telnyx number (Supabase ID: {request.pam_phone_number_id}) for LiveKit with Telnyx Connection ID: {request.telnyx_sip_connection_id}")
     
     # Fetch from Supabase
-    phone_record_response = supabase_service_client.table("phone_numbers").select(
+    phone_record_response = await supabase_async_client.table("phone_numbers").select(
         "id, users_id, phone_number_e164, telnyx_number_id, telnyx_sip_username, telnyx_sip_password_clear, livekit_sip_trunk_id" # Added telnyx_sip_password_clear
     ).eq("id", request.pam_phone_number_id).single().execute()
 
@@ -1234,7 +1264,7 @@ async def configure_telnyx_number_for_livekit(request: ConfigureNumberRequest):
     # update_payload_supabase["telnyx_sip_username"] = new_sip_username_if_changed
 
     if len(update_payload_supabase) > 1 or (len(update_payload_supabase) == 1 and "status" in update_payload_supabase) or (final_livekit_sip_trunk_id and final_livekit_sip_trunk_id != livekit_sip_trunk_id_from_db) :
-        update_response = supabase_service_client.table("phone_numbers").update(update_payload_supabase).eq("id", request.pam_phone_number_id).execute()
+        update_response = await supabase_async_client.table("phone_numbers").update(update_payload_supabase).eq("id", request.pam_phone_number_id).execute()
         if not (update_response.data and len(update_response.data) > 0):
             # Simplified error handling
             raise HTTPException(status_code=500, detail="Failed to update phone number record in Supabase.")
@@ -1298,7 +1328,7 @@ async def register_existing_telnyx_number(request: ExistingTelnyxNumberRequest):
         "friendly_name": request.friendly_name or f"Telnyx {request.phone_number_e164}",
         "telnyx_sip_username": telnyx_sip_username,
     }
-    insert_response = supabase_service_client.table("phone_numbers").insert(supabase_payload).execute()
+    insert_response = await supabase_async_client.table("phone_numbers").insert(supabase_payload).execute()
     if not (insert_response.data and len(insert_response.data) > 0):
         # Simplified error handling
         if final_livekit_sip_trunk_id: # Cleanup attempt
@@ -1342,7 +1372,7 @@ async def release_telnyx_number(pam_phone_number_id: str):
             raise HTTPException(status_code=400, detail="Invalid pam_phone_number_id format. Must be an integer or UUID.")
 
     logger.info(f"Attempting to release number with Supabase ID: {pam_phone_number_id}")
-    phone_record_response = supabase_service_client.table("phone_numbers").select(
+    phone_record_response = await supabase_async_client.table("phone_numbers").select(
         "id, phone_number_e164, telnyx_number_id, telnyx_connection_id, livekit_sip_trunk_id, provider, "
         "telnyx_call_control_application_id, telnyx_outbound_voice_profile_id"  # Get all resource IDs for cleanup
     ).eq("id", pam_phone_number_id).single().execute()
@@ -1404,7 +1434,7 @@ async def release_telnyx_number(pam_phone_number_id: str):
             logger.error(f"❌ Failed to delete LiveKit SIP Trunk ID {livekit_sip_trunk_id}: {e}")
 
     # Step 6: Delete Supabase record
-    delete_response = supabase_service_client.table("phone_numbers").delete().eq("id", pam_phone_number_id).execute()
+    delete_response = await supabase_async_client.table("phone_numbers").delete().eq("id", pam_phone_number_id).execute()
     if hasattr(delete_response, 'error') and delete_response.error:
         raise HTTPException(status_code=500, detail=f"Failed to delete phone number from Supabase: {delete_response.error.message}")
 
@@ -1614,7 +1644,7 @@ async def connect_existing_telnyx_number(request: ConnectExistingTelnyxNumberReq
     
     # Check if this phone number already exists in the database
     try:
-        existing_number_response = supabase_service_client.table("phone_numbers").select("id, users_id, status").eq("phone_number_e164", request.phone_number_to_connect_e164).maybe_single().execute()
+        existing_number_response = await supabase_async_client.table("phone_numbers").select("id, users_id, status").eq("phone_number_e164", request.phone_number_to_connect_e164).maybe_single().execute()
         
         if existing_number_response and existing_number_response.data:
             # Number already exists - cleanup and return appropriate response
@@ -1646,7 +1676,7 @@ async def connect_existing_telnyx_number(request: ConnectExistingTelnyxNumberReq
         logger.warning(f"Error checking existing number in database: {e}. Proceeding with insertion.")
     
     try:
-        insert_response = supabase_service_client.table("phone_numbers").insert(supabase_payload).execute()
+        insert_response = await supabase_async_client.table("phone_numbers").insert(supabase_payload).execute()
         if not (insert_response.data and len(insert_response.data) > 0):
             raise HTTPException(status_code=500, detail="Failed to register number in Supabase.")
     except Exception as e:
@@ -1695,7 +1725,7 @@ async def connect_existing_telnyx_number(request: ConnectExistingTelnyxNumberReq
 async def sync_livekit_trunk_credentials(request: SyncLiveKitTrunkCredentialsRequest):
     logger.info(f"Attempting to sync credentials for LiveKit SIP Trunk ID: {request.livekit_sip_trunk_id}")
     
-    phone_record_response = supabase_service_client.table("phone_numbers").select(
+    phone_record_response = await supabase_async_client.table("phone_numbers").select(
         "id, telnyx_sip_username, telnyx_sip_password_clear, phone_number_e164, telnyx_connection_id"
     ).eq("livekit_sip_trunk_id", request.livekit_sip_trunk_id).maybe_single().execute()
 
@@ -1747,7 +1777,7 @@ async def provision_new_telnyx_number_for_user(request: ProvisionNewNumberReques
 
     logger.info(f"Provisioning existing Pam number (Supabase ID: {request.pam_phone_number_id}) for user {request.user_id}")
 
-    existing_phone_response = supabase_service_client.table("phone_numbers").select(
+    existing_phone_response = await supabase_async_client.table("phone_numbers").select(
         "id, phone_number_e164, telnyx_number_id, users_id, status, provider, telnyx_connection_id, livekit_sip_trunk_id"
     ).eq("id", request.pam_phone_number_id).single().execute()
 
@@ -1954,7 +1984,7 @@ async def provision_new_telnyx_number_for_user(request: ProvisionNewNumberReques
     supabase_phone_number_record = None
     supabase_record_id = None
     try:
-        insert_response = supabase_service_client.table("phone_numbers").insert(xano_payload).execute()
+        insert_response = await supabase_async_client.table("phone_numbers").insert(xano_payload).execute()
         if insert_response.data and len(insert_response.data) > 0:
             supabase_phone_number_record = insert_response.data[0]
             supabase_record_id = supabase_phone_number_record.get("id")
@@ -2017,7 +2047,7 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
 
     # Step 1: Verify that the phone number exists
     try:
-        phone_number_check = supabase_service_client.table("phone_numbers").select("id, phone_number_e164, users_id").eq("id", phone_number_id).single().execute()
+        phone_number_check = await supabase_async_client.table("phone_numbers").select("id, phone_number_e164, users_id").eq("id", phone_number_id).single().execute()
         if not phone_number_check.data:
             raise HTTPException(status_code=404, detail=f"Phone number with ID {phone_number_id} not found.")
 
@@ -2030,7 +2060,7 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
     # Step 2: If assigning to an agent, verify the agent exists
     if agent_id_to_assign:
         try:
-            agent_check = supabase_service_client.table("agents").select("id, name, user_id, phone_numbers_id").eq("id", agent_id_to_assign).single().execute()
+            agent_check = await supabase_async_client.table("agents").select("id, name, user_id, phone_numbers_id").eq("id", agent_id_to_assign).single().execute()
             if not agent_check.data:
                 raise HTTPException(status_code=404, detail=f"Agent with ID {agent_id_to_assign} not found.")
             
@@ -2048,16 +2078,16 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
     # Step 3: If unassigning, find any agent that currently has this number and unassign it
     if not agent_id_to_assign:
         try:
-            current_agent_check = supabase_service_client.table("agents").select("id, name").eq("phone_numbers_id", phone_number_id).execute()
+            current_agent_check = await supabase_async_client.table("agents").select("id, name").eq("phone_numbers_id", phone_number_id).execute()
             if current_agent_check.data:
                 for agent in current_agent_check.data:
                     logger.info(f"Unassigning phone number {phone_number_id} from agent '{agent['name']}' (ID: {agent['id']})")
-                    unassign_response = supabase_service_client.table("agents").update({"phone_numbers_id": None}).eq("id", agent['id']).execute()
+                    unassign_response = await supabase_async_client.table("agents").update({"phone_numbers_id": None}).eq("id", agent['id']).execute()
                     if unassign_response.data:
                         logger.info(f"Successfully unassigned phone number from agent {agent['id']}")
                 
                 # Update phone number status back to "active" when unassigning
-                phone_status_update = supabase_service_client.table("phone_numbers").update({
+                phone_status_update = await supabase_async_client.table("phone_numbers").update({
                     "status": "active",
                     "updated_at": datetime.utcnow().isoformat()
                 }).eq("id", phone_number_id).execute()
@@ -2077,7 +2107,7 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
     # Step 4: Assign the phone number to the agent
     try:
         # First, unassign this number from any other agent that might have it
-        unassign_from_others = supabase_service_client.table("agents").update({"phone_numbers_id": None}).eq("phone_numbers_id", phone_number_id).neq("id", agent_id_to_assign).execute()
+        unassign_from_others = await supabase_async_client.table("agents").update({"phone_numbers_id": None}).eq("phone_numbers_id", phone_number_id).neq("id", agent_id_to_assign).execute()
         if unassign_from_others.data:
             logger.info(f"Unassigned phone number {phone_number_id} from {len(unassign_from_others.data)} other agents")
             
@@ -2088,11 +2118,11 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
         update_payload = {
             "phone_numbers_id": phone_number_id
         }
-        update_response = supabase_service_client.table("agents").update(update_payload).eq("id", agent_id_to_assign).execute()
+        update_response = await supabase_async_client.table("agents").update(update_payload).eq("id", agent_id_to_assign).execute()
 
         if update_response.data and len(update_response.data) > 0:
             # Also update the phone number status to "ASSIGNED"
-            phone_status_update = supabase_service_client.table("phone_numbers").update({
+            phone_status_update = await supabase_async_client.table("phone_numbers").update({
                 "status": "ASSIGNED",
                 "updated_at": datetime.utcnow().isoformat()
             }).eq("id", phone_number_id).execute()
@@ -2110,7 +2140,7 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
                 # Check if the assigned agent supports inbound calls
                 if agent_info.get("supports_inbound", False) and agent_info.get("status") == "active":
                     # Check if inbound is already enabled for this number
-                    phone_details_response = supabase_service_client.table("phone_numbers").select(
+                    phone_details_response = await supabase_async_client.table("phone_numbers").select(
                         "supports_inbound, phone_number_e164, users_id"
                     ).eq("id", phone_number_id).single().execute()
                     
@@ -2129,7 +2159,7 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
                             
                             if inbound_enabled:
                                 # Update the inbound_agent_id to the specific assigned agent
-                                supabase_service_client.table("phone_numbers").update({
+                                await supabase_async_client.table("phone_numbers").update({
                                     "inbound_agent_id": agent_id_to_assign
                                 }).eq("id", phone_number_id).execute()
                                 
@@ -2138,7 +2168,7 @@ async def assign_agent_to_number(pam_phone_number_id: str, request_body: AssignA
                                 logger.warning(f"Failed to auto-enable inbound calling for number {phone_number_id}")
                         else:
                             # Update the inbound agent assignment to the newly assigned agent
-                            supabase_service_client.table("phone_numbers").update({
+                            await supabase_async_client.table("phone_numbers").update({
                                 "inbound_agent_id": agent_id_to_assign
                             }).eq("id", phone_number_id).execute()
                             inbound_enabled = True
@@ -2185,7 +2215,7 @@ async def list_user_telnyx_numbers(request: ListUserTelnyxNumbersRequest):
         logger.info(f"Successfully retrieved {len(user_numbers)} numbers from user's Telnyx account")
         
         # Step 2: Get all numbers already connected to PAM for this user
-        connected_numbers_response = supabase_service_client.table("phone_numbers").select(
+        connected_numbers_response = await supabase_async_client.table("phone_numbers").select(
             "phone_number_e164"
         ).eq("users_id", request.user_pam_id).execute()
         
@@ -2248,7 +2278,7 @@ async def recreate_livekit_trunk_with_credentials(request: RecreatelivekitTrunkR
 
     try:
         # Step 1: Get credentials from Supabase
-        phone_numbers_response = supabase_service_client.table("phone_numbers").select(
+        phone_numbers_response = await supabase_async_client.table("phone_numbers").select(
             "id, telnyx_sip_username, telnyx_sip_password_clear, phone_number_e164, telnyx_connection_id"
         ).eq("livekit_sip_trunk_id", trunk_id_to_recreate).execute()
 
@@ -2298,7 +2328,7 @@ async def recreate_livekit_trunk_with_credentials(request: RecreatelivekitTrunkR
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        update_response = supabase_service_client.table("phone_numbers").update(update_payload).eq("id", phone_number_id).execute()
+        update_response = await supabase_async_client.table("phone_numbers").update(update_payload).eq("id", phone_number_id).execute()
 
         if not update_response.data:
             logger.error(f"Failed to update phone_numbers record {phone_number_id} with new trunk ID {new_trunk_id}")
@@ -2322,9 +2352,11 @@ async def recreate_livekit_trunk_with_credentials(request: RecreatelivekitTrunkR
         raise HTTPException(status_code=500, detail=f"Error recreating LiveKit trunk: {str(e)}")
 
 @router.post("/livekit/list-trunks", summary="List all LiveKit SIP trunks")
-async def list_livekit_trunks():
-    """List all LiveKit SIP trunks for debugging."""
+async def list_livekit_trunks(phone_number_e164: Optional[str] = None):
+    """List all LiveKit SIP trunks for debugging, or only the trunks carrying phone_number_e164."""
     try:
+        if phone_number_e164:
+            return {"trunks": await _find_livekit_trunks_for_number(phone_number_e164)}
         trunks = await livekit_client.list_sip_trunks()
         return {"trunks": trunks}
     except Exception as e:
@@ -2339,7 +2371,7 @@ async def mark_number_configured(pam_phone_number_id: str):
     """
     try:
         # Update phone number status in Supabase
-        response = supabase_service_client.table("phone_numbers").update({
+        response = await supabase_async_client.table("phone_numbers").update({
             "status": "active",
             "is_configured_for_inbound": True # Optional: for clarity in DB
         }).eq("id", pam_phone_number_id).execute()
@@ -2381,7 +2413,7 @@ async def auto_enable_inbound_for_new_number(
         # 2. Set up SIP trunks for inbound calls
         # 3. Configure routing rules
         
-        response = supabase_service_client.table("phone_numbers").update({
+        response = await supabase_async_client.table("phone_numbers").update({
             "is_configured_for_inbound": True,
             "status": "active",
             "updated_at": datetime.now(timezone.utc).isoformat()
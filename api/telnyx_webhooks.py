@@ -0,0 +1,416 @@
+"""
+Telnyx webhook processing.
+
+/webhook/telnyx acknowledges every event immediately and hands it to the in-process
+dispatcher below, so slow Supabase round-trips no longer make Telnyx retry (and
+duplicate) deliveries. Redelivered events are dropped by event id, and calls are
+linked to their Telnyx call_control_id through an in-memory index filled at dial
+time, with the previous Supabase lookups kept as fallback.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .db_client import supabase_async_client
+from .live_call_registry import live_call_registry
+
+logger = logging.getLogger(__name__)
+
+TELNYX_WEBHOOK_WORKERS = int(os.getenv("TELNYX_WEBHOOK_WORKERS", "4"))
+TELNYX_WEBHOOK_QUEUE_MAX_SIZE = int(os.getenv("TELNYX_WEBHOOK_QUEUE_MAX_SIZE", "10000"))
+# Number of recent event ids remembered to drop redeliveries (oldest forgotten first)
+TELNYX_WEBHOOK_DEDUP_MAX_SIZE = int(os.getenv("TELNYX_WEBHOOK_DEDUP_MAX_SIZE", "50000"))
+CALL_CONTROL_INDEX_MAX_SIZE = int(os.getenv("CALL_CONTROL_INDEX_MAX_SIZE", "20000"))
+
+# Call status written for the hangup_cause of a call.hangup; other non-empty causes
+# (call_rejected, not_found, unallocated_number...) mean the call failed
+HANGUP_CAUSE_STATUSES = {
+    "normal_clearing": "completed",
+    "time_limit": "completed",
+    "user_busy": "busy",
+    "no_answer": "no_answer",
+    "no_user_response": "no_answer",
+    "timeout": "no_answer",
+    "originator_cancel": "no_answer",
+}
+
+
+def call_status_from_hangup_cause(hangup_cause: Optional[str]) -> str:
+    if not hangup_cause:
+        return "completed"
+    return HANGUP_CAUSE_STATUSES.get(hangup_cause.lower(), "failed")
+
+
+class CallControlIndex:
+    """
+    In-memory links between Telnyx calls and rows of the 'calls' table.
+
+    - call_control_id -> call id, registered as soon as either side learns it
+      (agent status update, first resolved webhook).
+    - to_phone_number -> call id of the latest call dialed to that number and not yet
+      linked, registered when the call row is created and claimed by its call.initiated.
+    """
+
+    def __init__(self, max_size: int = CALL_CONTROL_INDEX_MAX_SIZE):
+        self.max_size = max_size
+        self._call_ids: "OrderedDict[str, Any]" = OrderedDict()
+        self._dialed: "OrderedDict[str, Any]" = OrderedDict()
+        # Shared by the request loop and the scheduler threads
+        self._lock = threading.Lock()
+
+    def _put(self, mapping: OrderedDict, key: str, value: Any) -> None:
+        with self._lock:
+            mapping[key] = value
+            mapping.move_to_end(key)
+            while len(mapping) > self.max_size:
+                mapping.popitem(last=False)
+
+    def register(self, call_control_id: Optional[str], call_id: Any) -> None:
+        if call_control_id and call_id:
+            self._put(self._call_ids, call_control_id, call_id)
+
+    def register_dial(self, to_phone_number: Optional[str], call_id: Any) -> None:
+        if to_phone_number and call_id:
+            self._put(self._dialed, to_phone_number, call_id)
+
+    def get(self, call_control_id: str) -> Optional[Any]:
+        with self._lock:
+            return self._call_ids.get(call_control_id)
+
+    def claim_dial(self, to_phone_number: str) -> Optional[Any]:
+        with self._lock:
+            return self._dialed.pop(to_phone_number, None)
+
+
+call_control_index = CallControlIndex()
+
+
+class TelnyxWebhookDispatcher:
+    """
+    Acknowledge-then-process queue for Telnyx webhooks.
+
+    Events are sharded by call_control_id over TELNYX_WEBHOOK_WORKERS queues, so the
+    events of one call are still applied in order while different calls are processed
+    concurrently. Workers start lazily on the loop of the first submitted event.
+    """
+
+    def __init__(self, workers: int = TELNYX_WEBHOOK_WORKERS, max_size: int = TELNYX_WEBHOOK_QUEUE_MAX_SIZE):
+        self.worker_count = max(1, workers)
+        self.max_size = max_size
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seen_event_ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queues = [asyncio.Queue(maxsize=self.max_size) for _ in range(self.worker_count)]
+        self._workers = [loop.create_task(self._run(queue)) for queue in self._queues]
+        logger.info(f"Telnyx webhook dispatcher started with {self.worker_count} workers")
+
+    def _is_duplicate(self, event_id: Optional[str]) -> bool:
+        if not event_id:
+            return False
+        if event_id in self._seen_event_ids:
+            return True
+        self._seen_event_ids[event_id] = None
+        if len(self._seen_event_ids) > TELNYX_WEBHOOK_DEDUP_MAX_SIZE:
+            self._seen_event_ids.popitem(last=False)
+        return False
+
+    async def submit(self, data: Dict[str, Any]) -> str:
+        """Queue a webhook event; returns "queued", "duplicate" or "processed" (queue full)"""
+        if self._is_duplicate(data.get("id")):
+            return "duplicate"
+
+        self._ensure_workers()
+        payload = data.get("payload") or {}
+        shard_key = payload.get("call_control_id") or payload.get("call_session_id") or data.get("id") or ""
+        queue = self._queues[zlib.crc32(str(shard_key).encode()) % self.worker_count]
+        try:
+            queue.put_nowait(data)
+            return "queued"
+        except asyncio.QueueFull:
+            # Rather than drop the event, process it within the request
+            logger.warning("Telnyx webhook queue full, processing event inline")
+            await _process_safely(data)
+            return "processed"
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            data = await queue.get()
+            try:
+                await _process_safely(data)
+            finally:
+                queue.task_done()
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Process what is already queued, then stop the workers (app shutdown)"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout=timeout)
+        except asyncio.TimeoutError:
+            pending = sum(queue.qsize() for queue in self._queues)
+            logger.warning(f"Telnyx webhook dispatcher stopped with {pending} events still queued")
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+
+telnyx_webhook_dispatcher = TelnyxWebhookDispatcher()
+
+
+async def _process_safely(data: Dict[str, Any]) -> None:
+    try:
+        await process_telnyx_webhook_event(data)
+    except Exception as e:
+        logger.error(f"Erreur globale lors du traitement du webhook Telnyx: {e}", exc_info=True)
+
+
+async def process_telnyx_webhook_event(data: Dict[str, Any]) -> None:
+    """
+    Applies a Telnyx webhook event (number orders and call events) to Supabase.
+    """
+    logger.info(f"Webhook Telnyx reçu: Event: {data.get('event_type')}, Full Data: {data}")
+    
+    event_type = data.get("event_type")
+    payload = data.get("payload", {})
+    call_control_id = payload.get("call_control_id") 
+    
+    if not event_type:
+        logger.warning("Webhook Telnyx incomplet: event_type manquant.")
+        return
+        
+    supabase_call_id_to_update = None
+    
+    # Tentative 1: Extraire supabase_call_id depuis client_state
+    client_state_base64 = payload.get("client_state")
+    if client_state_base64:
+        try:
+            client_state_bytes = client_state_base64.encode('utf-8')
+            decoded_client_state = base64.b64decode(client_state_bytes).decode('utf-8')
+            if decoded_client_state.isdigit():
+                supabase_call_id_to_update = int(decoded_client_state)
+                logger.info(f"Supabase Call ID '{supabase_call_id_to_update}' extrait de client_state.")
+            else:
+                # Try to match if it's a UUID (string) directly
+                try:
+                    uuid_obj = uuid.UUID(decoded_client_state, version=4) # Check if it's a valid UUID string
+                    supabase_call_id_to_update = str(uuid_obj) # Keep as string if it's a UUID
+                    logger.info(f"Supabase Call ID (UUID) '{supabase_call_id_to_update}' extrait de client_state.")
+                except ValueError:
+                    logger.warning(f"client_state décodé ('{decoded_client_state}') ne semble pas être un ID Supabase valide (entier ou UUID). Ignoré.")
+        except Exception as e:
+            logger.error(f"Erreur de décodage client_state: {e}. client_state reçu: {client_state_base64}")
+    
+    update_data_for_supabase = {}
+    is_number_order_event = event_type.startswith("number.order.")
+
+    if is_number_order_event:
+        logger.info(f"Traitement Webhook: Événement de commande de numéro '{event_type}'.")
+        telnyx_number_id_from_payload = None
+        
+        # Extraire telnyx_number_id du payload spécifique aux commandes de numéro
+        if event_type == "number.order.phone_number.updated" or event_type == "number.order.completed":
+             if "id" in payload and event_type == "number.order.phone_number.updated":
+                 telnyx_number_id_from_payload = payload.get("id")
+             elif "phone_numbers" in payload and isinstance(payload["phone_numbers"], list) and payload["phone_numbers"]:
+                 telnyx_number_id_from_payload = payload["phone_numbers"][0].get("id")
+
+        if not telnyx_number_id_from_payload and "number_order_phone_number_id" in payload: 
+            telnyx_number_id_from_payload = payload.get("number_order_phone_number_id")
+        
+        if not telnyx_number_id_from_payload:
+            logger.warning(f"Webhook '{event_type}': Impossible d'extraire telnyx_number_id du payload: {payload}. Mise à jour Supabase impossible.")
+            return
+
+        logger.info(f"Webhook '{event_type}': Recherche dans Supabase table 'phone_numbers' par 'telnyx_number_id' = '{telnyx_number_id_from_payload}'.")
+        pn_response = await supabase_async_client.table("phone_numbers").select("id, status, telnyx_connection_id").eq("telnyx_number_id", telnyx_number_id_from_payload).maybe_single().execute()
+
+        if pn_response.data:
+            supabase_phone_number_id = pn_response.data.get("id")
+            phone_number_update_payload = {}
+            new_status_from_webhook = payload.get("status")
+            if event_type == "number.order.phone_number.updated" and "status" in payload:
+                new_status_from_webhook = payload.get("status")
+            elif event_type == "number.order.completed":
+                new_status_from_webhook = "active"
+                # For number.order.completed, also extract the actual phone number if available
+                if "phone_numbers" in payload and isinstance(payload["phone_numbers"], list) and payload["phone_numbers"]:
+                    phone_number_e164_from_order = payload["phone_numbers"][0].get("phone_number")
+                    if phone_number_e164_from_order:
+                        phone_number_update_payload["phone_number_e164"] = phone_number_e164_from_order
+                        logger.info(f"Webhook 'number.order.completed': Extracted phone_number_e164 '{phone_number_e164_from_order}' for update.")
+
+            if new_status_from_webhook and new_status_from_webhook != pn_response.data.get("status"):
+                phone_number_update_payload["status"] = new_status_from_webhook
+            
+            telnyx_connection_id_from_webhook = None
+            if "voice" in payload and payload["voice"] and "connection_id" in payload["voice"]:
+                 telnyx_connection_id_from_webhook = payload["voice"]["connection_id"]
+            elif "connection_id" in payload:
+                 telnyx_connection_id_from_webhook = payload.get("connection_id")
+
+            if telnyx_connection_id_from_webhook and telnyx_connection_id_from_webhook != pn_response.data.get("telnyx_connection_id"):
+                phone_number_update_payload["telnyx_connection_id"] = telnyx_connection_id_from_webhook
+            
+            if phone_number_update_payload: # Only update if there are changes
+                phone_number_update_payload["updated_at"] = datetime.utcnow().isoformat()
+                logger.info(f"Webhook '{event_type}': Envoi PATCH à Supabase 'phone_numbers' ID {supabase_phone_number_id} avec données: {phone_number_update_payload}")
+                update_pn_response = await supabase_async_client.table("phone_numbers").update(phone_number_update_payload).eq("id", supabase_phone_number_id).execute()
+                if update_pn_response.data:
+                    logger.info(f"Webhook '{event_type}': Enregistrement Supabase 'phone_numbers' ID {supabase_phone_number_id} mis à jour: {update_pn_response.data[0]}")
+                elif update_pn_response.error:
+                     logger.error(f"Webhook '{event_type}': Erreur Supabase MAJ 'phone_numbers' ID {supabase_phone_number_id}: {update_pn_response.error.message}")
+            else:
+                logger.info(f"Webhook '{event_type}': Pas de données nouvelles à mettre à jour pour Supabase 'phone_numbers' ID {supabase_phone_number_id}.")
+        else:
+            logger.warning(f"Webhook '{event_type}': Aucun enregistrement 'phone_numbers' trouvé pour telnyx_number_id '{telnyx_number_id_from_payload}'.")
+    
+        return
+    
+    # --- Logique pour les événements d'appel (non-commande de numéro) ---
+    if not call_control_id and event_type in ["call.initiated", "call.answered", "call.hangup"]:
+        logger.warning(f"Webhook '{event_type}' reçu sans call_control_id.")
+        if not supabase_call_id_to_update:
+             logger.warning(f"Impossible de lier '{event_type}' à un appel Supabase sans call_control_id ou client_state valide.")
+             return
+    
+    if not supabase_call_id_to_update and call_control_id:
+        supabase_call_id_to_update = call_control_index.get(call_control_id)
+        if supabase_call_id_to_update:
+            logger.info(f"Webhook '{event_type}': Supabase Call ID '{supabase_call_id_to_update}' trouvé dans l'index call_control_id en mémoire.")
+
+    if not supabase_call_id_to_update and call_control_id:
+        logger.info(f"Webhook '{event_type}': supabase_call_id non trouvé via client_state ni en mémoire. Recherche dans Supabase 'calls' par 'call_control_id' = '{call_control_id}'.")
+        try:
+            call_record_response = await supabase_async_client.table("calls").select("id").eq("call_control_id", call_control_id).maybe_single().execute()
+            if call_record_response.data:
+                supabase_call_id_to_update = call_record_response.data.get("id")
+                logger.info(f"Webhook '{event_type}': Supabase Call ID '{supabase_call_id_to_update}' trouvé par recherche sur call_control_id.")
+            else:
+                logger.info(f"Webhook '{event_type}': Aucun enregistrement 'calls' existant trouvé dans Supabase avec 'call_control_id' = '{call_control_id}'.")
+                # If call.initiated and not found by call_control_id, it might be a very new call.
+                # The agent.py will send supabase_call_id in X-Client-State, which is preferred.
+                # If that failed or this is a direct Telnyx originated call (e.g. inbound not via Pam agent), this lookup path is important.
+        except Exception as e_search_ccid:
+            logger.error(f"Webhook '{event_type}': Exception lors de la recherche Supabase 'calls' par call_control_id: {e_search_ccid}", exc_info=True)
+
+    if not supabase_call_id_to_update and event_type == "call.initiated":
+        direction = payload.get("direction")
+        if direction == "outbound":
+            to_phone_number = payload.get("to")
+            if to_phone_number:
+                supabase_call_id_to_update = call_control_index.claim_dial(to_phone_number)
+                if supabase_call_id_to_update:
+                    logger.info(f"Webhook 'call.initiated': Liaison réussie via les appels composés en mémoire. Supabase Call ID '{supabase_call_id_to_update}' choisi pour '{to_phone_number}'.")
+            if to_phone_number and not supabase_call_id_to_update:
+                logger.info(f"Webhook 'call.initiated': supabase_call_id non identifié. Tentative de liaison par numéro '{to_phone_number}' et statut 'initiating'/'dialing'.")
+                try:
+                    possible_calls_response = await supabase_async_client.table("calls") \
+                        .select("id, created_at") \
+                        .eq("to_phone_number", to_phone_number) \
+                        .is_("call_control_id", None) \
+                        .in_("status", ["initiating", "dialing"]) \
+                        .order("created_at", desc=True) \
+                        .limit(1) \
+                        .execute()
+                    
+                    if possible_calls_response.data:
+                        call_to_link = possible_calls_response.data[0]
+                        supabase_call_id_to_update = call_to_link.get("id")
+                        logger.info(f"Webhook 'call.initiated': Liaison réussie. Supabase Call ID '{supabase_call_id_to_update}' choisi pour '{to_phone_number}'.")
+                    else:
+                        logger.warning(f"Webhook 'call.initiated': Aucun appel Supabase à lier trouvé pour '{to_phone_number}'.")
+                except Exception as e_link_initiated:
+                    logger.error(f"Webhook 'call.initiated': Exception lors de la tentative de liaison: {e_link_initiated}", exc_info=True)
+            elif not to_phone_number:
+                logger.warning(f"Webhook 'call.initiated': Numéro 'to' manquant dans payload pour liaison.")
+        else:
+            logger.info(f"Webhook 'call.initiated' reçu pour un appel non sortant (direction: {direction}). Ignoré car la gestion des appels entrants est supprimée.")
+
+    if supabase_call_id_to_update and call_control_id:
+        # Later events of this call are linked without a query
+        call_control_index.register(call_control_id, supabase_call_id_to_update)
+
+    # Préparer les données à envoyer à Supabase pour les événements d'appel
+    # Add Telnyx call_session_id if available, maps to telnyx_call_session_id in Supabase
+    telnyx_call_session_id = payload.get("call_session_id")
+    if telnyx_call_session_id:
+        update_data_for_supabase["telnyx_call_session_id"] = telnyx_call_session_id
+
+    if call_control_id:
+         update_data_for_supabase["call_control_id"] = call_control_id
+
+    if event_type == "call.initiated":
+        logger.info(f"Traitement Webhook: Appel initié (Supabase ID: {supabase_call_id_to_update or 'Non lié'})")
+        update_data_for_supabase["initiated_at"] = data.get("occurred_at")
+        update_data_for_supabase["from_phone_number"] = payload.get("from")
+        # update_data_for_supabase["status"] = "dialing" # Optionnel
+        
+    elif event_type == "call.answered":
+        logger.info(f"Traitement Webhook: Appel répondu (Supabase ID: {supabase_call_id_to_update or 'Non lié'})")
+        update_data_for_supabase["answered_at"] = data.get("occurred_at")
+        update_data_for_supabase["status"] = "active"
+        
+    elif event_type == "call.hangup":
+        logger.info(f"Traitement Webhook: Appel terminé (Supabase ID: {supabase_call_id_to_update or 'Non lié'})")
+        update_data_for_supabase["ended_at"] = payload.get("end_time") 
+        update_data_for_supabase["ended_reason"] = payload.get("hangup_cause", "")
+        # Busy, unanswered and rejected calls must not end their batch call item as completed
+        update_data_for_supabase["status"] = call_status_from_hangup_cause(payload.get("hangup_cause"))
+        start_time_str = payload.get("start_time")
+        end_time_str = payload.get("end_time")
+        if start_time_str and end_time_str:
+            try:
+                start_dt = datetime.fromisoformat(start_time_str.replace("Z", "+00:00"))
+                end_dt = datetime.fromisoformat(end_time_str.replace("Z", "+00:00"))
+                call_duration_webhook = int((end_dt - start_dt).total_seconds())
+                update_data_for_supabase["call_duration"] = call_duration_webhook
+                logger.info(f"Webhook 'call.hangup': Durée calculée: {call_duration_webhook}s")
+            except Exception as e_dur:
+                logger.error(f"Webhook 'call.hangup': Erreur calcul durée: {e_dur}")
+    
+    # Mettre à jour la table 'calls' dans Supabase (Partie commentée pour ce step)
+    if supabase_call_id_to_update:
+        update_data_for_supabase["updated_at"] = datetime.utcnow().isoformat()
+        if len(update_data_for_supabase) > 1: 
+            logger.info(f"Webhook '{event_type}': Données préparées pour Supabase 'calls' ID {supabase_call_id_to_update}: {update_data_for_supabase}")
+            try:
+                final_update_response = await supabase_async_client.table("calls").update(update_data_for_supabase).eq("id", supabase_call_id_to_update).execute()
+                if final_update_response.data:
+                    live_call_registry.record_call_row(final_update_response.data[0])
+                    if event_type == "call.hangup" and final_update_response.data[0].get("batch_call_item_id"):
+                        # Imported here: batch_routes imports this module through call_initiation
+                        from .batch_routes import update_batch_call_item_from_call_status
+                        await update_batch_call_item_from_call_status(
+                            supabase_call_id_to_update,
+                            update_data_for_supabase["status"],
+                            update_data_for_supabase.get("call_duration"),
+                            call_data=final_update_response.data[0],
+                        )
+                    logger.info(f"Webhook '{event_type}': Enregistrement Supabase 'calls' ID {supabase_call_id_to_update} mis à jour: {final_update_response.data[0]}")
+                elif final_update_response.error:
+                    logger.error(f"Webhook '{event_type}': Erreur Supabase MAJ 'calls' ID {supabase_call_id_to_update}: {final_update_response.error.message}")
+                # Consider case where update doesn't return data but also no error (e.g. record not found by eq)
+                else:
+                    logger.warning(f"Webhook '{event_type}': Supabase update for 'calls' ID {supabase_call_id_to_update} returned no data and no error.")
+            except Exception as e_final_update:
+                logger.error(f"Webhook '{event_type}': Erreur Supabase générique MAJ 'calls' ID {supabase_call_id_to_update}: {e_final_update}", exc_info=True)
+        else:
+            logger.info(f"Webhook '{event_type}': Pas de données nouvelles (autres que updated_at) à mettre à jour pour Supabase 'calls' ID {supabase_call_id_to_update}.")
+    else:
+        logger.warning(f"Webhook Appel '{event_type}': supabase_call_id non identifié. Aucune mise à jour Supabase 'calls'. Webhook Data: {data}")
+        
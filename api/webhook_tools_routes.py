@@ -165,7 +165,7 @@ async def create_webhook(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Create a new webhook"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Check for duplicate webhook name
     existing_webhook = supabase_service_client.table("webhooks").select("id").eq("user_id", user_id).eq("name", request.name).execute()
@@ -205,7 +205,7 @@ async def list_webhooks(
     offset: int = 0
 ):
     """List user's webhooks"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     query = supabase_service_client.table("webhooks").select("*").eq("user_id", user_id)
     
@@ -222,7 +222,7 @@ async def get_webhook(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Get webhook details"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     result = supabase_service_client.table("webhooks").select("*").eq("id", webhook_id).eq("user_id", user_id).single().execute()
     
@@ -238,7 +238,7 @@ async def update_webhook(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Update webhook configuration"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Verify webhook ownership
     webhook = supabase_service_client.table("webhooks").select("*").eq("id", webhook_id).eq("user_id", user_id).single().execute()
@@ -276,7 +276,7 @@ async def delete_webhook(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Delete a webhook"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Verify webhook ownership and delete
     result = supabase_service_client.table("webhooks").delete().eq("id", webhook_id).eq("user_id", user_id).execute()
@@ -294,7 +294,7 @@ async def test_webhook(
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """Test webhook execution with mock data"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Get webhook details
     webhook_result = supabase_service_client.table("webhooks").select("*").eq("id", webhook_id).eq("user_id", user_id).single().execute()
@@ -332,7 +332,7 @@ async def execute_webhook(
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """Execute webhook in production context"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Get webhook details
     webhook_result = supabase_service_client.table("webhooks").select("*").eq("id", webhook_id).eq("user_id", user_id).single().execute()
@@ -367,7 +367,7 @@ async def get_webhook_executions(
     offset: int = 0
 ):
     """Get webhook execution history"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Verify webhook ownership
     webhook = supabase_service_client.table("webhooks").select("id").eq("id", webhook_id).eq("user_id", user_id).single().execute()
@@ -389,7 +389,7 @@ async def get_webhooks_usage_analytics(
     days: int = 30
 ):
     """Get webhooks usage analytics"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Get usage statistics
     end_date = datetime.now(timezone.utc)
@@ -437,7 +437,7 @@ async def get_agent_webhooks(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Get webhooks available to a specific agent"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Get all enabled webhooks for user
     result = supabase_service_client.table("webhooks").select("*").eq("user_id", user_id).eq("is_enabled", True).execute()
@@ -458,7 +458,7 @@ async def assign_webhooks_to_agent(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Assign specific webhooks to an agent"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Verify agent ownership (if agent exists in agents table)
     try:
@@ -487,7 +487,7 @@ async def remove_webhook_from_agent(
     authorization: str = Header(None, alias="Authorization")
 ):
     """Remove webhook from agent"""
-    user_id = get_user_id_from_token(authorization)
+    user_id = await get_user_id_from_token(authorization)
     
     # Get webhook and update allowed_agents
     webhook = supabase_service_client.table("webhooks").select("allowed_agents").eq("id", webhook_id).eq("user_id", user_id).single().execute()
@@ -509,7 +509,7 @@ async def get_execution_result(
     """Get execution result by execution ID"""
     try:
         logger.info(f"Getting execution result for ID: {execution_id}")
-        user_id = get_user_id_from_token(authorization)
+        user_id = await get_user_id_from_token(authorization)
         logger.info(f"User ID: {user_id}")
         
         # Get execution result
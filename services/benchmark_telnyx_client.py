@@ -0,0 +1,124 @@
+"""
+Telnyx client latency benchmark
+
+Compares the previous behaviour of _make_telnyx_request (a new httpx.AsyncClient,
+hence a new connection, for every call) with the pooled keep-alive client, against a
+local stub server so no Telnyx credentials or network access are needed.
+
+Usage:
+    python -m services.benchmark_telnyx_client --requests 200 --concurrency 10
+
+Against the real API the gap is larger than measured here: every fresh connection
+also pays DNS resolution and a TLS handshake with api.telnyx.com.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from services import telnyx_service
+
+
+class _StubTelnyxHandler(BaseHTTPRequestHandler):
+    """Answers every request like an empty Telnyx list endpoint, keeping connections alive"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"data": [], "meta": {"total_results": 0}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_stub_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubTelnyxHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _request_with_fresh_client(url: str):
+    # Previous behaviour: one client (and connection) per Telnyx call
+    async with httpx.AsyncClient(timeout=20.0) as client:
+        response = await client.get(url, headers={"Authorization": "Bearer stub"})
+        response.raise_for_status()
+        return response.json()
+
+
+async def _request_with_pooled_client():
+    return await telnyx_service._make_telnyx_request("GET", "phone_numbers", api_key="stub")
+
+
+async def _measure(label: str, make_request, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            started = time.perf_counter()
+            await make_request()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(total)))
+    wall_ms = (time.perf_counter() - wall_started) * 1000
+
+    latencies.sort()
+    return {
+        "label": label,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "wall_ms": wall_ms,
+    }
+
+
+async def run_benchmark(total: int, concurrency: int):
+    server = _start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v2"
+    telnyx_service.TELNYX_API_BASE_URL = base_url
+
+    try:
+        # Warm up both paths once so imports and first connection are not measured
+        await _request_with_fresh_client(f"{base_url}/phone_numbers")
+        await _request_with_pooled_client()
+
+        results = [
+            await _measure("fresh client per request", lambda: _request_with_fresh_client(f"{base_url}/phone_numbers"), total, concurrency),
+            await _measure("pooled keep-alive client", _request_with_pooled_client, total, concurrency),
+        ]
+    finally:
+        await telnyx_service.close_telnyx_http_client()
+        server.shutdown()
+
+    print(f"\n{total} requests, concurrency {concurrency}, HTTP/2 available: {telnyx_service.TELNYX_HTTP2_AVAILABLE}")
+    print(f"{'client':<28}{'mean':>10}{'p50':>10}{'p95':>10}{'wall':>12}")
+    for result in results:
+        print(
+            f"{result['label']:<28}{result['mean_ms']:>8.2f}ms{result['p50_ms']:>8.2f}ms"
+            f"{result['p95_ms']:>8.2f}ms{result['wall_ms']:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pooled Telnyx HTTP client against a local stub")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    # _make_telnyx_request and httpx log every request at INFO
+    logging.getLogger("services.telnyx_service").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(run_benchmark(args.requests, args.concurrency))
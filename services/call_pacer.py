@@ -0,0 +1,99 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Calls per second allowed per outbound SIP trunk and per caller ID (0 disables the limit).
+# Keep them a little under the carrier limits: the bucket paces at exactly this rate.
+CALL_PACING_TRUNK_CPS = float(os.getenv("CALL_PACING_TRUNK_CPS", "8"))
+CALL_PACING_TRUNK_BURST = float(os.getenv("CALL_PACING_TRUNK_BURST", "2"))
+CALL_PACING_CALLER_ID_CPS = float(os.getenv("CALL_PACING_CALLER_ID_CPS", "1"))
+CALL_PACING_CALLER_ID_BURST = float(os.getenv("CALL_PACING_CALLER_ID_BURST", "1"))
+
+# The buckets live in each uvicorn worker: the rates and bursts above are shared out
+# between the WEB_CONCURRENCY workers of a container, so a worker's burst may be a
+# fraction of a call and the workers together never exceed the configured burst.
+# Several containers still add up.
+CALL_PACING_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``burst`` tokens.
+
+    Tokens are reserved rather than awaited under a lock: a caller that finds the
+    bucket empty takes a token from the future and sleeps until it is due, so
+    waiters are served in arrival order from any thread or event loop. ``burst``
+    may be below one: the bucket then never holds a whole token and every call
+    waits for the missing fraction to refill.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(0.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return the number of seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CallPacer:
+    """Process-wide call pacing keyed by outbound SIP trunk and caller ID (rates are per worker)"""
+
+    def __init__(self, trunk_rate: float, trunk_burst: float, caller_id_rate: float, caller_id_burst: float):
+        self.trunk_rate = trunk_rate
+        self.trunk_burst = trunk_burst
+        self.caller_id_rate = caller_id_rate
+        self.caller_id_burst = caller_id_burst
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, kind: str, key: Optional[str], rate: float, burst: float) -> Optional[TokenBucket]:
+        if not key or rate <= 0:
+            return None
+        with self._lock:
+            bucket = self._buckets.get((kind, key))
+            if bucket is None:
+                bucket = self._buckets[(kind, key)] = TokenBucket(rate, burst)
+            return bucket
+
+    async def acquire(self, trunk_id: Optional[str], caller_id: Optional[str]) -> float:
+        """Wait until a call may be originated on this trunk with this caller ID; returns the seconds waited.
+
+        The caller ID bucket is waited on first and the trunk token only reserved
+        afterwards, so the trunk sees calls at its own rate whatever the caller ID delays.
+        """
+        waited = 0.0
+        for kind, key, rate, burst in (
+            ("caller_id", caller_id, self.caller_id_rate, self.caller_id_burst),
+            ("trunk", trunk_id, self.trunk_rate, self.trunk_burst),
+        ):
+            bucket = self._bucket(kind, key, rate, burst)
+            if bucket is None:
+                continue
+            delay = bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+        if waited:
+            logger.debug(f"Paced call on trunk {trunk_id} / caller ID {caller_id} by {waited:.2f}s")
+        return waited
+
+
+call_pacer = CallPacer(
+    CALL_PACING_TRUNK_CPS / CALL_PACING_WORKERS,
+    CALL_PACING_TRUNK_BURST / CALL_PACING_WORKERS,
+    CALL_PACING_CALLER_ID_CPS / CALL_PACING_WORKERS,
+    CALL_PACING_CALLER_ID_BURST / CALL_PACING_WORKERS,
+)
@@ -0,0 +1,39 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# A dependency with no request result more recent than this is reported as unknown
+DEPENDENCY_HEALTH_MAX_AGE_SECONDS = float(os.getenv("DEPENDENCY_HEALTH_MAX_AGE_SECONDS", "300"))
+
+
+class DependencyHealth:
+    """Outcome of the latest request this process made to each external dependency.
+
+    A request counts as failed when the dependency could not be reached or answered
+    with a server error; client errors (4xx) say nothing about its health.
+    """
+
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        # name -> (ok, time.monotonic() of the result)
+        self._results: Dict[str, Tuple[bool, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, ok: bool):
+        with self._lock:
+            self._results[name] = (ok, time.monotonic())
+
+    def record_status_code(self, name: str, status_code: Optional[int]):
+        self.record(name, status_code is not None and status_code < 500)
+
+    def status(self, name: str) -> str:
+        """'healthy', 'unhealthy', or 'unknown' without a recent result"""
+        with self._lock:
+            result = self._results.get(name)
+        if result is None or time.monotonic() - result[1] > self.max_age_seconds:
+            return "unknown"
+        return "healthy" if result[0] else "unhealthy"
+
+
+dependency_health = DependencyHealth(DEPENDENCY_HEALTH_MAX_AGE_SECONDS)
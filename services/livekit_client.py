@@ -2,9 +2,17 @@ import os
 import httpx
 import logging
 import json
+import uuid
+import asyncio
+import time
+import threading
+import weakref
+from datetime import timedelta
 from typing import List, Dict, Any, Optional
 from livekit import api # Revert to using livekit.api for AccessToken and grants
 
+from services.dependency_health import dependency_health
+
 # Try to import SIP service classes, but make it conditional for different LiveKit versions
 try:
     from livekit.api.sip_service import SIPOutboundTrunkUpdate, UpdateSIPOutboundTrunkRequest
@@ -65,6 +73,104 @@ class LiveKitTrunkNotFoundError(LiveKitServiceError):
     pass
 
 
+# --- Shared LiveKit API client ---
+# LiveKitAPI keeps an aiohttp session (connection pool) that belongs to the event loop
+# it was created on, so one client is kept per running loop and reused by every call.
+_livekit_api_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, api.LiveKitAPI]" = weakref.WeakKeyDictionary()
+
+def get_livekit_api() -> api.LiveKitAPI:
+    """Returns the LiveKitAPI client shared by the running event loop."""
+    if not LIVEKIT_API_URL or not LIVEKIT_API_KEY or not LIVEKIT_API_SECRET:
+        logger.error("LiveKit API URL, Key, or Secret is not configured.")
+        raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
+
+    loop = asyncio.get_running_loop()
+    lk_api_client = _livekit_api_clients.get(loop)
+    if lk_api_client is None:
+        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        _livekit_api_clients[loop] = lk_api_client
+        logger.info("Shared LiveKit API client created for current event loop.")
+    return lk_api_client
+
+async def close_livekit_api():
+    """Closes the shared LiveKit clients of the running event loop (app shutdown)."""
+    lk_api_client = _livekit_api_clients.pop(asyncio.get_running_loop(), None)
+    if lk_api_client:
+        await lk_api_client.aclose()
+    http_client = _livekit_http_clients.pop(asyncio.get_running_loop(), None)
+    if http_client:
+        await http_client.aclose()
+
+
+# --- Shared HTTP client and admin token for direct Twirp requests ---
+LIVEKIT_HTTP_TIMEOUT_SECONDS = float(os.getenv("LIVEKIT_HTTP_TIMEOUT_SECONDS", "20"))
+LIVEKIT_ADMIN_TOKEN_TTL_SECONDS = int(os.getenv("LIVEKIT_ADMIN_TOKEN_TTL_SECONDS", "3600"))
+# Renewed a little before it expires so an expired JWT is never sent
+LIVEKIT_ADMIN_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("LIVEKIT_ADMIN_TOKEN_REFRESH_MARGIN_SECONDS", "60"))
+
+_livekit_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_admin_token: Optional[str] = None
+_admin_token_expires_at = 0.0
+
+def _get_livekit_http_client() -> httpx.AsyncClient:
+    """Returns the keep-alive httpx client shared by the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _livekit_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=LIVEKIT_HTTP_TIMEOUT_SECONDS)
+        _livekit_http_clients[loop] = client
+    return client
+
+def _get_admin_token() -> str:
+    """Returns the cached room admin JWT, signing a new one only when it is about to expire."""
+    global _admin_token, _admin_token_expires_at
+    now = time.time()
+    if _admin_token and now < _admin_token_expires_at - LIVEKIT_ADMIN_TOKEN_REFRESH_MARGIN_SECONDS:
+        return _admin_token
+
+    auth_token = (
+        api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        .with_identity("pam-backend-service")
+        .with_grants(api.VideoGrants(room_admin=True))
+        .with_ttl(timedelta(seconds=LIVEKIT_ADMIN_TOKEN_TTL_SECONDS))
+        .to_jwt()
+    )
+    _admin_token = auth_token
+    _admin_token_expires_at = now + LIVEKIT_ADMIN_TOKEN_TTL_SECONDS
+    logger.debug("LiveKit admin token refreshed.")
+    return auth_token
+
+async def create_agent_dispatch(agent_name: str, metadata: str, room_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Dispatches an agent to a room through the LiveKit AgentDispatchService.
+    The room is created by LiveKit if it does not exist; a new unique room is used when room_name is None.
+    Returns the dispatch id, room name and agent name.
+    """
+    if not room_name:
+        room_name = f"outbound-{uuid.uuid4().hex[:12]}"
+
+    try:
+        dispatch = await get_livekit_api().agent_dispatch.create_dispatch(
+            api.CreateAgentDispatchRequest(agent_name=agent_name, room=room_name, metadata=metadata)
+        )
+    except api.TwirpError as e:
+        dependency_health.record_status_code("livekit", e.status)
+        logger.error(f"LiveKit SDK TwirpError creating agent dispatch for {agent_name} in room {room_name}: Code: {e.code}, Msg: {e.message}")
+        raise LiveKitServiceError(f"LiveKit SDK error creating agent dispatch: {e.message}", status_code=e.status, details=f"Twirp Error: Code={e.code}, Message={e.message}")
+    except Exception:
+        # Connection errors of the SDK's HTTP session
+        dependency_health.record("livekit", False)
+        raise
+    dependency_health.record("livekit", True)
+
+    logger.info(f"LiveKit agent dispatch {dispatch.id} created for agent {agent_name} in room {dispatch.room}")
+    return {
+        "dispatch_id": dispatch.id,
+        "room_name": dispatch.room,
+        "agent_name": dispatch.agent_name,
+    }
+
+
 # Note: LiveKit Server API often uses Twirp (Protobuf RPC framework over HTTP).
 # Direct HTTP calls require specific headers and request/response structures (usually JSON).
 # For more complex interactions or if using many LiveKit APIs, consider the official livekit-server-sdk (Python).
@@ -85,30 +191,8 @@ async def _make_livekit_request(
         logger.error("LiveKit API URL, Key, or Secret is not configured.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    # Token generation (simplified example - SDK handles this robustly)
-    # In a real scenario, you'd use the livekit.api.AccessToken or similar to create a grant
-    # For direct API calls (not through SDK client), you might need a specific service token.
-    # The /twirp/livekit.SIPService/MethodName endpoint usually expects this.
-    # For simplicity, we'll assume a method that uses API Key/Secret directly or a pre-shared token if applicable.
-    # However, most LiveKit service-to-service APIs expect a JWT.
-    
-    # Generate JWT for authentication
-    admin_identity = "pam-backend-service"
-
-    # Create the VideoGrant message
-    video_grant_message = api.VideoGrants(room_admin=True)
-
-    # Use the AccessToken class from livekit.api
-    # This assumes api.AccessToken is the utility class with .to_jwt()
-    access_token_generator = api.AccessToken(
-        LIVEKIT_API_KEY, # Assuming positional arguments if api_key= not accepted
-        LIVEKIT_API_SECRET, # Assuming positional arguments if api_secret= not accepted
-    )
-    # Use builder pattern
-    access_token_generator = access_token_generator.with_identity(admin_identity)
-    access_token_generator = access_token_generator.with_grants(video_grant_message) # Pass VideoGrants directly
-
-    auth_token = access_token_generator.to_jwt()
+    # JWT signed once, then reused until shortly before it expires
+    auth_token = _get_admin_token()
     
     headers = {
         "Authorization": f"Bearer {auth_token}",
@@ -118,56 +202,213 @@ async def _make_livekit_request(
 
     logger.debug(f"LiveKit API Request: POST {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method} - Payload: {json.dumps(payload)}")
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
+    client = _get_livekit_http_client()
+    try:
+        # Twirp requests are typically POST
+        response = await client.post(f"{LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}", json=payload if payload else {}, headers=headers)
+        dependency_health.record_status_code("livekit", response.status_code)
+        logger.debug(f"LiveKit API Response: Status {response.status_code} - Text: {response.text[:500]}")
+        
+        # Check for non-JSON "OK" response before attempting to parse
+        # For create/update/delete operations, a plain "OK" is suspicious.
+        is_mutating_operation = any(kw in method for kw in ["Create", "Update", "Delete", "Set", "Add", "Remove", "Patch"])
+        if response.status_code == 200 and response.text.strip().upper() == "OK":
+            if is_mutating_operation:
+                logger.warning(f"LiveKit API returned HTTP 200 with plain 'OK' for a mutating method {method} on {service}. Returning a special status.")
+                return {
+                    "status": "success_plain_ok",
+                    "message": f"LiveKit method {method} on {service} returned plain 'OK'. Assuming success but no data returned.",
+                    "service": service,
+                    "method": method
+                }
+            else: # For non-mutating methods (e.g., Get, List), "OK" might be an empty success.
+                logger.info(f"LiveKit API returned HTTP 200 with 'OK' body for non-mutating method {method} on {service}. Treating as success with no data.")
+                return {"status": "success", "message": "Operation successful, empty response from server", "data": {}}
+
+        response.raise_for_status() # For other 2xx that might have JSON, or any non-2xx
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        error_message = f"LiveKit API HTTP error: {e.response.status_code}"
+        details_text = e.response.text
         try:
-            # Twirp requests are typically POST
-            response = await client.post(f"{LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}", json=payload if payload else {}, headers=headers)
-            logger.debug(f"LiveKit API Response: Status {response.status_code} - Text: {response.text[:500]}")
-            
-            # Check for non-JSON "OK" response before attempting to parse
-            # For create/update/delete operations, a plain "OK" is suspicious.
-            is_mutating_operation = any(kw in method for kw in ["Create", "Update", "Delete", "Set", "Add", "Remove", "Patch"])
-            if response.status_code == 200 and response.text.strip().upper() == "OK":
-                if is_mutating_operation:
-                    logger.warning(f"LiveKit API returned HTTP 200 with plain 'OK' for a mutating method {method} on {service}. Returning a special status.")
-                    return {
-                        "status": "success_plain_ok",
-                        "message": f"LiveKit method {method} on {service} returned plain 'OK'. Assuming success but no data returned.",
-                        "service": service,
-                        "method": method
-                    }
-                else: # For non-mutating methods (e.g., Get, List), "OK" might be an empty success.
-                    logger.info(f"LiveKit API returned HTTP 200 with 'OK' body for non-mutating method {method} on {service}. Treating as success with no data.")
-                    return {"status": "success", "message": "Operation successful, empty response from server", "data": {}}
-
-            response.raise_for_status() # For other 2xx that might have JSON, or any non-2xx
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            error_message = f"LiveKit API HTTP error: {e.response.status_code}"
-            details_text = e.response.text
+            error_json = e.response.json()
+            # Twirp errors often have a specific JSON structure
+            twirp_code = error_json.get("code")
+            twirp_msg = error_json.get("msg")
+            if twirp_code and twirp_msg:
+                error_message += f" - Twirp Code: {twirp_code} - Message: {twirp_msg}"
+                details_text = f"Twirp Error: {twirp_code} - {twirp_msg}. Full: {e.response.text[:500]}"
+            else:
+                error_message += f" - Response: {e.response.text[:200]}"
+        except json.JSONDecodeError:
+            error_message += f" - Non-JSON response: {e.response.text[:200]}"
+        
+        logger.error(error_message, exc_info=True)
+        if e.response.status_code == 404: # Or specific Twirp code for "not_found"
+            raise LiveKitTrunkNotFoundError(f"LiveKit resource not found at {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}. Detail: {error_message}", status_code=404, details=details_text)
+        raise LiveKitServiceError(error_message, status_code=e.response.status_code, details=details_text)
+    except httpx.RequestError as e:
+        dependency_health.record("livekit", False)
+        logger.error(f"LiveKit request error for POST {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}: {e}", exc_info=True)
+        raise LiveKitServiceError(f"LiveKit request error: {str(e)}", status_code=503)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to decode JSON response from LiveKit for POST {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}: {e.doc[:200]}", exc_info=True)
+        raise LiveKitServiceError(f"Invalid JSON response from LiveKit: {str(e)}", status_code=502)
+
+
+# --- In-process SIP trunk index ---
+# LiveKit only offers listing for SIP trunks: instead of downloading every trunk of the project
+# on each lookup, trunks are listed once into an index by id and by number. Create/update/delete
+# calls of this module keep it current, and missing or stale entries are re-fetched one at a time
+# through the trunk_ids / numbers filters of the list requests.
+SIP_TRUNK_INDEX_ENTRY_TTL_SECONDS = int(os.getenv("SIP_TRUNK_INDEX_ENTRY_TTL_SECONDS", "300"))
+
+def _message_to_dict(message) -> Dict[str, Any]:
+    """Converts a LiveKit protobuf message to the camelCase dict returned by this module."""
+    if hasattr(api, 'MessageToJSON') and callable(getattr(api, 'MessageToJSON')):
+        return json.loads(api.MessageToJSON(message))
+    from google.protobuf.json_format import MessageToJson as ProtoMessageToJson
+    return json.loads(ProtoMessageToJson(message))
+
+def _sip_trunk_id_of(trunk: Dict[str, Any]) -> Optional[str]:
+    return trunk.get("sipTrunkId") or trunk.get("sipOutboundTrunkId") or trunk.get("sip_trunk_id")
+
+class SipTrunkIndex:
+    """SIP trunks of one direction ("outbound" or "inbound") indexed by trunk id and E.164 number."""
+
+    def __init__(self, direction: str):
+        self.direction = direction
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._id_by_number: Dict[str, str] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._populated = False
+        self._filters_supported = True
+        # Dicts are shared by every event loop of the process (see _populate_tasks); the lock is never held across an await
+        self._lock = threading.Lock()
+        self._populate_tasks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+    # --- index maintenance ---
+
+    def _remove_locked(self, trunk_id: str) -> None:
+        trunk = self._by_id.pop(trunk_id, None)
+        self._fetched_at.pop(trunk_id, None)
+        for number in (trunk or {}).get("numbers") or []:
+            if self._id_by_number.get(number) == trunk_id:
+                del self._id_by_number[number]
+
+    def _put_locked(self, trunk: Dict[str, Any], fetched_at: float) -> None:
+        trunk_id = _sip_trunk_id_of(trunk)
+        if not trunk_id:
+            return
+        self._remove_locked(trunk_id)
+        self._by_id[trunk_id] = trunk
+        self._fetched_at[trunk_id] = fetched_at
+        for number in trunk.get("numbers") or []:
+            self._id_by_number[number] = trunk_id
+
+    def put(self, trunk: Dict[str, Any]) -> None:
+        """Adds or replaces a trunk, e.g. from a create/update response (ignored when it carries no id)."""
+        with self._lock:
+            self._put_locked(trunk, time.monotonic())
+
+    def remove(self, trunk_id: str) -> None:
+        with self._lock:
+            self._remove_locked(trunk_id)
+
+    def replace_all(self, trunks: List[Dict[str, Any]]) -> None:
+        """Rebuilds the index from a full listing of the project's trunks."""
+        now = time.monotonic()
+        with self._lock:
+            self._by_id.clear()
+            self._id_by_number.clear()
+            self._fetched_at.clear()
+            for trunk in trunks:
+                self._put_locked(trunk, now)
+            self._populated = True
+        logger.info(f"SIP {self.direction} trunk index loaded with {len(trunks)} trunks")
+
+    def _fresh(self, trunk_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not trunk_id:
+            return None
+        with self._lock:
+            trunk = self._by_id.get(trunk_id)
+            if trunk is not None and time.monotonic() - self._fetched_at[trunk_id] < SIP_TRUNK_INDEX_ENTRY_TTL_SECONDS:
+                return trunk
+        return None
+
+    # --- LiveKit listing ---
+
+    async def _list(self, **filters) -> List[Dict[str, Any]]:
+        sip_service = get_livekit_api().sip
+        if self.direction == "outbound":
+            request = api.ListSIPOutboundTrunkRequest(**filters)
+            response = await sip_service.list_sip_outbound_trunk(request)
+        else:
+            request = api.ListSIPInboundTrunkRequest(**filters)
+            response = await sip_service.list_sip_inbound_trunk(request)
+        items = response.items if hasattr(response, 'items') else getattr(response, 'trunks', [])
+        return [_message_to_dict(item) for item in items]
+
+    async def _populate(self) -> None:
+        loop = asyncio.get_running_loop()
+        task = self._populate_tasks.get(loop)
+        if task is None:
+            # A single full listing per loop even when several lookups arrive at once
+            task = loop.create_task(self._list())
+            self._populate_tasks[loop] = task
+            task.add_done_callback(lambda _: self._populate_tasks.pop(loop, None))
+        self.replace_all(await asyncio.shield(task))
+
+    async def _fetch_filtered(self, trunk_ids: Optional[List[str]] = None, numbers: Optional[List[str]] = None) -> None:
+        """Refreshes only the requested trunks, falling back to a full listing on SDKs without list filters."""
+        if self._filters_supported:
             try:
-                error_json = e.response.json()
-                # Twirp errors often have a specific JSON structure
-                twirp_code = error_json.get("code")
-                twirp_msg = error_json.get("msg")
-                if twirp_code and twirp_msg:
-                    error_message += f" - Twirp Code: {twirp_code} - Message: {twirp_msg}"
-                    details_text = f"Twirp Error: {twirp_code} - {twirp_msg}. Full: {e.response.text[:500]}"
-                else:
-                    error_message += f" - Response: {e.response.text[:200]}"
-            except json.JSONDecodeError:
-                error_message += f" - Non-JSON response: {e.response.text[:200]}"
-            
-            logger.error(error_message, exc_info=True)
-            if e.response.status_code == 404: # Or specific Twirp code for "not_found"
-                raise LiveKitTrunkNotFoundError(f"LiveKit resource not found at {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}. Detail: {error_message}", status_code=404, details=details_text)
-            raise LiveKitServiceError(error_message, status_code=e.response.status_code, details=details_text)
-        except httpx.RequestError as e:
-            logger.error(f"LiveKit request error for POST {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}: {e}", exc_info=True)
-            raise LiveKitServiceError(f"LiveKit request error: {str(e)}", status_code=503)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON response from LiveKit for POST {LIVEKIT_API_URL.rstrip('/')}/twirp/livekit.{service}/{method}: {e.doc[:200]}", exc_info=True)
-            raise LiveKitServiceError(f"Invalid JSON response from LiveKit: {str(e)}", status_code=502)
+                filters = {"trunk_ids": trunk_ids} if trunk_ids else {"numbers": numbers}
+                trunks = await self._list(**filters)
+            except ValueError:
+                logger.warning(f"LiveKit SDK does not support filtered SIP {self.direction} trunk listing, falling back to full listings")
+                self._filters_supported = False
+            else:
+                with self._lock:
+                    now = time.monotonic()
+                    for trunk_id in trunk_ids or []:
+                        self._remove_locked(trunk_id)
+                    for number in numbers or []:
+                        self._id_by_number.pop(number, None)
+                    for trunk in trunks:
+                        self._put_locked(trunk, now)
+                return
+        await self._populate()
+
+    # --- lookups ---
+
+    async def get(self, trunk_id: str) -> Optional[Dict[str, Any]]:
+        trunk = self._fresh(trunk_id)
+        if trunk is not None:
+            return trunk
+        if self._populated:
+            await self._fetch_filtered(trunk_ids=[trunk_id])
+        else:
+            await self._populate()
+        with self._lock:
+            return self._by_id.get(trunk_id)
+
+    async def get_by_number(self, phone_number_e164: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trunk_id = self._id_by_number.get(phone_number_e164)
+        trunk = self._fresh(trunk_id)
+        if trunk is not None:
+            return trunk
+        if self._populated:
+            await self._fetch_filtered(numbers=[phone_number_e164])
+        else:
+            await self._populate()
+        with self._lock:
+            trunk_id = self._id_by_number.get(phone_number_e164)
+            return self._by_id.get(trunk_id) if trunk_id else None
+
+outbound_sip_trunk_index = SipTrunkIndex("outbound")
+inbound_sip_trunk_index = SipTrunkIndex("inbound")
 
 
 async def create_sip_trunk(
@@ -190,9 +431,8 @@ async def create_sip_trunk(
         logger.error("LiveKit API URL, Key, or Secret is not configured.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
 
         # Prepare arguments for SIPOutboundTrunkInfo
         trunk_info_args: Dict[str, Any] = {}
@@ -248,6 +488,7 @@ async def create_sip_trunk(
         # Ensure the response has the expected fields for compatibility
         if "sipTrunkId" not in response_dict and response_dict.get("sipOutboundTrunkId"):
             response_dict["sipTrunkId"] = response_dict["sipOutboundTrunkId"]
+        outbound_sip_trunk_index.put(dict(response_dict))
             
         return response_dict
 
@@ -260,9 +501,6 @@ async def create_sip_trunk(
     except Exception as e:
         logger.error(f"Unexpected error creating LiveKit SIP Trunk via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while creating SIP trunk: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose() # Ensure the client session is closed
 
 async def update_sip_trunk_credentials(
     sip_trunk_id: str,
@@ -281,9 +519,8 @@ async def update_sip_trunk_credentials(
         logger.error("LiveKit API URL, Key, or Secret is not configured for update operation.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
 
         # Prepare arguments specifically for UpdateSIPOutboundTrunkRequest
         # It likely only accepts the trunk ID and the fields to be updated.
@@ -327,6 +564,8 @@ async def update_sip_trunk_credentials(
         response_dict = json.loads(response_json_str)
         
         logger.info(f"LiveKit SIP Trunk {sip_trunk_id} credentials updated successfully via SDK: {response_dict}")
+        outbound_sip_trunk_index.remove(sip_trunk_id)
+        outbound_sip_trunk_index.put(dict(response_dict))
         return response_dict
 
     except api.TwirpError as e:
@@ -338,9 +577,6 @@ async def update_sip_trunk_credentials(
     except Exception as e:
         logger.error(f"Unexpected error updating LiveKit SIP Trunk {sip_trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while updating SIP trunk credentials: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 async def update_sip_trunk_credentials_simple(
     trunk_id: str,
@@ -359,9 +595,8 @@ async def update_sip_trunk_credentials_simple(
         logger.error(f"LiveKit SIP update classes not available in this SDK version. Cannot update trunk {trunk_id} credentials.")
         raise LiveKitServiceError("LiveKit SDK version does not support SIP trunk credential updates via UpdateSIPOutboundTrunkRequest")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
 
         logger.info(f"Attempting to update SIP outbound trunk {trunk_id} credentials using UpdateSIPOutboundTrunkRequest.")
         
@@ -391,6 +626,8 @@ async def update_sip_trunk_credentials_simple(
         response_dict = json.loads(response_json_str)
         
         logger.info(f"LiveKit SIP Trunk {trunk_id} credentials updated successfully via SDK: {response_dict}")
+        outbound_sip_trunk_index.remove(trunk_id)
+        outbound_sip_trunk_index.put(dict(response_dict))
         return response_dict
 
     except api.TwirpError as e:
@@ -402,14 +639,11 @@ async def update_sip_trunk_credentials_simple(
     except Exception as e:
         logger.error(f"Unexpected error updating LiveKit SIP Trunk {trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while updating SIP trunk credentials: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 async def get_sip_trunk(sip_trunk_id: str) -> Optional[Dict[str, Any]]:
     """
-    Gets a specific SIP Outbound Trunk from LiveKit by its ID by listing all outbound trunks
-    and then filtering for the specified ID.
+    Gets a specific SIP Outbound Trunk from LiveKit by its ID.
+    Served from the in-process trunk index; only a missing or stale entry is fetched from LiveKit.
     """
     if not sip_trunk_id:
         raise ValueError("SIP Trunk ID is required.")
@@ -418,72 +652,14 @@ async def get_sip_trunk(sip_trunk_id: str) -> Optional[Dict[str, Any]]:
         logger.error("LiveKit API URL, Key, or Secret is not configured for get_sip_trunk.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-        
-        logger.info(f"Attempting to find SIP Outbound Trunk ID: {sip_trunk_id} by listing all outbound trunks.")
-        
-        list_request_obj = api.ListSIPOutboundTrunkRequest()
-        list_response_proto = await lk_api_client.sip.list_sip_outbound_trunk(list_request_obj)
-        
-        found_trunk_proto = None
-        
-        # The ListSIPOutboundTrunkResponse usually has a 'trunks' or 'items' field.
-        # Based on typical LiveKit SDK patterns, 'trunks' is likely for typed responses.
-        trunks_list = []
-        if hasattr(list_response_proto, 'trunks'):
-            trunks_list = list_response_proto.trunks
-            logger.debug(f"Found 'trunks' attribute in ListSIPOutboundTrunkResponse, count: {len(trunks_list)}")
-        elif hasattr(list_response_proto, 'items'): # Fallback for more generic list responses
-            trunks_list = list_response_proto.items
-            logger.debug(f"Found 'items' attribute in ListSIPOutboundTrunkResponse, count: {len(trunks_list)}")
-        else:
-            logger.warning("Could not find 'trunks' or 'items' attribute in ListSIPOutboundTrunkResponse. Unable to find specific trunk.")
-            # If the response itself is the list (less common for protobufs but possible if SDK unwraps)
-            if isinstance(list_response_proto, list):
-                 logger.debug("ListSIPOutboundTrunkResponse appears to be a direct list.")
-                 trunks_list = list_response_proto
-            else:
-                # Log the type and dir of the response to understand its structure if common fields are missing.
-                logger.warning(f"ListSIPOutboundTrunkResponse type: {type(list_response_proto)}. Attributes: {dir(list_response_proto)}")
-
-
-        for trunk_proto_item in trunks_list:
-            # SIPOutboundTrunkInfo has a 'sip_trunk_id' field.
-            if hasattr(trunk_proto_item, 'sip_trunk_id') and trunk_proto_item.sip_trunk_id == sip_trunk_id:
-                found_trunk_proto = trunk_proto_item
-                logger.debug(f"Matching trunk found: {trunk_proto_item.sip_trunk_id}")
-                break
-            elif hasattr(trunk_proto_item, 'sip_outbound_trunk_id') and trunk_proto_item.sip_outbound_trunk_id == sip_trunk_id: # Check alternative field name
-                found_trunk_proto = trunk_proto_item
-                logger.debug(f"Matching trunk found with sip_outbound_trunk_id: {trunk_proto_item.sip_outbound_trunk_id}")
-                break
-        
-        if not found_trunk_proto:
-            logger.warning(f"LiveKit SIP Outbound Trunk ID {sip_trunk_id} not found after listing all outbound trunks.")
+        trunk = await outbound_sip_trunk_index.get(sip_trunk_id)
+        if not trunk:
+            logger.warning(f"LiveKit SIP Outbound Trunk ID {sip_trunk_id} not found.")
             return None
 
-        logger.info(f"Successfully found SIP Outbound Trunk {sip_trunk_id} by listing and filtering.")
-        
-        response_json_str = ""
-        if hasattr(api, 'MessageToJSON') and callable(getattr(api, 'MessageToJSON')):
-            response_json_str = api.MessageToJSON(found_trunk_proto)
-        else:
-            from google.protobuf.json_format import MessageToJson as ProtoMessageToJson
-            logger.warning("livekit.api.MessageToJSON not found or not callable, using google.protobuf.json_format.MessageToJson for found trunk.")
-            response_json_str = ProtoMessageToJson(found_trunk_proto)
-            
-        response_dict = json.loads(response_json_str)
-        
-        # The JSON field name is often camelCase, e.g., 'sipTrunkId'
-        if response_dict and (response_dict.get("sipTrunkId") or response_dict.get("sipOutboundTrunkId")):
-            logger.info(f"SIP Outbound Trunk {sip_trunk_id} (listed) details: {response_dict}")
-            return response_dict
-        else:
-            logger.warning(f"Found SIP Outbound Trunk {sip_trunk_id} (listed) but conversion to dict or ID field ('sipTrunkId' or 'sipOutboundTrunkId') is missing. Response: {response_dict}")
-            # Return the dict anyway if it exists, the caller might handle it
-            return response_dict if response_dict else None
+        logger.debug(f"SIP Outbound Trunk {sip_trunk_id} details: {trunk}")
+        return dict(trunk)
 
     except api.TwirpError as e:
         logger.error(f"LiveKit SDK TwirpError while listing SIP Outbound Trunks to find {sip_trunk_id}: Code: {e.code}, Msg: {e.message}, Meta: {e.metadata}")
@@ -492,9 +668,25 @@ async def get_sip_trunk(sip_trunk_id: str) -> Optional[Dict[str, Any]]:
     except Exception as e:
         logger.error(f"Unexpected error listing/finding LiveKit SIP Outbound Trunk {sip_trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while listing/finding SIP outbound trunk: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
+
+async def get_sip_trunk_by_number(phone_number_e164: str) -> Optional[Dict[str, Any]]:
+    """Gets the SIP Outbound Trunk carrying a given E.164 number, from the in-process trunk index."""
+    if not phone_number_e164:
+        raise ValueError("Phone number is required.")
+
+    if not LIVEKIT_API_URL or not LIVEKIT_API_KEY or not LIVEKIT_API_SECRET:
+        logger.error("LiveKit API URL, Key, or Secret is not configured for get_sip_trunk_by_number.")
+        raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
+
+    try:
+        trunk = await outbound_sip_trunk_index.get_by_number(phone_number_e164)
+        return dict(trunk) if trunk else None
+    except api.TwirpError as e:
+        logger.error(f"LiveKit SDK TwirpError while finding SIP Outbound Trunk for {phone_number_e164}: Code: {e.code}, Msg: {e.message}, Meta: {e.metadata}")
+        raise LiveKitServiceError(f"LiveKit SDK error listing SIP Outbound Trunks: {e.message}", status_code=e.status, details=f"Twirp Error: Code={e.code}, Message={e.message}, Metadata={e.metadata}")
+    except Exception as e:
+        logger.error(f"Unexpected error finding LiveKit SIP Outbound Trunk for {phone_number_e164}: {e}", exc_info=True)
+        raise LiveKitServiceError(f"Unexpected SDK error while finding SIP outbound trunk by number: {str(e)}")
 
 async def list_sip_trunks() -> List[Dict[str, Any]]:
     """Lists all SIP Trunks in LiveKit."""
@@ -522,9 +714,13 @@ async def delete_sip_trunk(sip_trunk_id: str) -> bool:
         await _make_livekit_request(service="SIPService", method="DeleteSIPTrunk", payload=payload)
         # DeleteSIPTrunk usually returns an empty response on success (e.g., {} or HTTP 200/204)
         logger.info(f"LiveKit SIP Trunk ID {sip_trunk_id} deleted successfully.")
+        outbound_sip_trunk_index.remove(sip_trunk_id)
+        inbound_sip_trunk_index.remove(sip_trunk_id)
         return True
     except LiveKitTrunkNotFoundError:
         logger.warning(f"LiveKit SIP Trunk ID {sip_trunk_id} not found for deletion.")
+        outbound_sip_trunk_index.remove(sip_trunk_id)
+        inbound_sip_trunk_index.remove(sip_trunk_id)
         return True # Idempotency: if not found, it's effectively deleted
     except LiveKitServiceError as e:
         logger.error(f"Error deleting LiveKit SIP Trunk {sip_trunk_id}: {e}")
@@ -556,9 +752,8 @@ async def create_inbound_sip_trunk(
         logger.error("LiveKit API URL, Key, or Secret is not configured for inbound SIP trunk creation.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         # Generate SIP trunk ID if not provided
         if not sip_trunk_id:
@@ -614,6 +809,7 @@ async def create_inbound_sip_trunk(
         response_dict = json.loads(response_json_str)
         
         logger.info(f"Successfully created Inbound SIP Trunk: {response_dict}")
+        inbound_sip_trunk_index.put(dict(response_dict))
         return response_dict
 
     except api.TwirpError as e:
@@ -623,9 +819,6 @@ async def create_inbound_sip_trunk(
     except Exception as e:
         logger.error(f"Unexpected error creating Inbound SIP Trunk via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while creating inbound SIP trunk: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 async def list_inbound_sip_trunks() -> List[Dict[str, Any]]:
     """
@@ -636,9 +829,8 @@ async def list_inbound_sip_trunks() -> List[Dict[str, Any]]:
         logger.error("LiveKit API URL, Key, or Secret is not configured for listing inbound SIP trunks.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         logger.info("Listing all LiveKit Inbound SIP Trunks.")
         
@@ -667,6 +859,7 @@ async def list_inbound_sip_trunks() -> List[Dict[str, Any]]:
             trunk_dicts.append(trunk_dict)
         
         logger.info(f"Found {len(trunk_dicts)} inbound SIP trunks")
+        inbound_sip_trunk_index.replace_all([dict(trunk) for trunk in trunk_dicts])
         return trunk_dicts
 
     except api.TwirpError as e:
@@ -676,9 +869,6 @@ async def list_inbound_sip_trunks() -> List[Dict[str, Any]]:
     except Exception as e:
         logger.error(f"Unexpected error listing Inbound SIP Trunks via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while listing inbound SIP trunks: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 async def get_inbound_sip_trunk(sip_trunk_id: str) -> Optional[Dict[str, Any]]:
     """
@@ -692,51 +882,14 @@ async def get_inbound_sip_trunk(sip_trunk_id: str) -> Optional[Dict[str, Any]]:
         logger.error("LiveKit API URL, Key, or Secret is not configured for get_inbound_sip_trunk.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-        
-        logger.info(f"Attempting to find Inbound SIP Trunk ID: {sip_trunk_id}")
-        
-        # List all inbound trunks and find the matching one
-        list_request = api.ListSIPInboundTrunkRequest()
-        list_response_proto = await lk_api_client.sip.list_sip_inbound_trunk(list_request)
-        
-        found_trunk_proto = None
-        
-        trunks_list = []
-        if hasattr(list_response_proto, 'items'):
-            trunks_list = list_response_proto.items
-        elif hasattr(list_response_proto, 'trunks'):
-            trunks_list = list_response_proto.trunks
-        else:
-            logger.warning("Could not find 'items' or 'trunks' in ListSIPInboundTrunkResponse")
-            return None
-
-        for trunk_proto_item in trunks_list:
-            if hasattr(trunk_proto_item, 'sip_trunk_id') and trunk_proto_item.sip_trunk_id == sip_trunk_id:
-                found_trunk_proto = trunk_proto_item
-                logger.debug(f"Matching inbound trunk found: {trunk_proto_item.sip_trunk_id}")
-                break
-        
-        if not found_trunk_proto:
+        trunk = await inbound_sip_trunk_index.get(sip_trunk_id)
+        if not trunk:
             logger.warning(f"LiveKit Inbound SIP Trunk ID {sip_trunk_id} not found.")
             return None
 
-        logger.info(f"Successfully found Inbound SIP Trunk {sip_trunk_id}")
-        
-        # Convert to dict
-        response_json_str = ""
-        if hasattr(api, 'MessageToJSON') and callable(getattr(api, 'MessageToJSON')):
-            response_json_str = api.MessageToJSON(found_trunk_proto)
-        else:
-            from google.protobuf.json_format import MessageToJson as ProtoMessageToJson
-            response_json_str = ProtoMessageToJson(found_trunk_proto)
-            
-        response_dict = json.loads(response_json_str)
-        
-        logger.info(f"Inbound SIP Trunk {sip_trunk_id} details: {response_dict}")
-        return response_dict
+        logger.debug(f"Inbound SIP Trunk {sip_trunk_id} details: {trunk}")
+        return dict(trunk)
 
     except api.TwirpError as e:
         logger.error(f"LiveKit SDK TwirpError while finding Inbound SIP Trunk {sip_trunk_id}: Code: {e.code}, Msg: {e.message}, Meta: {e.metadata}")
@@ -744,9 +897,25 @@ async def get_inbound_sip_trunk(sip_trunk_id: str) -> Optional[Dict[str, Any]]:
     except Exception as e:
         logger.error(f"Unexpected error finding LiveKit Inbound SIP Trunk {sip_trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while finding inbound SIP trunk: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
+
+async def get_inbound_sip_trunk_by_number(phone_number_e164: str) -> Optional[Dict[str, Any]]:
+    """Gets the Inbound SIP Trunk receiving a given E.164 number, from the in-process trunk index."""
+    if not phone_number_e164:
+        raise ValueError("Phone number is required.")
+
+    if not LIVEKIT_API_URL or not LIVEKIT_API_KEY or not LIVEKIT_API_SECRET:
+        logger.error("LiveKit API URL, Key, or Secret is not configured for get_inbound_sip_trunk_by_number.")
+        raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
+
+    try:
+        trunk = await inbound_sip_trunk_index.get_by_number(phone_number_e164)
+        return dict(trunk) if trunk else None
+    except api.TwirpError as e:
+        logger.error(f"LiveKit SDK TwirpError while finding Inbound SIP Trunk for {phone_number_e164}: Code: {e.code}, Msg: {e.message}, Meta: {e.metadata}")
+        raise LiveKitServiceError(f"LiveKit SDK error finding Inbound SIP Trunk: {e.message}", status_code=e.status, details=f"Twirp Error: Code={e.code}, Message={e.message}, Metadata={e.metadata}")
+    except Exception as e:
+        logger.error(f"Unexpected error finding LiveKit Inbound SIP Trunk for {phone_number_e164}: {e}", exc_info=True)
+        raise LiveKitServiceError(f"Unexpected SDK error while finding inbound SIP trunk by number: {str(e)}")
 
 async def update_sip_inbound_trunk(
     trunk_id: str,
@@ -763,9 +932,8 @@ async def update_sip_inbound_trunk(
         logger.error("LiveKit API URL, Key, or Secret is not configured for update operation.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         # Get current trunk details first
         current_trunk = await get_inbound_sip_trunk(trunk_id)
@@ -801,6 +969,8 @@ async def update_sip_inbound_trunk(
         response_dict = json.loads(response_json_str)
         
         logger.info(f"LiveKit Inbound SIP Trunk {trunk_id} updated successfully: {response_dict}")
+        inbound_sip_trunk_index.remove(trunk_id)
+        inbound_sip_trunk_index.put(dict(response_dict))
         return response_dict
         
     except api.TwirpError as e:
@@ -809,9 +979,6 @@ async def update_sip_inbound_trunk(
     except Exception as e:
         logger.error(f"Unexpected error updating LiveKit Inbound SIP Trunk {trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while updating inbound SIP trunk: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 async def delete_inbound_sip_trunk(sip_trunk_id: str) -> bool:
     """
@@ -825,9 +992,8 @@ async def delete_inbound_sip_trunk(sip_trunk_id: str) -> bool:
         logger.error("LiveKit API URL, Key, or Secret is not configured for deleting inbound SIP trunk.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         logger.info(f"Deleting LiveKit Inbound SIP Trunk ID: {sip_trunk_id}")
         
@@ -835,11 +1001,13 @@ async def delete_inbound_sip_trunk(sip_trunk_id: str) -> bool:
         await lk_api_client.sip.delete_sip_trunk(delete_request)
         
         logger.info(f"LiveKit Inbound SIP Trunk ID {sip_trunk_id} deleted successfully.")
+        inbound_sip_trunk_index.remove(sip_trunk_id)
         return True
 
     except api.TwirpError as e:
         if e.code == "not_found" or e.status == 404:
             logger.warning(f"LiveKit Inbound SIP Trunk ID {sip_trunk_id} not found for deletion.")
+            inbound_sip_trunk_index.remove(sip_trunk_id)
             return True  # Idempotency: if not found, it's effectively deleted
         logger.error(f"LiveKit SDK TwirpError deleting Inbound SIP Trunk {sip_trunk_id}: Code: {e.code}, Msg: {e.message}, Meta: {e.metadata}")
         details = f"Twirp Error: Code={e.code}, Message={e.message}, Metadata={e.metadata}"
@@ -847,9 +1015,6 @@ async def delete_inbound_sip_trunk(sip_trunk_id: str) -> bool:
     except Exception as e:
         logger.error(f"Unexpected error deleting Inbound SIP Trunk {sip_trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while deleting inbound SIP trunk: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 async def update_inbound_sip_trunk_auth(
     trunk_id: str,
@@ -867,9 +1032,8 @@ async def update_inbound_sip_trunk_auth(
         logger.error("LiveKit API URL, Key, or Secret is not configured for updating inbound SIP trunk auth.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
 
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         logger.info(f"Attempting to update Inbound SIP trunk {trunk_id} authentication credentials.")
         
@@ -900,6 +1064,8 @@ async def update_inbound_sip_trunk_auth(
         response_dict = json.loads(response_json_str)
         
         logger.info(f"LiveKit Inbound SIP Trunk {trunk_id} credentials updated successfully: {response_dict}")
+        inbound_sip_trunk_index.remove(trunk_id)
+        inbound_sip_trunk_index.put(dict(response_dict))
         return response_dict
 
     except api.TwirpError as e:
@@ -911,9 +1077,6 @@ async def update_inbound_sip_trunk_auth(
     except Exception as e:
         logger.error(f"Unexpected error updating LiveKit Inbound SIP Trunk {trunk_id} via SDK: {e}", exc_info=True)
         raise LiveKitServiceError(f"Unexpected SDK error while updating inbound SIP trunk credentials: {str(e)}")
-    finally:
-        if lk_api_client:
-            await lk_api_client.aclose()
 
 # ===== LIVEKIT INBOUND INFRASTRUCTURE (Phase 2: Bidirectional Support) =====
 
@@ -947,9 +1110,8 @@ async def create_sip_inbound_trunk(
         logger.error("LiveKit API URL, Key, or Secret is not configured.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         # Create the inbound trunk request
         trunk_request = CreateSIPInboundTrunkRequest()
@@ -991,6 +1153,7 @@ async def create_sip_inbound_trunk(
         # Ensure compatibility with existing code expectations
         response_dict["sipTrunkId"] = trunk_id
         response_dict["sip_trunk_id"] = trunk_id
+        inbound_sip_trunk_index.put(dict(response_dict))
         
         return response_dict
         
@@ -1026,9 +1189,8 @@ async def create_sip_dispatch_rule(
         logger.error("LiveKit API URL, Key, or Secret is not configured.")
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
-    lk_api_client = None
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         # Create the dispatch rule request
         dispatch_request = CreateSIPDispatchRuleRequest()
@@ -1089,7 +1251,7 @@ async def list_sip_inbound_trunks() -> List[Dict[str, Any]]:
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         request = ListSIPInboundTrunkRequest()
         response = await lk_api_client.sip.list_sip_inbound_trunk(request)
@@ -1106,6 +1268,7 @@ async def list_sip_inbound_trunks() -> List[Dict[str, Any]]:
         trunks = response_dict.get("items", [])
         
         logger.info(f"Found {len(trunks)} SIP inbound trunks")
+        inbound_sip_trunk_index.replace_all([dict(trunk) for trunk in trunks])
         return trunks
         
     except Exception as e:
@@ -1124,7 +1287,7 @@ async def list_sip_dispatch_rules() -> List[Dict[str, Any]]:
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         request = ListSIPDispatchRuleRequest()
         response = await lk_api_client.sip.list_sip_dispatch_rule(request)
@@ -1159,13 +1322,14 @@ async def delete_sip_inbound_trunk(trunk_id: str) -> bool:
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         request = DeleteSIPTrunkRequest()
         request.sip_trunk_id = trunk_id
         await lk_api_client.sip.delete_sip_trunk(request)
         
         logger.info(f"✅ Deleted SIP inbound trunk: {trunk_id}")
+        inbound_sip_trunk_index.remove(trunk_id)
         return True
         
     except Exception as e:
@@ -1184,7 +1348,7 @@ async def delete_sip_dispatch_rule(rule_id: str) -> bool:
         raise LiveKitConfigurationError("LiveKit API credentials are not fully configured.")
     
     try:
-        lk_api_client = api.LiveKitAPI(LIVEKIT_API_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        lk_api_client = get_livekit_api()
         
         request = DeleteSIPDispatchRuleRequest()
         request.sip_dispatch_rule_id = rule_id
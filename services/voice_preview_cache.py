@@ -0,0 +1,177 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Limits are in bytes; previews are ~30-60 KB mp3 samples
+VOICE_PREVIEW_MEMORY_CACHE_MAX_BYTES = int(os.getenv("VOICE_PREVIEW_MEMORY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+VOICE_PREVIEW_DISK_CACHE_MAX_BYTES = int(os.getenv("VOICE_PREVIEW_DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+VOICE_PREVIEW_CACHE_DIR = os.getenv(
+    "VOICE_PREVIEW_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "pam_voice_previews"),
+)
+
+
+def voice_preview_cache_key(provider: str, voice_id: str, model: Optional[str], language_code: str, text: str) -> str:
+    """Stable key for a synthesized preview sample"""
+    raw = "\x1f".join([provider or "", voice_id or "", model or "", language_code or "", text or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class VoicePreviewCache:
+    """Two-tier cache for voice preview audio: in-memory LRU backed by a local disk directory.
+
+    Both tiers are bounded in bytes. The memory tier evicts least recently used
+    entries; the disk tier evicts the files least recently read or written.
+    """
+
+    def __init__(self, cache_dir: str, memory_max_bytes: int, disk_max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._pending: dict = {}
+
+    # --- memory tier ---
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+            return audio
+
+    def _memory_put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_max_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.memory_max_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    # --- disk tier (blocking, run in a worker thread) ---
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp3"
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # Marks the entry as recently used for eviction
+            return audio
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Voice preview disk cache read failed for {key}: {e}")
+            return None
+
+    def _disk_put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.disk_max_bytes:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(audio)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Voice preview disk cache write failed for {key}: {e}")
+
+    def _evict_disk(self) -> None:
+        with self._disk_lock:
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob("*.mp3"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total <= self.disk_max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.disk_max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except FileNotFoundError:
+                    total -= size
+                except OSError as e:
+                    logger.warning(f"Voice preview disk cache eviction failed for {path.name}: {e}")
+
+    # --- public API ---
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio from memory, falling back to disk (and promoting it)"""
+        audio = self._memory_get(key)
+        if audio is not None:
+            return audio
+        audio = await asyncio.to_thread(self._disk_get, key)
+        if audio is not None:
+            self._memory_put(key, audio)
+        return audio
+
+    async def put(self, key: str, audio: bytes) -> None:
+        """Store audio in both tiers"""
+        self._memory_put(key, audio)
+        await asyncio.to_thread(self._disk_put, key, audio)
+
+    async def get_or_create(self, key: str, synthesize) -> bytes:
+        """Return cached audio, or call ``synthesize()`` once per key and cache the result.
+
+        Concurrent requests for the same uncached preview share a single synthesis.
+        """
+        audio = self._memory_get(key)
+        if audio is not None:
+            return audio
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            audio = await self.get(key)
+            if audio is None:
+                audio = await synthesize()
+                await self.put(key, audio)
+            future.set_result(audio)
+            return audio
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Avoids "exception was never retrieved" when nobody was waiting
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+
+voice_preview_cache = VoicePreviewCache(
+    VOICE_PREVIEW_CACHE_DIR,
+    VOICE_PREVIEW_MEMORY_CACHE_MAX_BYTES,
+    VOICE_PREVIEW_DISK_CACHE_MAX_BYTES,
+)
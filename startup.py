@@ -16,10 +16,19 @@ if __name__ == "__main__":
     # Get port from environment (Azure sets this automatically)
     port = int(os.environ.get("PORT", 8000))
     
+    # One worker per core by default. The background schedulers and campaign dispatchers
+    # coordinate through leases (api/scheduler_lease.py) and dispatchers see slots freed
+    # by other workers through the campaign counters. The call pacer divides its limits
+    # by WEB_CONCURRENCY, exported here for the workers. The Telnyx call_control_id index
+    # falls back to database lookups for calls dialed by another worker, and the live call
+    # registry behind /analytics/real-time reports the calls of the worker answering.
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    
     # Start the FastAPI app
     uvicorn.run(
         "api.main:app",
         host="0.0.0.0",
         port=port,
-        workers=1
+        workers=workers
     )
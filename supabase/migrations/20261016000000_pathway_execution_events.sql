@@ -0,0 +1,17 @@
+-- Append-only log of pathway execution events (node transitions, variable updates).
+-- pathway_executions.execution_trace / variables keep only the initial state written at
+-- creation; the full trace is materialized on read by folding these rows in id order.
+create table if not exists public.pathway_execution_events (
+    id bigint generated always as identity primary key,
+    execution_id uuid not null references public.pathway_executions(id) on delete cascade,
+    event_type text not null,
+    node_id text,
+    payload jsonb not null default '{}'::jsonb,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists pathway_execution_events_execution_id_idx
+    on public.pathway_execution_events (execution_id, id);
+
+-- Only read and written with the service role; payloads hold caller input
+alter table public.pathway_execution_events enable row level security;
@@ -0,0 +1,24 @@
+-- Dashboard counters for one user in a single round trip (GET /dashboard/stats).
+-- Called with the service role key only: the caller is authenticated by the API,
+-- which passes the user id explicitly.
+create or replace function public.get_dashboard_stats(p_user_id uuid, p_since timestamptz)
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total_agents', (select count(*) from public.agents where user_id = p_user_id),
+        'active_agents', (select count(*) from public.agents where user_id = p_user_id and status = 'active'),
+        'total_calls', c.total_calls,
+        'recent_calls', c.recent_calls
+    )
+    from (
+        select count(*) as total_calls,
+               count(*) filter (where created_at >= p_since) as recent_calls
+        from public.calls
+        where user_id = p_user_id
+    ) c;
+$$;
+
+revoke execute on function public.get_dashboard_stats(uuid, timestamptz) from public, anon, authenticated;
+grant execute on function public.get_dashboard_stats(uuid, timestamptz) to service_role;
@@ -0,0 +1,161 @@
+-- Per-user, per-agent, per-campaign, per-region hourly call counters for /analytics/global.
+-- Kept up to date by a trigger on public.calls: every insert/update/delete removes the
+-- old row's contribution and adds the new one, so a status change moves the call
+-- between counters without rescanning calls.
+
+create or replace function public.call_region(phone_number text)
+returns text
+language sql
+immutable
+as $$
+    select case
+        when phone_number like '+1%' then
+            case
+                when length(phone_number) < 5 then 'US/CA'
+                else coalesce(
+                    (array['New York, NY', 'Los Angeles, CA', 'Chicago, IL', 'San Francisco, CA', 'Boston, MA', 'Las Vegas, NV',
+                           'Miami, FL', 'Seattle, WA', 'Houston, TX', 'Atlanta, GA', 'Dallas, TX', 'Phoenix, AZ'])[
+                        array_position(array['212', '213', '312', '415', '617', '702', '305', '206', '713', '404', '214', '602'],
+                                       substr(phone_number, 3, 3))],
+                    'US/CA (' || substr(phone_number, 3, 3) || ')')
+            end
+        when phone_number like '+33%' then 'France'
+        when phone_number like '+44%' then 'United Kingdom'
+        when phone_number like '+49%' then 'Germany'
+        when phone_number like '+34%' then 'Spain'
+        when phone_number like '+39%' then 'Italy'
+        when phone_number like '+61%' then 'Australia'
+        when phone_number like '+81%' then 'Japan'
+        else 'Other'
+    end;
+$$;
+
+create table if not exists public.call_hourly_rollups (
+    user_id uuid not null,
+    agent_id bigint,
+    batch_campaign_id uuid,
+    region text not null,
+    bucket_hour timestamptz not null,
+    total_calls integer not null default 0,
+    -- status completed/ended
+    completed_calls integer not null default 0,
+    -- completed/ended and longer than 30 seconds
+    successful_calls integer not null default 0,
+    -- status failed/busy/no_answer
+    failed_calls integer not null default 0,
+    total_duration bigint not null default 0,
+    constraint call_hourly_rollups_bucket_key
+        unique nulls not distinct (user_id, agent_id, batch_campaign_id, region, bucket_hour)
+);
+
+create index if not exists call_hourly_rollups_user_hour_idx
+    on public.call_hourly_rollups (user_id, bucket_hour);
+
+-- Only read through get_call_rollup_analytics with the service role
+alter table public.call_hourly_rollups enable row level security;
+
+create or replace function public.apply_call_rollup_delta(c public.calls, delta integer)
+returns void
+language sql
+as $$
+    insert into public.call_hourly_rollups as r (
+        user_id, agent_id, batch_campaign_id, region, bucket_hour,
+        total_calls, completed_calls, successful_calls, failed_calls, total_duration
+    )
+    select
+        c.user_id, c.agent_id, c.batch_campaign_id, public.call_region(coalesce(c.phone_number_e164, '')),
+        date_trunc('hour', c.created_at),
+        delta,
+        delta * (lower(coalesce(c.status, '')) in ('completed', 'ended'))::int,
+        delta * (lower(coalesce(c.status, '')) in ('completed', 'ended') and coalesce(c.call_duration, 0) > 30)::int,
+        delta * (lower(coalesce(c.status, '')) in ('failed', 'busy', 'no_answer'))::int,
+        delta * coalesce(c.call_duration, 0)
+    where c.user_id is not null and c.created_at is not null
+    on conflict on constraint call_hourly_rollups_bucket_key do update set
+        total_calls = r.total_calls + excluded.total_calls,
+        completed_calls = r.completed_calls + excluded.completed_calls,
+        successful_calls = r.successful_calls + excluded.successful_calls,
+        failed_calls = r.failed_calls + excluded.failed_calls,
+        total_duration = r.total_duration + excluded.total_duration;
+$$;
+
+-- security definer: calls may be written by roles that have no access to the rollups
+create or replace function public.calls_rollup_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.apply_call_rollup_delta(old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.apply_call_rollup_delta(new, 1);
+    end if;
+    return null;
+end;
+$$;
+
+-- Backfill and trigger creation must not miss calls written in between
+lock table public.calls in share row exclusive mode;
+
+insert into public.call_hourly_rollups (
+    user_id, agent_id, batch_campaign_id, region, bucket_hour,
+    total_calls, completed_calls, successful_calls, failed_calls, total_duration
+)
+select
+    user_id, agent_id, batch_campaign_id, public.call_region(coalesce(phone_number_e164, '')),
+    date_trunc('hour', created_at),
+    count(*),
+    count(*) filter (where lower(coalesce(status, '')) in ('completed', 'ended')),
+    count(*) filter (where lower(coalesce(status, '')) in ('completed', 'ended') and coalesce(call_duration, 0) > 30),
+    count(*) filter (where lower(coalesce(status, '')) in ('failed', 'busy', 'no_answer')),
+    coalesce(sum(call_duration), 0)
+from public.calls
+where user_id is not null and created_at is not null
+group by 1, 2, 3, 4, 5
+on conflict on constraint call_hourly_rollups_bucket_key do nothing;
+
+drop trigger if exists calls_rollup on public.calls;
+create trigger calls_rollup
+    after insert or delete or update of user_id, agent_id, batch_campaign_id, phone_number_e164, created_at, status, call_duration
+    on public.calls
+    for each row execute function public.calls_rollup_trigger();
+
+-- Rollup rows of [p_start, p_end) grouped by agent, region and UTC day, as one JSON array
+-- (a single value is not truncated by the PostgREST max-rows limit).
+create or replace function public.get_call_rollup_analytics(
+    p_user_id uuid,
+    p_start timestamptz,
+    p_end timestamptz,
+    p_campaign_id uuid default null,
+    p_agent_id bigint default null
+)
+returns json
+language sql
+stable
+as $$
+    select coalesce(json_agg(g), '[]'::json)
+    from (
+        select
+            agent_id,
+            region,
+            (bucket_hour at time zone 'utc')::date as day,
+            sum(total_calls) as total_calls,
+            sum(completed_calls) as completed_calls,
+            sum(successful_calls) as successful_calls,
+            sum(failed_calls) as failed_calls,
+            sum(total_duration) as total_duration
+        from public.call_hourly_rollups
+        where user_id = p_user_id
+          and bucket_hour >= p_start
+          and bucket_hour < p_end
+          and (p_campaign_id is null or batch_campaign_id = p_campaign_id)
+          and (p_agent_id is null or agent_id = p_agent_id)
+        group by 1, 2, 3
+    ) g;
+$$;
+
+revoke execute on function public.get_call_rollup_analytics(uuid, timestamptz, timestamptz, uuid, bigint) from public, anon, authenticated;
+grant execute on function public.get_call_rollup_analytics(uuid, timestamptz, timestamptz, uuid, bigint) to service_role;
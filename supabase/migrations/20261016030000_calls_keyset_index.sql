@@ -0,0 +1,5 @@
+-- Keyset pagination of GET /calls and of the CSV exports walks a user's calls in
+-- (created_at, id) descending order; this index serves each page as a range scan.
+
+create index if not exists calls_user_created_at_id_idx
+    on public.calls (user_id, created_at desc, id desc);
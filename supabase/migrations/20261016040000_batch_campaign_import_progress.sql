@@ -0,0 +1,8 @@
+-- Progress of the streaming CSV import (POST /batch-campaigns/{id}/items/upload-csv),
+-- updated after every inserted chunk so clients can poll the campaign while it runs.
+
+alter table public.batch_campaigns
+    add column if not exists import_status text,
+    add column if not exists import_processed_rows integer not null default 0,
+    add column if not exists import_inserted_rows integer not null default 0,
+    add column if not exists import_invalid_rows integer not null default 0;
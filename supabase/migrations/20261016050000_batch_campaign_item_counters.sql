@@ -0,0 +1,120 @@
+-- Per-campaign counters of call items by status, kept up to date by statement-level
+-- triggers on public.batch_call_items so completion detection reads one campaign row
+-- instead of rescanning every item.
+--   items_pending      pending, retrying
+--   items_in_progress  calling and any other non-final status
+--   items_completed / items_failed / items_cancelled  final statuses
+
+alter table public.batch_campaigns
+    add column if not exists items_pending integer not null default 0,
+    add column if not exists items_in_progress integer not null default 0,
+    add column if not exists items_completed integer not null default 0,
+    add column if not exists items_failed integer not null default 0,
+    add column if not exists items_cancelled integer not null default 0;
+
+create or replace function public.apply_batch_item_status_deltas(
+    p_campaign_ids uuid[],
+    p_statuses text[],
+    p_deltas integer[]
+)
+returns void
+language sql
+as $$
+    update public.batch_campaigns c set
+        items_pending = c.items_pending + d.pending,
+        items_in_progress = c.items_in_progress + d.in_progress,
+        items_completed = c.items_completed + d.completed,
+        items_failed = c.items_failed + d.failed,
+        items_cancelled = c.items_cancelled + d.cancelled
+    from (
+        select
+            campaign_id,
+            coalesce(sum(delta) filter (where status in ('pending', 'retrying')), 0) as pending,
+            coalesce(sum(delta) filter (
+                where status is null or status not in ('pending', 'retrying', 'completed', 'failed', 'cancelled')
+            ), 0) as in_progress,
+            coalesce(sum(delta) filter (where status = 'completed'), 0) as completed,
+            coalesce(sum(delta) filter (where status = 'failed'), 0) as failed,
+            coalesce(sum(delta) filter (where status = 'cancelled'), 0) as cancelled
+        from unnest(p_campaign_ids, p_statuses, p_deltas) as u(campaign_id, status, delta)
+        where campaign_id is not null
+        group by campaign_id
+    ) d
+    where c.id = d.campaign_id;
+$$;
+
+revoke execute on function public.apply_batch_item_status_deltas(uuid[], text[], integer[]) from public, anon, authenticated;
+
+-- Statement-level so a chunked bulk insert of items costs one update per campaign.
+-- security definer: items may be written by roles that cannot update the campaign row.
+create or replace function public.batch_call_items_counters_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op = 'INSERT' then
+        perform public.apply_batch_item_status_deltas(array_agg(batch_campaign_id), array_agg(status), array_agg(1))
+        from new_items;
+    elsif tg_op = 'DELETE' then
+        perform public.apply_batch_item_status_deltas(array_agg(batch_campaign_id), array_agg(status), array_agg(-1))
+        from old_items;
+    else
+        perform public.apply_batch_item_status_deltas(array_agg(batch_campaign_id), array_agg(status), array_agg(delta))
+        from (
+            select o.batch_campaign_id, o.status, -1 as delta
+            from old_items o join new_items n on n.id = o.id
+            where n.status is distinct from o.status or n.batch_campaign_id is distinct from o.batch_campaign_id
+            union all
+            select n.batch_campaign_id, n.status, 1
+            from old_items o join new_items n on n.id = o.id
+            where n.status is distinct from o.status or n.batch_campaign_id is distinct from o.batch_campaign_id
+        ) changes;
+    end if;
+    return null;
+end;
+$$;
+
+-- Backfill and trigger creation must not miss items written in between
+lock table public.batch_call_items in share row exclusive mode;
+
+update public.batch_campaigns c set
+    items_pending = d.pending,
+    items_in_progress = d.in_progress,
+    items_completed = d.completed,
+    items_failed = d.failed,
+    items_cancelled = d.cancelled
+from (
+    select
+        batch_campaign_id,
+        count(*) filter (where status in ('pending', 'retrying')) as pending,
+        count(*) filter (
+            where status is null or status not in ('pending', 'retrying', 'completed', 'failed', 'cancelled')
+        ) as in_progress,
+        count(*) filter (where status = 'completed') as completed,
+        count(*) filter (where status = 'failed') as failed,
+        count(*) filter (where status = 'cancelled') as cancelled
+    from public.batch_call_items
+    group by batch_campaign_id
+) d
+where c.id = d.batch_campaign_id;
+
+-- Transition tables require one trigger per event
+drop trigger if exists batch_call_items_counters_insert on public.batch_call_items;
+create trigger batch_call_items_counters_insert
+    after insert on public.batch_call_items
+    referencing new table as new_items
+    for each statement execute function public.batch_call_items_counters_trigger();
+
+drop trigger if exists batch_call_items_counters_update on public.batch_call_items;
+create trigger batch_call_items_counters_update
+    after update on public.batch_call_items
+    referencing old table as old_items new table as new_items
+    for each statement execute function public.batch_call_items_counters_trigger();
+
+drop trigger if exists batch_call_items_counters_delete on public.batch_call_items;
+create trigger batch_call_items_counters_delete
+    after delete on public.batch_call_items
+    referencing old table as old_items
+    for each statement execute function public.batch_call_items_counters_trigger();
@@ -0,0 +1,39 @@
+-- Leases electing the single API worker that runs the background schedulers
+-- (api/scheduler_lease.py). A lease is held until expires_at and renewed by its holder.
+
+create table if not exists public.scheduler_leases (
+    name text primary key,
+    holder text not null,
+    expires_at timestamptz not null
+);
+
+-- Only used through the functions below with the service role
+alter table public.scheduler_leases enable row level security;
+
+-- True if p_holder now holds the lease: it was free, expired, or already held by p_holder
+create or replace function public.try_acquire_scheduler_lease(p_name text, p_holder text, p_ttl_seconds integer)
+returns boolean
+language plpgsql
+as $$
+begin
+    insert into public.scheduler_leases as l (name, holder, expires_at)
+    values (p_name, p_holder, now() + make_interval(secs => p_ttl_seconds))
+    on conflict (name) do update set
+        holder = excluded.holder,
+        expires_at = excluded.expires_at
+    where l.holder = excluded.holder or l.expires_at < now();
+    return found;
+end;
+$$;
+
+create or replace function public.release_scheduler_lease(p_name text, p_holder text)
+returns void
+language sql
+as $$
+    delete from public.scheduler_leases where name = p_name and holder = p_holder;
+$$;
+
+revoke execute on function public.try_acquire_scheduler_lease(text, text, integer) from public, anon, authenticated;
+grant execute on function public.try_acquire_scheduler_lease(text, text, integer) to service_role;
+revoke execute on function public.release_scheduler_lease(text, text) from public, anon, authenticated;
+grant execute on function public.release_scheduler_lease(text, text) to service_role;
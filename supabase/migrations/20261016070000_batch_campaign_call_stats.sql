@@ -0,0 +1,142 @@
+-- Per-campaign call statistics for GET /batch-campaigns/{id}/progress, kept up to date by a
+-- trigger on public.calls: every insert/update/delete removes the old row's contribution and
+-- adds the new one, so the endpoint reads a few dozen rows whatever the campaign size.
+--   dimension 'outcome'  bucket connected/voicemail/no_answer/busy/failed, with call durations
+--   dimension 'country'  bucket US/CA, France, UK, Other, with connected calls
+--   dimension 'hour'     bucket 00..23, UTC hour of initiated_at of completed/ended calls
+
+create table if not exists public.batch_campaign_call_stats (
+    batch_campaign_id uuid not null,
+    dimension text not null,
+    bucket text not null,
+    calls integer not null default 0,
+    -- completed/ended and longer than 30 seconds
+    connected integer not null default 0,
+    -- calls with a positive call_duration, and the sum of those durations
+    timed_calls integer not null default 0,
+    total_duration bigint not null default 0,
+    primary key (batch_campaign_id, dimension, bucket)
+);
+
+-- Only read with the service role
+alter table public.batch_campaign_call_stats enable row level security;
+
+-- Moving average of the time a call holds a dispatcher slot (call record creation to end),
+-- fed as calls reach a final status; drives the progress ETA
+alter table public.batch_campaigns
+    add column if not exists call_duration_ewma_seconds double precision;
+
+create or replace function public.apply_batch_call_stats_delta(c public.calls, delta integer)
+returns void
+language sql
+as $$
+    insert into public.batch_campaign_call_stats as s (
+        batch_campaign_id, dimension, bucket, calls, connected, timed_calls, total_duration
+    )
+    select c.batch_campaign_id, b.dimension, b.bucket, delta, delta * b.connected, delta * b.timed_calls, delta * b.total_duration
+    from (
+        select lower(coalesce(nullif(c.status, ''), 'failed')) as status, coalesce(c.call_duration, 0) as duration
+    ) x
+    cross join lateral (values
+        ('outcome',
+            case
+                when x.status in ('completed', 'ended') then
+                    case when x.duration > 30 then 'connected' when x.duration > 5 then 'voicemail' else 'no_answer' end
+                when x.status = 'busy' then 'busy'
+                when x.status in ('no_answer', 'timeout') then 'no_answer'
+                else 'failed'
+            end,
+            0, (x.duration > 0)::int, greatest(x.duration, 0)),
+        ('country',
+            case
+                when c.phone_number_e164 like '+1%' then 'US/CA'
+                when c.phone_number_e164 like '+33%' then 'France'
+                when c.phone_number_e164 like '+44%' then 'UK'
+                else 'Other'
+            end,
+            (x.status in ('completed', 'ended') and x.duration > 30)::int, 0, 0),
+        ('hour',
+            case when x.status in ('completed', 'ended') then to_char(c.initiated_at at time zone 'utc', 'HH24') end,
+            0, 0, 0)
+    ) as b(dimension, bucket, connected, timed_calls, total_duration)
+    where c.batch_campaign_id is not null and b.bucket is not null
+    on conflict (batch_campaign_id, dimension, bucket) do update set
+        calls = s.calls + excluded.calls,
+        connected = s.connected + excluded.connected,
+        timed_calls = s.timed_calls + excluded.timed_calls,
+        total_duration = s.total_duration + excluded.total_duration;
+$$;
+
+revoke execute on function public.apply_batch_call_stats_delta(public.calls, integer) from public, anon, authenticated;
+
+-- security definer: calls may be written by roles that have no access to the stats
+create or replace function public.calls_batch_stats_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    final_statuses constant text[] := array[
+        'completed', 'ended', 'failed', 'busy', 'no_answer', 'cancelled', 'canceled', 'voicemail', 'timeout', 'error'
+    ];
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        if old.batch_campaign_id is not null then
+            perform public.apply_batch_call_stats_delta(old, -1);
+        end if;
+    end if;
+    if tg_op = 'DELETE' then
+        return null;
+    end if;
+    if new.batch_campaign_id is null then
+        return null;
+    end if;
+    perform public.apply_batch_call_stats_delta(new, 1);
+
+    -- Feed the moving average once per call, when it first reaches a final status
+    if lower(coalesce(new.status, '')) = any(final_statuses) then
+        if tg_op = 'UPDATE' then
+            if lower(coalesce(old.status, '')) = any(final_statuses) then
+                return null;
+            end if;
+        end if;
+        update public.batch_campaigns set call_duration_ewma_seconds =
+            case
+                when call_duration_ewma_seconds is null then d.seconds
+                else call_duration_ewma_seconds + 0.2 * (d.seconds - call_duration_ewma_seconds)
+            end
+        from (select extract(epoch from coalesce(new.ended_at, now()) - new.created_at)::double precision as seconds) d
+        where id = new.batch_campaign_id and d.seconds >= 0;
+    end if;
+    return null;
+end;
+$$;
+
+-- Backfill and trigger creation must not miss calls written in between
+lock table public.calls in share row exclusive mode;
+
+delete from public.batch_campaign_call_stats;
+
+select public.apply_batch_call_stats_delta(c, 1)
+from public.calls c
+where c.batch_campaign_id is not null;
+
+update public.batch_campaigns b set call_duration_ewma_seconds = d.seconds
+from (
+    select batch_campaign_id, avg(extract(epoch from ended_at - created_at))::double precision as seconds
+    from public.calls
+    where batch_campaign_id is not null
+      and ended_at >= created_at
+      and lower(coalesce(status, '')) in (
+          'completed', 'ended', 'failed', 'busy', 'no_answer', 'cancelled', 'canceled', 'voicemail', 'timeout', 'error'
+      )
+    group by batch_campaign_id
+) d
+where b.id = d.batch_campaign_id and b.call_duration_ewma_seconds is null;
+
+drop trigger if exists calls_batch_stats on public.calls;
+create trigger calls_batch_stats
+    after insert or delete or update of batch_campaign_id, phone_number_e164, initiated_at, ended_at, status, call_duration
+    on public.calls
+    for each row execute function public.calls_batch_stats_trigger();
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# api.db_client refuses to import without Supabase settings; the tests never reach the network
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test.anon.key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test.service.key")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,182 @@
+"""
+A final status reported on PATCH /calls/room/{room_name}/status or by the Telnyx
+call.hangup webhook ends the batch call item of the call and hands its slot back to
+the campaign dispatcher.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from api import batch_routes, telnyx_webhooks
+from api.call_initiation import AgentCallContext
+from api.routes import calls
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.update_data = None
+        self.filters = []
+
+    def update(self, data):
+        self.update_data = data
+        return self
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(("in", column, values))
+        return self
+
+    def or_(self, expression):
+        self.filters.append(("or", expression))
+        return self
+
+    def single(self):
+        return self
+
+    async def execute(self):
+        self.client.queries.append(self)
+        return SimpleNamespace(data=self.client.results.get((self.table, self.update_data is not None)), count=None)
+
+
+class FakeSupabase:
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def make_client(item_updated=True, retry_failed=False):
+    call_row = {
+        "id": "call-1",
+        "user_id": "user-1",
+        "agent_id": 1,
+        "batch_campaign_id": "campaign-1",
+        "batch_call_item_id": "item-1",
+    }
+    return FakeSupabase({
+        ("calls", True): [call_row],
+        ("batch_call_items", True): [{"id": "item-1"}] if item_updated else [],
+        ("batch_call_items", False): {"attempts": 1, "batch_campaign_id": "campaign-1"},
+        ("batch_campaigns", False): {
+            "status": "running",
+            "items_pending": 5,
+            "items_in_progress": 1,
+            "retry_failed": retry_failed,
+            "max_retries": 2,
+        },
+    })
+
+
+def start_dispatcher(monkeypatch, client):
+    monkeypatch.setattr(calls, "supabase_async_client", client)
+    monkeypatch.setattr(telnyx_webhooks, "supabase_async_client", client)
+    monkeypatch.setattr(batch_routes, "supabase_async_client", client)
+
+    dispatcher = batch_routes.CampaignDispatcher({"id": "campaign-1"}, AgentCallContext(agent_id=1, agent_config={}))
+    dispatcher.in_flight.add("item-1")
+    monkeypatch.setitem(batch_routes._campaign_dispatchers, "campaign-1", dispatcher)
+    return dispatcher
+
+
+async def report_status(monkeypatch, client, new_status):
+    monkeypatch.delenv("AGENT_INTERNAL_TOKEN", raising=False)
+    dispatcher = start_dispatcher(monkeypatch, client)
+
+    await calls.update_call_status_by_room(
+        "agent-call-call-1",
+        calls.CallStatusUpdateRequest(new_status=new_status, supabase_call_id="call-1", call_duration_seconds=42),
+        x_agent_token=None,
+    )
+    # release() hands the slot back through the event loop
+    await asyncio.sleep(0)
+    return dispatcher
+
+
+async def report_hangup(monkeypatch, client, hangup_cause):
+    dispatcher = start_dispatcher(monkeypatch, client)
+    telnyx_webhooks.call_control_index.register("call-control-1", "call-1")
+
+    await telnyx_webhooks.process_telnyx_webhook_event({
+        "event_type": "call.hangup",
+        "payload": {"call_control_id": "call-control-1", "hangup_cause": hangup_cause},
+    })
+    await asyncio.sleep(0)
+    return dispatcher
+
+
+def item_update(client):
+    return next(q for q in client.queries if q.table == "batch_call_items" and q.update_data)
+
+
+def test_terminal_status_frees_dispatcher_slot(monkeypatch):
+    client = make_client()
+    dispatcher = asyncio.run(report_status(monkeypatch, client, "completed"))
+
+    assert "item-1" not in dispatcher.in_flight
+    assert dispatcher._slot_released.is_set()
+    update = item_update(client)
+    assert update.update_data["status"] == "completed"
+    assert ("eq", "status", "calling") in update.filters
+
+
+def test_intermediate_status_keeps_slot(monkeypatch):
+    client = make_client()
+    dispatcher = asyncio.run(report_status(monkeypatch, client, "answered"))
+
+    assert "item-1" in dispatcher.in_flight
+    assert not any(q.table == "batch_call_items" for q in client.queries)
+
+
+def test_item_already_ended_keeps_slot(monkeypatch):
+    # The hangup webhook already ended the item: its slot was released then
+    client = make_client(item_updated=False)
+    dispatcher = asyncio.run(report_status(monkeypatch, client, "completed"))
+
+    assert "item-1" in dispatcher.in_flight
+
+
+def test_busy_hangup_retries_item(monkeypatch):
+    client = make_client(retry_failed=True)
+    dispatcher = asyncio.run(report_hangup(monkeypatch, client, "USER_BUSY"))
+
+    call_update = next(q for q in client.queries if q.table == "calls" and q.update_data)
+    assert call_update.update_data["status"] == "busy"
+    update = item_update(client)
+    assert update.update_data["status"] == "pending"
+    assert update.update_data["attempts"] == 2
+    assert "item-1" not in dispatcher.in_flight
+
+
+def test_normal_clearing_hangup_completes_item(monkeypatch):
+    client = make_client(retry_failed=True)
+    asyncio.run(report_hangup(monkeypatch, client, "normal_clearing"))
+
+    assert item_update(client).update_data["status"] == "completed"
+
+
+def test_slot_freed_by_another_worker(monkeypatch):
+    # The call ended on another worker: only the campaign counter tells this dispatcher
+    client = FakeSupabase({
+        ("batch_campaigns", False): {"status": "running", "items_in_progress": 0},
+        ("batch_call_items", False): [{"id": "item-1", "status": "completed"}],
+    })
+
+    async def poll():
+        dispatcher = start_dispatcher(monkeypatch, client)
+        await dispatcher._poll_campaign()
+        return dispatcher
+
+    dispatcher = asyncio.run(poll())
+
+    assert "item-1" not in dispatcher.in_flight
+    assert not dispatcher._stopped